@@ -2,4 +2,11 @@
 __version__ = "0.0.1"
 
 from .generic_routes import Routes, HttpMethods, Service
-from .crud import to_json_non_recursive, to_json, filter_model, query_with_all_relationships, recursive_load
\ No newline at end of file
+from .crud import to_json_non_recursive, to_json, filter_model, query_with_all_relationships, recursive_load
+from .crud import serialize, compile_serializer
+from .crud import check_match_modes, index_ddl, create_match_indexes
+from .async_routes import AsyncRoutes, AsyncService
+from .cache import CacheBackend, MemoryCache, RedisCache
+from .replicas import ReplicaSet
+from .metrics import Metrics
+from .profiling import Profiler
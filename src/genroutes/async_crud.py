@@ -0,0 +1,186 @@
+"""Async counterparts of :mod:`crud` for ``AsyncSession``.
+
+Each function runs its :mod:`crud` twin on the session's connection with ``AsyncSession.run_sync``, so reads,
+writes and any lazy loads of ``deep`` serialization share one code path with the sync routes while the event
+loop stays free during database I/O. Streaming reads use ``AsyncSession.stream``.
+"""
+from typing import AsyncIterator, Type, Union
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import declarative_base
+
+from . import crud
+
+
+def read_statement(schema, deep=False, load_strategy=None, load_depth=None, exclude=None, raw_rows=False):
+    """``select()`` of schema, eager loading relationships and deferring columns like :func:`crud.read_query`"""
+    if raw_rows and not deep:
+        return select(*crud.compile_serializer(schema, exclude).attributes)
+    statement = select(schema)
+    if deep and load_strategy:
+        depth = crud.DEFAULT_LOAD_DEPTH if load_depth is None else load_depth
+        statement = statement.options(*crud.recursive_load(schema, depth, strategy=load_strategy))
+    if crud._projects(deep, exclude):
+        statement = statement.options(*crud.projection(schema, exclude))
+    return statement
+
+
+async def get_all(db: AsyncSession, schema, deep=False, load_strategy=None, load_depth=None,
+                  exclude=None, order_by=None, raw_rows=False) -> list[dict]:
+    return await db.run_sync(crud.get_all, schema, deep=deep, load_strategy=load_strategy, load_depth=load_depth,
+                             exclude=exclude, order_by=order_by, raw_rows=raw_rows)
+
+
+async def get_all_paginated(db: AsyncSession, schema, page, limit, deep=False, load_strategy=None, load_depth=None,
+                            order_by=None, count_mode='exact', exclude=None,
+                            raw_rows=False) -> dict[str, Union[list, int]]:
+    return await db.run_sync(crud.get_all_paginated, schema, page, limit, deep=deep, load_strategy=load_strategy,
+                             load_depth=load_depth, order_by=order_by, count_mode=count_mode, exclude=exclude,
+                             raw_rows=raw_rows)
+
+
+async def get_all_keyset(db: AsyncSession, schema, cursor, limit, id_field=None, deep=False, load_strategy=None,
+                         load_depth=None, exclude=None) -> dict[str, Union[list, str, None]]:
+    return await db.run_sync(crud.get_all_keyset, schema, cursor, limit, id_field=id_field, deep=deep,
+                             load_strategy=load_strategy, load_depth=load_depth, exclude=exclude)
+
+
+async def get_by_id(db: AsyncSession, schema: Type[declarative_base()], id_field, id_value, deep=True,
+                    load_strategy=None, load_depth=None, exclude=None, plan=None) -> Union[dict, None]:
+    return await db.run_sync(crud.get_by_id, schema, id_field, id_value, deep=deep, load_strategy=load_strategy,
+                             load_depth=load_depth, exclude=exclude, plan=plan)
+
+
+async def get_by_ids(db: AsyncSession, schema: Type[declarative_base()], id_field, id_values: list, deep=True,
+                     load_strategy=None, load_depth=None, exclude=None,
+                     plan=None) -> dict[str, Union[dict, None]]:
+    return await db.run_sync(crud.get_by_ids, schema, id_field, id_values, deep=deep, load_strategy=load_strategy,
+                             load_depth=load_depth, exclude=exclude, plan=plan)
+
+
+async def get_by_attribute(db: AsyncSession, schema: Type[declarative_base()], attribute, value, deep=False,
+                           load_strategy=None, load_depth=None, exclude=None, order_by=None, raw_rows=False,
+                           **kwargs) -> list[dict]:
+    return await db.run_sync(crud.get_by_attribute, schema, attribute, value, deep=deep,
+                             load_strategy=load_strategy, load_depth=load_depth, exclude=exclude, order_by=order_by,
+                             raw_rows=raw_rows, **kwargs)
+
+
+async def get_by_attribute_paginated(db: AsyncSession, schema: Type[declarative_base()], attribute, value, page,
+                                     limit, deep=False, load_strategy=None, load_depth=None, order_by=None,
+                                     count_mode='exact', exclude=None, raw_rows=False,
+                                     **kwargs) -> dict[str, Union[list, int]]:
+    return await db.run_sync(crud.get_by_attribute_paginated, schema, attribute, value, page, limit, deep=deep,
+                             load_strategy=load_strategy, load_depth=load_depth, order_by=order_by,
+                             count_mode=count_mode, exclude=exclude, raw_rows=raw_rows, **kwargs)
+
+
+async def get_by_attribute_keyset(db: AsyncSession, schema: Type[declarative_base()], attribute, value, cursor,
+                                  limit, id_field=None, deep=False, load_strategy=None, load_depth=None,
+                                  exclude=None, **kwargs) -> dict[str, Union[list, str, None]]:
+    return await db.run_sync(crud.get_by_attribute_keyset, schema, attribute, value, cursor, limit,
+                             id_field=id_field, deep=deep, load_strategy=load_strategy, load_depth=load_depth,
+                             exclude=exclude, **kwargs)
+
+
+async def create(db: AsyncSession, schema: Type[declarative_base()], data, exclude=None) -> dict:
+    return await db.run_sync(crud.create, schema, data, exclude=exclude)
+
+
+async def create_on_conflict(db: AsyncSession, schema: Type[declarative_base()], data, key_attributes,
+                             on_conflict='nothing', exclude=None) -> Union[dict, None]:
+    return await db.run_sync(crud.create_on_conflict, schema, data, key_attributes, on_conflict=on_conflict,
+                             exclude=exclude)
+
+
+async def bulk_create(db: AsyncSession, schema: Type[declarative_base()], data: list, exclude=None,
+                      copy_threshold=crud.BULK_COPY_THRESHOLD) -> list[dict]:
+    return await db.run_sync(crud.bulk_create, schema, data, exclude=exclude, copy_threshold=copy_threshold)
+
+
+async def bulk_update(db: AsyncSession, schema: Type[declarative_base()], rows: list[dict] = None, id_field='id',
+                      filter_attributes: dict = None, data=None, plan=None) -> int:
+    return await db.run_sync(crud.bulk_update, schema, rows, id_field=id_field, filter_attributes=filter_attributes,
+                             data=data, plan=plan)
+
+
+async def bulk_delete(db: AsyncSession, schema: Type[declarative_base()], ids: list = None, id_field='id',
+                      filter_attributes: dict = None, plan=None) -> int:
+    return await db.run_sync(crud.bulk_delete, schema, ids, id_field=id_field, filter_attributes=filter_attributes,
+                             plan=plan)
+
+
+async def update(db: AsyncSession, schema: Type[declarative_base()], data, row_id, exclude=None) -> dict:
+    return await db.run_sync(crud.update, schema, data, row_id, exclude=exclude)
+
+
+async def update_by_attribute(db: AsyncSession, schema: Type[declarative_base()], data, attribute, value,
+                              exclude=None, **kwargs) -> list[dict]:
+    return await db.run_sync(crud.update_by_attribute, schema, data, attribute, value, exclude=exclude, **kwargs)
+
+
+async def delete(db: AsyncSession, schema: Type[declarative_base()], row_id) -> str:
+    return await db.run_sync(crud.delete, schema, row_id)
+
+
+async def delete_by_attribute(db: AsyncSession, schema: Type[declarative_base()], attribute, value, **kwargs) -> str:
+    return await db.run_sync(crud.delete_by_attribute, schema, attribute, value, **kwargs)
+
+
+# region streaming
+
+async def _iter_rows(db: AsyncSession, statement, schema, deep, load_strategy, load_depth, chunk_size,
+                     exclude, raw_rows=False) -> AsyncIterator[dict]:
+    result = await db.stream(statement.execution_options(yield_per=chunk_size))
+    if raw_rows and not deep:
+        row_of = crud.compile_serializer(schema, exclude).row_of
+        try:
+            async for partition in result.partitions():
+                for row in partition:
+                    yield row_of(row)
+        finally:
+            await result.close()
+        return
+
+    depth = crud._serialize_depth(load_strategy, load_depth)
+    try:
+        async for partition in result.scalars().partitions():
+            rows = await db.run_sync(lambda _: crud.serialize_all(partition, deep=deep, depth=depth,
+                                                                  exclude=exclude))
+            for row in rows:
+                yield row
+    finally:
+        await result.close()
+
+
+def iter_all(db: AsyncSession, schema, deep=False, load_strategy=None, load_depth=None,
+             chunk_size=crud.STREAM_CHUNK_SIZE, exclude=None, order_by=None, raw_rows=False) -> AsyncIterator[dict]:
+    """Serialize all rows of schema ``chunk_size`` rows at a time, see :func:`crud.iter_all`"""
+    load_strategy = 'selectin' if load_strategy else None
+    statement = read_statement(schema, deep, load_strategy, load_depth, exclude, raw_rows)
+    if order_by:
+        statement = statement.order_by(*order_by)
+    return _iter_rows(db, statement, schema, deep, load_strategy, load_depth, chunk_size, exclude, raw_rows)
+
+
+def iter_by_attribute(db: AsyncSession, schema: Type[declarative_base()], attribute, value, deep=False,
+                      load_strategy=None, load_depth=None, chunk_size=crud.STREAM_CHUNK_SIZE, exclude=None,
+                      order_by=None, raw_rows=False, plan=None, **kwargs) -> AsyncIterator[dict]:
+    """Serialize rows of schema filtered by 'attribute = value' ``chunk_size`` rows at a time"""
+    additional_attribute: dict = kwargs.get('additional_attributes', None)
+    if additional_attribute is not None:
+        if not isinstance(additional_attribute, dict):
+            raise Exception("iter_by_attribute: Arguments must be of type dict")
+
+    additional_attribute = {} if additional_attribute is None else additional_attribute
+    all_filter_attributes = crud._filter_attributes(attribute, value, additional_attribute)
+
+    load_strategy = 'selectin' if load_strategy else None
+    statement = read_statement(schema, deep, load_strategy, load_depth, exclude, raw_rows) \
+        .where(*crud.filter_model(schema, all_filter_attributes, plan))
+    if order_by:
+        statement = statement.order_by(*order_by)
+    return _iter_rows(db, statement, schema, deep, load_strategy, load_depth, chunk_size, exclude, raw_rows)
+
+# endregion streaming
@@ -0,0 +1,464 @@
+from contextlib import asynccontextmanager
+from typing import Annotated, AsyncIterator, Awaitable, Callable, Union, Type
+
+from starlette.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Depends, Response, status, Body, Header, Request
+from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from . import async_crud, crud, metrics
+from .metrics import Metrics
+from .profiling import Profiler
+from .generic_routes import Routes, Service, LIST_QUERY_PARAMS, _method_name, _invalidates_cache, json_response
+from .generic_routes import not_modified, check_stream_format, _aencode_stream, STREAM_FORMATS, _pool_options
+from .generic_routes import _error_detail, check_list_params
+from .generic_routes import create, create_any, bulk_create, bulk_update, bulk_delete, update, patch, delete
+from .generic_routes import BulkUpdate, BulkDelete, _check_model_fields
+from .generic_routes import read, read_paginated, read_by_attribute, read_by_id, read_by_attribute_paginated
+from .generic_routes import read_keyset, read_by_attribute_keyset, read_by_ids, read_version
+
+
+async def read_stream(db: AsyncSession, rows: AsyncIterator[dict], first: dict = None) -> AsyncIterator[dict]:
+    """Yield streamed records of model, after ``first`` if given, closing the async session once they are
+    consumed"""
+    try:
+        if first is not None:
+            yield first
+        async for row in rows:
+            yield row
+    finally:
+        await db.close()
+
+
+async def open_stream(db: AsyncSession,
+                      rows_of: Callable[[AsyncSession], AsyncIterator[dict]]) -> AsyncIterator[dict]:
+    """Async :func:`generic_routes.open_stream`: errors of the query answer 400 before the response starts"""
+    try:
+        rows = rows_of(db)
+        try:
+            first = await rows.__anext__()
+        except StopAsyncIteration:
+            first = None
+    except BaseException as ex:
+        await db.close()
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
+    return read_stream(db, rows, first)
+
+
+async def streaming_response(stream_format: str, stream_rows: Callable[[], Awaitable]) -> StreamingResponse:
+    """Stream records returned by awaiting ``stream_rows()``, see :func:`generic_routes.streaming_response`"""
+    check_stream_format(stream_format)
+    return StreamingResponse(_aencode_stream(await stream_rows(), stream_format),
+                             media_type=STREAM_FORMATS[stream_format])
+
+
+def _check_additional_attributes(kwargs: dict):
+    additional_attribute: dict = kwargs.get('additional_attributes', None)
+    if additional_attribute is not None:
+        if not isinstance(additional_attribute, dict):
+            raise Exception("Arguments must be of type dict")
+
+
+async def read_list(service, id_field, request: Request, attribute=None, value=None, page=None, limit=None,
+                    deep=False, cursor=None, sort=None, count=None, stream=None, fields=None, ids=None) -> Response:
+    """Response of an async list route, see :func:`generic_routes.read_list`"""
+    param: dict = {k: v for k, v in request.query_params.items() if k not in LIST_QUERY_PARAMS}
+    fields = fields.split(',') if fields else None
+    check_list_params(cursor, limit, sort)
+
+    if ids is not None:
+        service.check_ids(attribute, param)
+        return json_response(await service.get_many(ids.split(','), id_field, deep=deep, fields=fields))
+
+    if attribute is None and not param:
+        if cursor is not None and limit is not None:
+            return json_response(await service.get_all_keyset(cursor, limit, id_field, deep=deep, fields=fields))
+        if page is not None and limit is not None:
+            return json_response(await service.get_all_paginated(page, limit, deep=deep, sort=sort, count=count,
+                                                                 fields=fields))
+        if stream is not None:
+            return await streaming_response(stream, lambda: service.stream_all(deep=deep, sort=sort, fields=fields))
+        return json_response(await service.get_all(deep=deep, sort=sort, fields=fields))
+
+    service.check_filters(attribute, param)
+    additional_attributes = {'additional_attributes': param} if param else {}
+    if cursor is not None and limit is not None:
+        return json_response(await service.get_by_attribute_keyset(
+            value, attribute, cursor, limit, id_field, deep=deep, fields=fields, **additional_attributes))
+    if page is not None and limit is not None:
+        return json_response(await service.get_by_attribute_paginated(
+            value, attribute, page, limit, deep=deep, sort=sort, count=count, fields=fields,
+            **additional_attributes))
+    if stream is not None:
+        return await streaming_response(stream, lambda: service.stream_by_attribute(
+            value, attribute, deep=deep, sort=sort, fields=fields, **additional_attributes))
+    return json_response(await service.get_by_attribute(value, attribute, deep=deep, sort=sort, fields=fields,
+                                                        **additional_attributes))
+
+
+class AsyncRoutes(Routes):
+    """:class:`Routes` generating ``async def`` endpoints over an ``async_sessionmaker``.
+
+    Requests are served on the event loop, database work is awaited through :class:`AsyncService`.
+    """
+
+    def __init__(self, session: async_sessionmaker, auth_route: str = None, read_session=None,
+                 read_strategy: str = 'round_robin', pin_primary: float = 0, metrics: Union[bool, Metrics] = None,
+                 profile: Union[bool, Profiler] = None):
+        super().__init__(session, auth_route, read_session=read_session, read_strategy=read_strategy,
+                         pin_primary=pin_primary, metrics=metrics, profile=profile)
+
+    @classmethod
+    def from_url(cls, url: str, auth_route: str = None, pool_size: int = None, max_overflow: int = None,
+                 pool_pre_ping: bool = None, pool_recycle: int = None, pool_timeout: float = None,
+                 read_urls: list[str] = None, read_strategy: str = 'round_robin', pin_primary: float = 0,
+                 metrics: Union[bool, Metrics] = None, profile: Union[bool, Profiler] = None, **engine_options):
+        """AsyncRoutes over new ``AsyncEngine`` instances of ``url`` and ``read_urls``, see
+        :meth:`Routes.from_url`"""
+        options = {**_pool_options(pool_size, max_overflow, pool_pre_ping, pool_recycle, pool_timeout),
+                   **engine_options}
+        sessions = [async_sessionmaker(create_async_engine(u, **options), expire_on_commit=False)
+                    for u in [url, *(read_urls or [])]]
+        return cls(sessions[0], auth_route, read_session=sessions[1:] or None, read_strategy=read_strategy,
+                   pin_primary=pin_primary, metrics=metrics, profile=profile)
+
+    def get_router(self, path: str, schema,
+                   model: Union[BaseModel, Type[BaseModel]], model_create: Union[BaseModel, Type[BaseModel]], **kwargs):
+        """ Generate and return router of ``async def`` endpoints, see :meth:`Routes.get_router`.
+
+            :return: router (``APIRouter``)
+
+        """
+        options = self._router_options(path, kwargs)
+        id_field: str = options['id_field']
+        methodtag: str = options['methodtag']
+        on_conflict: str = options['on_conflict']
+        key_fields: list = self._conflict_keys(schema, options)
+
+        # region crud_methods
+        service = AsyncService(self.session, schema, load_strategy=options['load_strategy'],
+                               load_depth=options['load_depth'], count_mode=options['count_mode'],
+                               exclude=options['response_exclude'], match_modes=options['match_modes'],
+                               filter_fields=options['filter_fields'], sort_fields=options['sort_fields'],
+                               raw_rows=options['raw_rows'], cache=options['cache'],
+                               etag_field=options['etag_field'], read_session=self.replicas,
+                               pin_primary=self.pin_primary, metrics=self.metrics, profiler=self.profiler)
+
+        router = APIRouter(prefix="/" + path, dependencies=[Depends(service.request_scope)])
+        dependencies = [Depends(self.oauth2_scheme)] if self.oauth2_scheme else None
+
+        @_method_name('create_' + methodtag)
+        async def create_data(data: model_create, user_schema: Union[str, None] = Header(default=None)):
+            # Control db schema using header value
+            service.set_dbschema({None: user_schema} if user_schema else None)
+            if on_conflict is not None:
+                return json_response(await service.create(data, *key_fields, on_conflict=on_conflict),
+                                     status_code=status.HTTP_201_CREATED)
+            return json_response(await service.create_any(data), status_code=status.HTTP_201_CREATED)
+
+        @_method_name('create_' + methodtag + '_bulk')
+        async def create_bulk(data: list[model_create], user_schema: Union[str, None] = Header(default=None)):
+            service.set_dbschema({None: user_schema} if user_schema else None)
+            return json_response(await service.bulk_create(data), status_code=status.HTTP_201_CREATED)
+
+        @_method_name('get_' + methodtag)
+        async def get_paginated(request: Request,
+                                page: Union[int, None] = None, limit: Union[int, None] = None,
+                                user_schema: Union[str, None] = Header(default=None),
+                                deep: Union[bool, None] = False,
+                                cursor: Union[str, None] = None,
+                                sort: Union[str, None] = None,
+                                order: Union[str, None] = None,
+                                count: Union[str, None] = None,
+                                stream: Union[str, None] = None,
+                                fields: Union[str, None] = None,
+                                ids: Union[str, None] = None):
+            service.set_dbschema({None: user_schema} if user_schema else None)
+            return await service.get_response(request, lambda: read_list(
+                service, id_field, request, page=page, limit=limit, deep=deep, cursor=cursor, sort=order or sort,
+                count=count, stream=stream, fields=fields, ids=ids))
+
+        @_method_name('get_' + methodtag + "_by_attribute")
+        async def get_by_attribute_paginated(attribute, value, request: Request,
+                                             user_schema: Union[str, None] = Header(default=None),
+                                             page: Union[int, None] = None,
+                                             limit: Union[int, None] = None,
+                                             deep: Union[bool, None] = False,
+                                             cursor: Union[str, None] = None,
+                                             sort: Union[str, None] = None,
+                                             order: Union[str, None] = None,
+                                             count: Union[str, None] = None,
+                                             stream: Union[str, None] = None,
+                                             fields: Union[str, None] = None):
+            service.set_dbschema({None: user_schema} if user_schema else None)
+            return await service.get_response(request, lambda: read_list(
+                service, id_field, request, attribute, value, page=page, limit=limit, deep=deep, cursor=cursor,
+                sort=order or sort, count=count, stream=stream, fields=fields))
+
+        @_method_name('get_' + methodtag + "_by_id")
+        async def get_by_id(id, request: Request, user_schema: Union[str, None] = Header(default=None),
+                            deep: Union[bool, None] = True, fields: Union[str, None] = None):
+            service.set_dbschema({None: user_schema} if user_schema else None)
+            selected = fields.split(',') if fields else None
+
+            async def build():
+                return json_response(await service.get_one(id, id_field, deep=deep, fields=selected))
+
+            return await service.get_response(request, build, version=(lambda: service.get_version(id, id_field))
+                                              if service.versioned(deep, selected) else None)
+
+        @_method_name('update_' + methodtag)
+        async def update_data(id, data: model, user_schema: Union[str, None] = Header(default=None)):
+            service.set_dbschema({None: user_schema} if user_schema else None)
+            return json_response(await service.update(data, id, id_field))
+
+        @_method_name('patch_' + methodtag)
+        async def patch_data(id, data: Union[model, Annotated[dict, Body]],
+                             user_schema: Union[str, None] = Header(default=None)):
+            invalid = [x for x in dict(data).keys() if x not in model.model_fields.keys()]
+            if len(invalid) > 0:
+                raise HTTPException(status.HTTP_400_BAD_REQUEST,
+                                    detail='Unsupported fields found: ' + (' ,'.join(invalid)))
+
+            service.set_dbschema({None: user_schema} if user_schema else None)
+            return json_response(await service.patch(data, id, id_field))
+
+        @_method_name('delete_' + methodtag)
+        async def delete_data(id, user_schema: Union[str, None] = Header(default=None)):
+            service.set_dbschema({None: user_schema} if user_schema else None)
+            return json_response(await service.delete(id, id_field))
+
+        @_method_name('update_' + methodtag + '_bulk')
+        async def update_bulk(data: BulkUpdate, user_schema: Union[str, None] = Header(default=None)):
+            service.set_dbschema({None: user_schema} if user_schema else None)
+            for row in [*(data.rows or []), data.data or {}]:
+                _check_model_fields(model, row)
+            return json_response(await service.bulk_update(data.rows, id_field, filters=data.filter,
+                                                           data=data.data))
+
+        @_method_name('delete_' + methodtag + '_bulk')
+        async def delete_bulk(data: BulkDelete, user_schema: Union[str, None] = Header(default=None)):
+            service.set_dbschema({None: user_schema} if user_schema else None)
+            return json_response(await service.bulk_delete(data.ids, id_field, filters=data.filter))
+
+        # endregion crud_methods
+
+        self._add_routes(router, model, options, {
+            'create': create_data,
+            'bulk_create': create_bulk,
+            'get': get_paginated,
+            'get_by_id': get_by_id,
+            'get_by_attribute': get_by_attribute_paginated,
+            'update': update_data,
+            'patch': patch_data,
+            'delete': delete_data,
+            'bulk_update': update_bulk,
+            'bulk_delete': delete_bulk,
+        }, dependencies=dependencies)
+
+        return router
+
+
+class AsyncService(Service):
+    """:class:`Service` over an ``async_sessionmaker``, reads and writes are coroutines.
+
+    The session factory must be bound to an ``AsyncEngine``. Each call opens its own ``AsyncSession`` and runs
+    the sync CRUD code on it with ``AsyncSession.run_sync``.
+    """
+
+    def _get_engine(self):
+        engine = self.session.kw.get('bind', None)
+        if engine is None:
+            raise Exception("AsyncService: async_sessionmaker must be bound to an AsyncEngine")
+        return engine
+
+    def _get_db(self, read=False) -> AsyncSession:
+        session, engine = self._route(read)
+        return session(bind=self._get_bind(engine))
+
+    @asynccontextmanager
+    async def _session(self, read=False) -> AsyncIterator[AsyncSession]:
+        """Session of the current request scope or of the call alone, see :meth:`Service._session`"""
+        with metrics.database_work():
+            sessions = self._request_sessions.get()
+            if sessions is None:
+                async with self._get_db(read) as db:
+                    yield await self._acquire(db)
+                return
+
+            session, engine = self._route(read)
+            bind = self._get_bind(engine)
+            db = sessions.get(bind, None)
+            if db is None:
+                db = sessions.setdefault(bind, session(bind=bind))
+                await self._acquire(db)
+            yield db
+
+    async def _acquire(self, db: AsyncSession) -> AsyncSession:
+        if self.metrics is not None:
+            with metrics.timed('acquire'):
+                await db.connection()
+        return db
+
+    async def _close(self, db: AsyncSession):
+        await db.close()
+
+    async def get_response(self, request: Request, build: Callable[[], Awaitable[Response]],
+                           version: Callable[[], Awaitable] = None) -> Response:
+        """Response of a GET route awaiting ``build``, see :meth:`Service.get_response`"""
+        headers = self._version_headers(request, await version()) if version is not None else None
+        if headers is not None:
+            response = not_modified(request, headers)
+            if response is not None:
+                return response
+
+        key, response = self._cache_lookup(request)
+        if response is not None:
+            return self._conditional(request, response, None, headers)
+        return self._conditional(request, await build(), key, headers)
+
+    async def get_version(self, id_value, id_field='id'):
+        if self.etag_field is None:
+            return None
+        return await self._read(read_version, id_field=id_field, value=id_value, version_field=self.etag_field,
+                                plan=self.filters)
+
+    async def _run(self, fn, **kwargs):
+        async with self._session() as db:
+            return await db.run_sync(fn, schema=self.schema, **kwargs)
+
+    async def _read(self, fn, **kwargs):
+        """:meth:`_run` on a read replica, when the service has some"""
+        async with self._session(read=True) as db:
+            return await db.run_sync(fn, schema=self.schema, **kwargs)
+
+    @_invalidates_cache
+    async def create_any(self, obj: Union[BaseModel, dict]) -> dict:
+        return await self._run(create_any, data=obj, exclude=self.exclude)
+
+    @_invalidates_cache
+    async def bulk_create(self, objs: list[Union[BaseModel, dict]]) -> list:
+        return await self._run(bulk_create, data=objs, exclude=self.exclude)
+
+    @_invalidates_cache
+    async def create(self, obj: Union[BaseModel, dict], key_attribute, *args, on_conflict=None) -> dict:
+        async with self._session() as db:
+            return await db.run_sync(create, self.schema, key_attribute, obj, *args, exclude=self.exclude,
+                                     on_conflict=on_conflict, plan=self.filters)
+
+    async def get_all(self, deep=False, sort=None, fields=None) -> list:
+        order_by = self._resolve_order_by(sort) if sort else None
+        return await self._read(read, deep=deep, load_strategy=self.load_strategy, load_depth=self.load_depth,
+                               exclude=self._exclude(fields), order_by=order_by, raw_rows=self.raw_rows)
+
+    async def stream_all(self, deep=False, sort=None, fields=None) -> AsyncIterator[dict]:
+        order_by = self._resolve_order_by(sort) if sort else None
+        exclude = self._exclude(fields)
+        return await open_stream(self._get_db(read=True), lambda db: async_crud.iter_all(
+            db, self.schema, deep=deep, load_strategy=self.load_strategy, load_depth=self.load_depth,
+            exclude=exclude, order_by=order_by, raw_rows=self.raw_rows))
+
+    async def get_all_paginated(self, page, limit, deep=False, sort=None, count=None,
+                                fields=None) -> dict[str, Union[list, int]]:
+        order_by = self._resolve_order_by(sort)
+        return await self._read(read_paginated, page=page, limit=limit, deep=deep, load_strategy=self.load_strategy,
+                               load_depth=self.load_depth, order_by=order_by, count_mode=count or self.count_mode,
+                               exclude=self._exclude(fields), raw_rows=self.raw_rows)
+
+    async def get_all_keyset(self, cursor, limit, id_field=None, deep=False,
+                             fields=None) -> dict[str, Union[list, str, None]]:
+        return await self._read(read_keyset, cursor=cursor, limit=limit, id_field=id_field, deep=deep,
+                               load_strategy=self.load_strategy, load_depth=self.load_depth, exclude=self._exclude(fields))
+
+    async def get_one(self, id_value, id_field='id', deep=True, fields=None) -> Union[dict, None]:
+        return await self._read(read_by_id, id_field=id_field, value=id_value, deep=deep,
+                               load_strategy=self.load_strategy, load_depth=self.load_depth, exclude=self._exclude(fields),
+                               plan=self.filters)
+
+    async def get_many(self, id_values: list, id_field='id', deep=True, fields=None) -> dict[str, Union[dict, None]]:
+        return await self._read(read_by_ids, id_field=id_field, values=id_values, deep=deep,
+                               load_strategy=self.load_strategy, load_depth=self.load_depth,
+                               exclude=self._exclude(fields), plan=self.filters)
+
+    async def get_by_attribute(self, value, attribute, deep=False, sort=None, fields=None, **kwargs) -> list:
+        _check_additional_attributes(kwargs)
+        order_by = self._resolve_order_by(sort) if sort else None
+        return await self._read(read_by_attribute, attribute=attribute, value=value, deep=deep,
+                               load_strategy=self.load_strategy, load_depth=self.load_depth,
+                               exclude=self._exclude(fields), order_by=order_by, raw_rows=self.raw_rows,
+                               plan=self.filters, **kwargs)
+
+    async def stream_by_attribute(self, value, attribute, deep=False, sort=None, fields=None,
+                                  **kwargs) -> AsyncIterator[dict]:
+        _check_additional_attributes(kwargs)
+        order_by = self._resolve_order_by(sort) if sort else None
+        exclude = self._exclude(fields)
+        return await open_stream(self._get_db(read=True), lambda db: async_crud.iter_by_attribute(
+            db, self.schema, attribute, value, deep=deep, load_strategy=self.load_strategy,
+            load_depth=self.load_depth, exclude=exclude, order_by=order_by, raw_rows=self.raw_rows,
+            plan=self.filters, **kwargs))
+
+    async def get_by_attribute_paginated(self, value, attribute, page: int, limit: int, deep=False, sort=None,
+                                         count=None, fields=None, **kwargs) -> dict[str, Union[list, int]]:
+        _check_additional_attributes(kwargs)
+        order_by = self._resolve_order_by(sort)
+        return await self._read(read_by_attribute_paginated, attribute=attribute, value=value, page=page,
+                               limit=limit, deep=deep, load_strategy=self.load_strategy, load_depth=self.load_depth,
+                               order_by=order_by, count_mode=count or self.count_mode, exclude=self._exclude(fields),
+                               raw_rows=self.raw_rows, plan=self.filters, **kwargs)
+
+    async def get_by_attribute_keyset(self, value, attribute, cursor, limit: int, id_field=None, deep=False,
+                                      fields=None, **kwargs) -> dict[str, Union[list, str, None]]:
+        _check_additional_attributes(kwargs)
+        return await self._read(read_by_attribute_keyset, attribute=attribute, value=value, cursor=cursor,
+                               limit=limit, id_field=id_field, deep=deep, load_strategy=self.load_strategy,
+                               load_depth=self.load_depth, exclude=self._exclude(fields), plan=self.filters, **kwargs)
+
+    @_invalidates_cache
+    async def update(self, obj: Union[BaseModel, dict], id_value, *args) -> list:
+        id_field = args[0] if args else 'id'
+        return await self._run(update, data=obj, attribute=id_field, value=id_value, exclude=self.exclude,
+                               plan=self.filters)
+
+    @_invalidates_cache
+    async def update_by_attribute(self, obj: Union[BaseModel, dict], value, attribute='id', **kwargs) -> list:
+        _check_additional_attributes(kwargs)
+        return await self._run(update, data=obj, attribute=attribute, value=value, exclude=self.exclude,
+                               plan=self.filters, **kwargs)
+
+    @_invalidates_cache
+    async def bulk_update(self, rows: list[dict] = None, id_field='id', filters: dict = None,
+                          data: Union[BaseModel, dict] = None) -> dict[str, int]:
+        if filters is not None:
+            self.check_filters(None, filters)
+        return await self._run(bulk_update, rows=rows, id_field=id_field, filter_attributes=filters, data=data,
+                               plan=self.filters)
+
+    @_invalidates_cache
+    async def bulk_delete(self, ids: list = None, id_field='id', filters: dict = None) -> dict[str, int]:
+        if filters is not None:
+            self.check_filters(None, filters)
+        return await self._run(bulk_delete, ids=ids, id_field=id_field, filter_attributes=filters,
+                               plan=self.filters)
+
+    @_invalidates_cache
+    async def delete(self, id_value, *args) -> dict[str, str]:
+        id_field = args[0] if args else 'id'
+        return await self._run(delete, attribute=id_field, value=id_value, plan=self.filters)
+
+    @_invalidates_cache
+    async def delete_by_attribute(self, value, attribute='id', **kwargs) -> dict[str, str]:
+        _check_additional_attributes(kwargs)
+        return await self._run(delete, attribute=attribute, value=value, plan=self.filters, **kwargs)
+
+    @_invalidates_cache
+    async def patch(self, obj: Union[BaseModel, dict], id_value, *args) -> list:
+        id_field = args[0] if args else 'id'
+        return await self._run(patch, data=obj, attribute=id_field, value=id_value, exclude=self.exclude,
+                               plan=self.filters)
+
+    @_invalidates_cache
+    async def patch_by_attribute(self, obj: Union[BaseModel, dict], value, attribute='id', **kwargs) -> list:
+        _check_additional_attributes(kwargs)
+        return await self._run(patch, data=obj, attribute=attribute, value=value, exclude=self.exclude,
+                               plan=self.filters, **kwargs)
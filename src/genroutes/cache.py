@@ -0,0 +1,107 @@
+"""Response caches of generated GET routes.
+
+A cache stores encoded response bodies by key. Keys are prefixed with the cache's current generation, clearing
+the cache starts a new generation so responses read before a write are never served after it, even when they are
+stored once the write has committed.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Union
+
+
+class CacheBackend:
+    """Storage of cached response bodies, implement ``generation``, ``get``, ``set`` and ``clear`` to plug in
+    another store"""
+
+    def generation(self) -> int:
+        """Current generation, changed by :meth:`clear`"""
+        raise NotImplementedError
+
+    def get(self, key: str) -> Union[bytes, None]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes):
+        raise NotImplementedError
+
+    def clear(self):
+        """Invalidate all cached responses"""
+        raise NotImplementedError
+
+
+class MemoryCache(CacheBackend):
+    """In-process cache of at most ``maxsize`` responses, least recently used first out, each one kept ``ttl``
+    seconds"""
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        if maxsize < 1:
+            raise Exception("MemoryCache: maxsize must be greater than 0")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def generation(self) -> int:
+        return self._generation
+
+    def get(self, key: str) -> Union[bytes, None]:
+        with self._lock:
+            entry = self._entries.get(key, None)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+
+class RedisCache(CacheBackend):
+    """Cache in a Redis compatible store shared by processes, ``client`` being e.g. a ``redis.Redis`` instance.
+
+    Entries expire after ``ttl`` seconds. Routers sharing a store need distinct ``prefix`` values.
+    """
+
+    def __init__(self, client, prefix: str = 'genroutes:', ttl: int = 60):
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def generation(self) -> int:
+        return int(self.client.get(self.prefix + 'generation') or 0)
+
+    def get(self, key: str) -> Union[bytes, None]:
+        return self.client.get(self.prefix + key)
+
+    def set(self, key: str, value: bytes):
+        self.client.set(self.prefix + key, value, ex=self.ttl)
+
+    def clear(self):
+        # entries of previous generations are left to expire
+        self.client.incr(self.prefix + 'generation')
+
+
+def cache_backend(cache) -> Union[CacheBackend, None]:
+    """Backend of the ``cache`` router option: a :class:`CacheBackend`, ``True`` for a default
+    :class:`MemoryCache` or ``None``"""
+    if cache is None or cache is False:
+        return None
+    if cache is True:
+        return MemoryCache()
+    if not isinstance(cache, CacheBackend):
+        raise Exception("Unsupported cache '%s', use True or a CacheBackend" % (cache,))
+    return cache
@@ -1,24 +1,36 @@
 import decimal
+import enum
 import types
 import datetime
 from typing import Type, Union
 from pydantic import BaseModel
-from sqlalchemy.orm import declarative_base, joinedload, subqueryload
+from sqlalchemy.orm import declarative_base, defer, joinedload, subqueryload, selectinload
 from sqlalchemy.orm import Session
-from sqlalchemy import func, VARCHAR, TEXT, CHAR, NVARCHAR
-
+from sqlalchemy import delete as sql_delete, update as sql_update
+from sqlalchemy import func, insert, text, tuple_, VARCHAR, TEXT, CHAR, NVARCHAR, PrimaryKeyConstraint, UniqueConstraint
+from sqlalchemy import any_, bindparam, cast, column as sql_column, values as sql_values, ARRAY
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine.default import DefaultDialect
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.base import Executable
+from sqlalchemy.sql.expression import ClauseElement
 from sqlalchemy.inspection import inspect
 import base64
+import io
+import json
 import uuid
 
 
+_BUILT_IN_TYPES = (
+    int, float, str, bool, list, tuple, dict, set, frozenset, bytes, bytearray, memoryview, type(None),
+    types.FunctionType, types.BuiltinFunctionType, types.MethodType, types.ModuleType, datetime.date,
+    datetime.datetime,
+    decimal.Decimal, uuid.UUID)
+
+
 def is_compound_object(attribute):
-    built_in_types = (
-        int, float, str, bool, list, tuple, dict, set, frozenset, bytes, bytearray, memoryview, type(None),
-        types.FunctionType, types.BuiltinFunctionType, types.MethodType, types.ModuleType, datetime.date,
-        datetime.datetime,
-        decimal.Decimal,uuid.UUID)
-    return not isinstance(attribute, built_in_types) and hasattr(attribute, '__class__')
+    return not isinstance(attribute, _BUILT_IN_TYPES) and hasattr(attribute, '__class__')
 
 
 def to_json(obj) -> dict:
@@ -43,68 +55,496 @@ def to_json_non_recursive(obj) -> dict:
     # else base64.b64encode(getattr(obj, i.key)).decode('utf-8')
     #         for i in inspect(obj).mapper.column_attrs}
 
+
+# region serializer
+
+def _to_base64(value):
+    return base64.b64encode(value).decode('utf-8')
+
+
+def _to_number(value):
+    # same rule as fastapi's decimal_encoder so payloads are unchanged
+    if value.as_tuple().exponent >= 0:
+        return int(value)
+    return float(value)
+
+
+def _to_isoformat(value):
+    return value.isoformat()
+
+
+def _to_seconds(value):
+    return value.total_seconds()
+
+
+def _to_enum_value(value):
+    return value.value
+
+
+def _to_safe(value):
+    """Fallback for column types without a known python type"""
+    return _to_base64(value) if isinstance(value, bytes) else value
+
+
+_CONVERTERS = (
+    (bytes, _to_base64),
+    (decimal.Decimal, _to_number),
+    (uuid.UUID, str),
+    (datetime.date, _to_isoformat),  # covers datetime.datetime
+    (datetime.time, _to_isoformat),
+    (datetime.timedelta, _to_seconds),
+    (enum.Enum, _to_enum_value),
+)
+
+
+def _converter_for(column_type):
+    try:
+        python_type = column_type.python_type
+    except NotImplementedError:
+        return _to_safe
+
+    for type_, converter in _CONVERTERS:
+        if issubclass(python_type, type_):
+            return converter
+    return None
+
+
+class SerializerPlan:
+    """Serialization plan of a mapped class, compiled once by :func:`compile_serializer`.
+
+    ``columns`` holds ``(key, converter)`` pairs, ``converter`` being ``None`` for values that are
+    already JSON compatible. ``relationships`` holds ``(key, uselist)`` pairs for relationship slots.
+    ``attributes`` are the column attributes in ``columns`` order, selected by :func:`raw_query`.
+    """
+
+    __slots__ = ('columns', 'relationships', 'attributes')
+
+    def __init__(self, schema, exclude=()):
+        mapper = inspect(schema)
+        self.columns = tuple((prop.key, _converter_for(prop.columns[0].type)) for prop in mapper.column_attrs
+                             if prop.key not in exclude)
+        self.relationships = tuple((rel.key, rel.uselist) for rel in mapper.relationships if rel.key not in exclude)
+        self.attributes = tuple(getattr(schema, key) for key, _ in self.columns)
+
+    def columns_of(self, obj) -> dict:
+        row = {}
+        for key, convert in self.columns:
+            value = getattr(obj, key)
+            row[key] = value if convert is None or value is None else convert(value)
+        return row
+
+    def row_of(self, row) -> dict:
+        """Serialize a ``Row`` tuple of :attr:`attributes` values"""
+        result = {}
+        for (key, convert), value in zip(self.columns, row):
+            result[key] = value if convert is None or value is None else convert(value)
+        return result
+
+    def serialize(self, obj, deep=False, depth=None, _path=()) -> dict:
+        row = self.columns_of(obj)
+        if not self.relationships or (deep and depth == 0):
+            return row
+
+        path = (*_path, id(obj))
+        for key, uselist in self.relationships:
+            value = getattr(obj, key)
+            if value is None:
+                row[key] = None
+            elif uselist:
+                row[key] = [_serialize_related(v, deep, depth, path) for v in value]
+            else:
+                row[key] = _serialize_related(value, deep, depth, path)
+        return row
+
+
+_SERIALIZER_PLANS: dict = {}
+
+
+def compile_serializer(schema, exclude=None) -> SerializerPlan:
+    """Return the cached :class:`SerializerPlan` of a mapped class, compiling it on first use.
+
+    ``exclude`` fields are left out of the top level of serialized rows.
+    """
+    key = (schema, frozenset(exclude)) if exclude else schema
+    plan = _SERIALIZER_PLANS.get(key)
+    if plan is None:
+        plan = _SERIALIZER_PLANS.setdefault(key, SerializerPlan(schema, frozenset(exclude or ())))
+    return plan
+
+
+def _serialize_related(obj, deep, depth, path) -> dict:
+    if not deep:
+        # models generated by metafactory carry their own serializer
+        to_json_method = getattr(obj, 'to_json', None)
+        if to_json_method is not None:
+            return to_json_method()
+        return compile_serializer(type(obj)).columns_of(obj)
+
+    plan = compile_serializer(type(obj))
+    if id(obj) in path:
+        # back reference to an object being serialized, stop the cycle
+        return plan.columns_of(obj)
+    return plan.serialize(obj, deep=True, depth=None if depth is None else depth - 1, _path=path)
+
+
+def serialize(obj, deep=False, depth=None, exclude=None) -> dict:
+    """Serialize a row object to a JSON compatible dict in a single pass using its compiled plan.
+
+    ``deep`` serializes relationships recursively, ``depth`` levels deep when given, otherwise related
+    objects are serialized through their own ``to_json`` method when available. ``exclude`` fields
+    are left out of the row.
+    """
+    return compile_serializer(type(obj), exclude).serialize(obj, deep=deep, depth=depth)
+
+
+def serialize_all(rows, deep=False, depth=None, exclude=None) -> list[dict]:
+    """Serialize a list of row objects of the same mapped class"""
+    result_list = []
+    schema, plan = None, None
+    for r in rows:
+        if type(r) is not schema:
+            schema = type(r)
+            plan = compile_serializer(schema, exclude)
+        result_list.append(plan.serialize(r, deep=deep, depth=depth))
+    return result_list
+
+
+def serialize_rows(schema, rows, exclude=None) -> list[dict]:
+    """Serialize ``Row`` tuples of a :func:`raw_query` of schema"""
+    row_of = compile_serializer(schema, exclude).row_of
+    return [row_of(r) for r in rows]
+
+# endregion serializer
+
+
 def from_json(obj: dict) -> dict:
     """" Safe conversion from base64 to bytes from HTTP request """
     return {k: v if not type(v) == bytes else base64.b64decode(v)
             for k, v in obj.items()}
 
 
-def get_all(db: Session, schema, deep=False) -> list[dict]:
-    results = db.query(schema).all()
-    result_list = []
+# region projection
+
+_PROJECTIONS: dict = {}
+
+
+def projection(schema, exclude=None, keep=()) -> tuple:
+    """Loader options deferring the ``exclude`` columns of schema, so reads never fetch them.
+
+    Primary key columns and ``keep`` attributes are always loaded. Options are compiled once per
+    schema and field set.
+    """
+    if not exclude:
+        return ()
+
+    key = (schema, frozenset(exclude), tuple(keep))
+    options = _PROJECTIONS.get(key)
+    if options is None:
+        mapper = inspect(schema)
+        primary_key = set(mapper.primary_key)
+        options = _PROJECTIONS.setdefault(key, tuple(
+            defer(getattr(schema, prop.key)) for prop in mapper.column_attrs
+            if prop.key in exclude and prop.key not in keep and primary_key.isdisjoint(prop.columns)))
+    return options
+
 
-    # for r in results:
-    #     result_list.append(to_json(r))
+def _projects(deep, exclude) -> bool:
+    # deep reads serialize back references of the top level rows with all their columns, deferring
+    # columns there would cost one lazy load per row instead
+    return bool(exclude) and not deep
 
-    for r in results:
-        obj = to_json(r) if deep else to_json_non_recursive(r)
-        res = {k: v if not is_compound_object(v) else v.to_json() for k, v in obj.items()}
-        result_list.append(res)
+# endregion projection
+
+
+def raw_query(db: Session, schema, exclude=None):
+    """Query of the columns of schema returning plain ``Row`` tuples, skipping ORM instance construction and
+    the identity map. Rows are serialized with :func:`serialize_rows` and hold no relationships."""
+    return db.query(*compile_serializer(schema, exclude).attributes)
+
+
+def read_query(db: Session, schema, deep=False, load_strategy=None, load_depth=None, exclude=None, keep=(),
+               raw_rows=False):
+    """Query for reads of schema, eager loading relationships of ``deep`` reads with ``load_strategy``
+    up to ``load_depth`` levels so they cost a fixed number of queries instead of one per row.
+
+    ``exclude`` columns of shallow reads are left out of the SELECT, see :func:`projection`. Shallow
+    ``raw_rows`` reads select columns only, see :func:`raw_query`.
+    """
+    if raw_rows and not deep:
+        return raw_query(db, schema, exclude)
+    query = db.query(schema)
+    if deep and load_strategy:
+        depth = DEFAULT_LOAD_DEPTH if load_depth is None else load_depth
+        query = query.options(*recursive_load(schema, depth, strategy=load_strategy))
+    if _projects(deep, exclude):
+        query = query.options(*projection(schema, exclude, keep))
+    return query
+
+
+def _serialize_depth(load_strategy, load_depth):
+    """Relationship levels to serialize, kept within what the load strategy fetched"""
+    if load_depth is None and load_strategy:
+        return DEFAULT_LOAD_DEPTH
+    return load_depth
+
+
+def _serialize_results(schema, results, deep, load_strategy, load_depth, exclude, raw_rows) -> list[dict]:
+    if raw_rows and not deep:
+        return serialize_rows(schema, results, exclude)
+    return serialize_all(results, deep=deep, depth=_serialize_depth(load_strategy, load_depth), exclude=exclude)
+
+
+def get_all(db: Session, schema, deep=False, load_strategy=None, load_depth=None, exclude=None,
+            order_by=None, raw_rows=False) -> list[dict]:
+    query = read_query(db, schema, deep, load_strategy, load_depth, exclude, raw_rows=raw_rows)
+    results = (query.order_by(*order_by) if order_by else query).all()
+    result_list = _serialize_results(schema, results, deep, load_strategy, load_depth, exclude, raw_rows)
 
     return result_list
 
 
-def get_all_paginated(db: Session, schema, page, limit, deep=False) -> dict[str, Union[list, int]]:
-    attr_names = [attr for attr in list(schema.__dict__.keys()) if
-                  not callable(getattr(schema, attr)) and not attr.startswith("__")]
+# region ordering
 
-    # Access attribute by index
-    index = 0
-    attr_name = attr_names[index]
-    attr_value = getattr(schema, attr_name)
+def key_columns(schema, id_field=None) -> tuple:
+    """Columns identifying rows of schema, its primary key preceded by ``id_field`` when it is another mapped
+    column, the primary key breaking ties between rows sharing an ``id_field`` value"""
+    mapper = inspect(schema)
+    primary_key = tuple(getattr(schema, mapper.get_property_by_column(c).key) for c in mapper.primary_key)
+    if id_field is not None and id_field in mapper.column_attrs:
+        return (getattr(schema, id_field), *[c for c in primary_key if c.key != id_field])
+    return primary_key
 
-    results = db.query(schema).order_by(attr_value) \
-        .offset(page * limit) \
-        .limit(limit) \
-        .all()
 
-    count = db.query(schema).count()
-    result_list = []
+def unique_columns(schema) -> tuple:
+    """Columns of the first unique constraint or unique index of schema other than its primary key, empty when
+    there is none"""
+    table = inspect(schema).local_table
+    primary_key = set(table.primary_key.columns)
+    candidates = [tuple(c.columns) for c in table.constraints if isinstance(c, UniqueConstraint)]
+    candidates += [tuple(i.columns) for i in table.indexes if i.unique]
+    candidates += [(c,) for c in table.columns if c.unique]
+    for columns in candidates:
+        if columns and set(columns) != primary_key:
+            mapper = inspect(schema)
+            return tuple(getattr(schema, mapper.get_property_by_column(c).key) for c in columns)
+    return ()
+
+
+def default_order_by(schema) -> tuple:
+    """Deterministic, index backed ordering of schema: its primary key"""
+    return key_columns(schema)
+
+
+def sortable_columns(schema) -> dict:
+    """Mapped columns of schema leading an index, primary key or unique constraint, by attribute name"""
+    mapper = inspect(schema)
+    indexed = set()
+    for table in mapper.tables:
+        for index in table.indexes:
+            indexed.update(list(index.columns)[:1])
+        for constraint in table.constraints:
+            if isinstance(constraint, (PrimaryKeyConstraint, UniqueConstraint)):
+                indexed.update(list(constraint.columns)[:1])
+
+    return {prop.key: getattr(schema, prop.key) for prop in mapper.column_attrs if prop.columns[0] in indexed}
+
+
+def resolve_order_by(sortable: dict, sort: str, default: tuple) -> tuple:
+    """ORDER BY clauses for a ``sort`` parameter, comma separated fields (``name`` or ``-name`` for descending
+    order).
+
+    Fields must be ``sortable`` columns, ``default`` columns are appended to break ties so page boundaries
+    stay stable.
+    """
+    if not sort:
+        return default
+
+    clauses, columns = [], []
+    for field in sort.split(','):
+        descending = field.startswith('-')
+        key = field[1:] if descending else field
+        if key not in sortable:
+            raise Exception("resolve_order_by: Unsupported sort field '%s', use one of: %s"
+                            % (key, ', '.join(sortable)))
+
+        column = sortable[key]
+        clauses.append(column.desc() if descending else column.asc())
+        columns.append(column)
+
+    return (*clauses, *[c for c in default if not any(c is column for column in columns)])
+
+# endregion ordering
+
+
+# region count
+
+COUNT_MODES = ('exact', 'none', 'estimate', 'window')
+
+
+class Explain(Executable, ClauseElement):
+    """``EXPLAIN (FORMAT JSON)`` of a statement, executed like the statement itself: bound parameters, expanding
+    ``IN`` parameters and schema translation are handled by SQLAlchemy"""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, 'postgresql')
+def _compile_explain(element, compiler, **kw):
+    return 'EXPLAIN (FORMAT JSON) ' + compiler.process(element.statement, **kw)
+
+
+def estimate_count(db: Session, query) -> int:
+    """Planner row estimate of query on postgresql (``EXPLAIN``), exact count on other databases"""
+    if db.get_bind().dialect.name != 'postgresql':
+        return query.count()
+
+    plan = db.connection().execute(Explain(query.statement)).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def _page_with_count(db: Session, query, count_query, page, limit, count_mode,
+                     raw_rows=False) -> tuple[list, Union[int, None]]:
+    """Rows of a page of query with the total row count computed according to ``count_mode``.
+
+    ``exact`` counts with a separate query, ``none`` skips counting, ``estimate`` uses the planner estimate
+    and ``window`` reads ``count(*) OVER()`` alongside the page rows in the same round trip. ``raw_rows``
+    queries select columns rather than one entity.
+    """
+    if count_mode not in COUNT_MODES:
+        raise Exception("Unsupported count mode '%s', use one of: %s" % (count_mode, ', '.join(COUNT_MODES)))
+
+    if count_mode == 'window':
+        rows = query.add_columns(func.count().over()).offset(page * limit).limit(limit).all()
+        if rows:
+            return [r[:-1] if raw_rows else r[0] for r in rows], rows[0][-1]
+        # past the last page the window is empty
+        return [], 0 if page == 0 else count_query.count()
+
+    results = query.offset(page * limit).limit(limit).all()
+    if count_mode == 'none':
+        return results, None
+    if count_mode == 'estimate':
+        return results, estimate_count(db, count_query)
+    return results, count_query.count()
+
+# endregion count
+
+
+# region streaming
+
+STREAM_CHUNK_SIZE = 1000
+
+
+def _iter_rows(query, schema, deep, load_strategy, load_depth, chunk_size, exclude, raw_rows=False):
+    # yield_per buffers chunk_size rows at a time from a server side cursor where supported
+    if raw_rows and not deep:
+        row_of = compile_serializer(schema, exclude).row_of
+        for r in query.yield_per(chunk_size):
+            yield row_of(r)
+        return
+
+    depth = _serialize_depth(load_strategy, load_depth)
+    for r in query.yield_per(chunk_size):
+        yield serialize(r, deep=deep, depth=depth, exclude=exclude)
 
-    # for r in results:
-    #     result_list.append(to_json(r))
 
-    for r in results:
-        obj = to_json(r) if deep else to_json_non_recursive(r)
-        res = {k: v if not is_compound_object(v) else v.to_json() for k, v in obj.items()}
-        result_list.append(res)
+def iter_all(db: Session, schema, deep=False, load_strategy=None, load_depth=None, chunk_size=STREAM_CHUNK_SIZE,
+             exclude=None, order_by=None, raw_rows=False):
+    """Serialize all rows of schema one at a time, keeping memory flat however large the table is.
+
+    Deep reads are eager loaded with selectinload, the only strategy compatible with ``yield_per``.
+    """
+    load_strategy = 'selectin' if load_strategy else None
+    query = read_query(db, schema, deep, load_strategy, load_depth, exclude, raw_rows=raw_rows)
+    if order_by:
+        query = query.order_by(*order_by)
+    return _iter_rows(query, schema, deep, load_strategy, load_depth, chunk_size, exclude, raw_rows)
+
+
+def iter_by_attribute(db: Session, schema: Type[declarative_base()], attribute, value, deep=False, load_strategy=None,
+                      load_depth=None, chunk_size=STREAM_CHUNK_SIZE, exclude=None, order_by=None, raw_rows=False,
+                      plan=None, **kwargs):
+    """Serialize rows of schema filtered by 'attribute = value' one at a time"""
+    additional_attribute: dict = kwargs.get('additional_attributes', None)
+    if additional_attribute is not None:
+        if not isinstance(additional_attribute, dict):
+            raise Exception("iter_by_attribute: Arguments must be of type dict")
+
+    additional_attribute = {} if additional_attribute is None else additional_attribute
+    all_filter_attributes = _filter_attributes(attribute, value, additional_attribute)
+
+    load_strategy = 'selectin' if load_strategy else None
+    query = read_query(db, schema, deep, load_strategy, load_depth, exclude, raw_rows=raw_rows) \
+        .filter(*filter_model(schema, all_filter_attributes, plan))
+    if order_by:
+        query = query.order_by(*order_by)
+    return _iter_rows(query, schema, deep, load_strategy, load_depth, chunk_size, exclude, raw_rows)
+
+# endregion streaming
+
+
+def get_all_paginated(db: Session, schema, page, limit, deep=False, load_strategy=None,
+                      load_depth=None, order_by=None, count_mode='exact', exclude=None,
+                      raw_rows=False) -> dict[str, Union[list, int]]:
+    order_by = default_order_by(schema) if order_by is None else order_by
+
+    query = read_query(db, schema, deep, load_strategy, load_depth, exclude, raw_rows=raw_rows).order_by(*order_by)
+    results, count = _page_with_count(db, query, db.query(schema), page, limit, count_mode, raw_rows and not deep)
+    result_list = _serialize_results(schema, results, deep, load_strategy, load_depth, exclude, raw_rows)
 
     return {'rows': result_list, 'count': count}
 
 
-def get_by_id(db: Session, schema: Type[declarative_base()], id_field, id_value, deep=True) -> Union[dict, None]:
+def get_by_id(db: Session, schema: Type[declarative_base()], id_field, id_value, deep=True, load_strategy=None,
+              load_depth=None, exclude=None, plan=None) -> Union[dict, None]:
     all_filter_attributes = {id_field: id_value}
-    results = db.query(schema).filter(*filter_model(schema, all_filter_attributes)).first()
+    results = read_query(db, schema, deep, load_strategy, load_depth, exclude) \
+        .filter(*filter_model(schema, all_filter_attributes, plan)).first()
     if results is None:
         return results
 
-    obj = to_json(results) if deep else to_json_non_recursive(results)
-    res = {k: v if not is_compound_object(v) else v.to_json() for k, v in obj.items()}
+    return serialize(results, deep=deep, depth=_serialize_depth(load_strategy, load_depth), exclude=exclude)
+
+
+def get_by_ids(db: Session, schema: Type[declarative_base()], id_field, id_values: list, deep=True, load_strategy=None,
+               load_depth=None, exclude=None, plan=None) -> dict[str, Union[dict, None]]:
+    """Rows of schema identified by ``id_values``, read with a single ``WHERE id_field IN (...)`` query and keyed
+    by id in request order, ``None`` for ids without a row"""
+    plan = compile_filters(schema) if plan is None else plan
+    if id_field not in plan:
+        raise Exception("get_by_ids: Unsupported id field '%s'" % id_field)
+
+    filter_column = plan[id_field]
+    keys = {}
+    for v in id_values:
+        key = keys.setdefault(filter_column.parse(v), str(v))
+        if key != str(v):
+            # e.g. 1 and 01, keying the row by either would drop the other
+            raise Exception("get_by_ids: Ids '%s' and '%s' identify the same row" % (key, v))
+    result = dict.fromkeys(keys.values())
+    if not keys:
+        return result
+
+    results = read_query(db, schema, deep, load_strategy, load_depth, exclude, keep=[id_field]) \
+        .filter(filter_column.match(list(keys), 'in')).all()
+    depth = _serialize_depth(load_strategy, load_depth)
+    for obj, row in zip(results, serialize_all(results, deep=deep, depth=depth, exclude=exclude)):
+        result[keys[getattr(obj, id_field)]] = row
+    return result
+
 
-    return res  # to_json(results)  # results.__dict__
+def get_version(db: Session, schema: Type[declarative_base()], id_field, id_value, version_field, plan=None):
+    """Value of the ``version_field`` column (e.g. a version counter or ``updated_at``) of the row identified by
+    ``id_field``, read without loading the row, ``None`` when no row matches"""
+    row = db.query(getattr(schema, version_field)).filter(*filter_model(schema, {id_field: id_value}, plan)).first()
+    return None if row is None else row[0]
 
 
-def create(db: Session, schema: Type[declarative_base()], data: BaseModel) -> dict:
+def create(db: Session, schema: Type[declarative_base()], data: BaseModel, exclude=None) -> dict:
 
     if not isinstance(data, dict):
         data = data.model_dump()
@@ -114,123 +554,403 @@ def create(db: Session, schema: Type[declarative_base()], data: BaseModel) -> di
     db.add(db_row_object)
     db.commit()
     db.refresh(db_row_object)
-    return to_json(db_row_object)  # db_row_object.__dict__
+    return serialize(db_row_object, deep=True, exclude=exclude)
 
 
-def update(db: Session, schema: Type[declarative_base()], data: BaseModel, row_id) -> dict:
+def insert_values(schema, data) -> dict:
+    """Column values of an INSERT of data: the fields set in the request, without a ``None`` primary key so
+    the database generates it and applies column defaults"""
     if not isinstance(data, dict):
         data = data.model_dump(exclude_unset=True)
+    mapper = inspect(schema)
+    primary_keys = {mapper.get_property_by_column(c).key for c in mapper.primary_key}
+    return {k: v for k, v in from_json(data).items() if v is not None or k not in primary_keys}
 
-    obj = from_json(data)
-    db.query(schema).filter_by(id=row_id).update(obj, synchronize_session="fetch")
+
+# region upsert
+
+CONFLICT_ACTIONS = ('nothing', 'update')
+
+_UPSERT_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def supports_on_conflict(db: Session) -> bool:
+    """Whether the dialect of db has ``INSERT .. ON CONFLICT .. RETURNING``"""
+    return db.get_bind().dialect.name in _UPSERT_INSERTS
+
+
+def create_on_conflict(db: Session, schema: Type[declarative_base()], data: BaseModel, key_attributes,
+                       on_conflict='nothing', exclude=None) -> Union[dict, None]:
+    """Insert data unless a row with the same ``key_attributes`` exists, in a single statement.
+
+    ``on_conflict='nothing'`` leaves the existing row untouched and returns ``None``, ``on_conflict='update'``
+    overwrites it with data (upsert) and returns it. ``key_attributes`` must be covered by a unique index or constraint.
+    Only the attributes set in data are inserted, a missing or ``None`` primary key is left to the database, and
+    upserts never overwrite the key or primary key of the existing row.
+    """
+    if on_conflict not in CONFLICT_ACTIONS:
+        raise Exception("create_on_conflict: Unsupported conflict action '%s'" % on_conflict)
+
+    obj = insert_values(schema, data)
+    mapper = inspect(schema)
+    primary_keys = {mapper.get_property_by_column(c).key for c in mapper.primary_key}
+    key_columns = [mapper.columns[k] for k in key_attributes]
+
+    statement = _UPSERT_INSERTS[db.get_bind().dialect.name](schema).values(**obj)
+    if on_conflict == 'nothing':
+        statement = statement.on_conflict_do_nothing(index_elements=key_columns)
+    else:
+        # rows conflicting on the keys have equal keys, setting them is a no-op when nothing else is set
+        updated = [mapper.columns[k] for k in obj if k not in key_attributes and k not in primary_keys] \
+            or key_columns
+        statement = statement.on_conflict_do_update(index_elements=key_columns,
+                                                    set_={c.name: statement.excluded[c.name] for c in updated})
+
+    result = db.scalars(statement.returning(schema), execution_options={'populate_existing': True}).first()
+    row = None if result is None else serialize(result, deep=True, exclude=exclude)
     db.commit()
-    db_row_object = db.query(schema).filter_by(id=row_id).first()
-    return to_json(db_row_object)  # db_row_object.__dict__
+    return row
 
+# endregion upsert
 
-def update_by_attribute(db: Session, schema: Type[declarative_base()], data: BaseModel,
-                        attribute, value, **kwargs) -> list[dict]:
-    additional_attribute: dict = kwargs.get('additional_attributes', None)
-    if additional_attribute is not None:
-        if not isinstance(additional_attribute, dict):
-            raise Exception("update_by_attribute: Arguments must be of type dict")
 
-    additional_attribute = {} if additional_attribute is None else additional_attribute
-    all_filter_attributes = {attribute: value, **additional_attribute}
+# region bulk
 
-    rows = db.query(schema).filter(*filter_model(schema, all_filter_attributes))
+BULK_COPY_THRESHOLD = 10000
 
-    if len(rows.all()) == 0:
+
+def _array_literal(values) -> str:
+    """postgresql array literal of a list, e.g. ``{"a","b"}``"""
+    items = []
+    for value in values:
+        if value is None:
+            items.append('NULL')
+        elif isinstance(value, (list, tuple)):
+            items.append(_array_literal(value))
+        else:
+            if isinstance(value, (datetime.date, datetime.time)):
+                value = value.isoformat()
+            elif isinstance(value, enum.Enum):
+                value = value.name
+            items.append('"%s"' % str(value).replace('\\', '\\\\').replace('"', '\\"'))
+    return '{%s}' % ','.join(items)
+
+
+def _copy_value(value, array=False) -> str:
+    """Value in postgresql COPY text format, lists of ``array`` columns as array literals, others as JSON"""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        value = '\\x' + bytes(value).hex()
+    elif isinstance(value, (datetime.date, datetime.time)):
+        value = value.isoformat()
+    elif isinstance(value, enum.Enum):
+        value = value.name
+    elif array and isinstance(value, (list, tuple)):
+        value = _array_literal(value)
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value)
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+def copy_supported(schema, keys) -> bool:
+    """Whether rows setting the attributes ``keys`` of schema can be loaded with ``COPY``: their primary key, which
+    matches inserted rows back to their input order, is set or drawn from the sequence of an autoincrement
+    column"""
+    mapper = inspect(schema)
+    missing = [c for c in mapper.primary_key if mapper.get_property_by_column(c).key not in keys]
+    if not missing:
+        return True
+    column = missing[0]
+    identity = getattr(column, 'identity', None)
+    return len(missing) == 1 and column is column.table.autoincrement_column \
+        and not (identity is not None and identity.always)
+
+
+def copy_sql(dialect, schema, keys, schema_translate_map: dict = None) -> tuple[str, str, str]:
+    """Statements staging rows with the attributes ``keys`` of schema (see :func:`copy_supported`): temporary table
+    creation, ordinal and primary key defaults, and ``COPY``. Only those columns are copied, the others get their
+    defaults from the final INSERT, an autoincrement primary key left out its next sequence value"""
+    table = schema.__table__
+    mapper = inspect(schema)
+    preparer = dialect.identifier_preparer
+    table_schema = (schema_translate_map or {}).get(table.schema, table.schema)
+    target = preparer.quote(table.name)
+    if table_schema:
+        target = preparer.quote_schema(table_schema) + '.' + target
+    copied = [mapper.columns[key].name for key in keys]
+    generated = [c.name for c in mapper.primary_key if c.name not in copied]
+    column_list = ', '.join(preparer.quote(name) for name in copied)
+    defaults = ['ADD COLUMN _genroutes_ordinal BIGSERIAL']
+    defaults += ["ALTER COLUMN %s SET DEFAULT nextval(pg_get_serial_sequence('%s', '%s'))"
+                 % (preparer.quote(name), target.replace("'", "''"), name.replace("'", "''")) for name in generated]
+    return ('CREATE TEMPORARY TABLE _genroutes_bulk ON COMMIT DROP AS SELECT %s FROM %s WITH NO DATA'
+            % (', '.join(preparer.quote(name) for name in copied + generated), target),
+            'ALTER TABLE _genroutes_bulk %s' % ', '.join(defaults),
+            'COPY _genroutes_bulk (%s) FROM STDIN' % column_list)
+
+
+def _copy_create(db: Session, schema, rows: list[dict]) -> list:
+    """Stage rows with COPY, then move them to the table of schema in one INSERT .. SELECT .. RETURNING, sorted back
+    to input order by the ordinal of their primary key in the staging table"""
+    mapper = inspect(schema)
+    keys = list(rows[0])
+    arrays = [isinstance(mapper.columns[key].type, ARRAY) for key in keys]
+    bind = db.get_bind()
+    create_table, add_defaults, copy = copy_sql(bind.dialect, schema, keys,
+                                                bind.get_execution_options().get('schema_translate_map', None))
+
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write('\t'.join(_copy_value(row[key], array) for key, array in zip(keys, arrays)) + '\n')
+    buffer.seek(0)
+
+    cursor = db.connection().connection.cursor()
+    try:
+        cursor.execute(create_table)
+        cursor.execute(add_defaults)
+        cursor.copy_expert(copy, buffer)
+    finally:
+        cursor.close()
+
+    # INSERT .. SELECT .. RETURNING does not guarantee the order of the returned rows
+    columns = [*[mapper.columns[key] for key in keys],
+               *[c for c in mapper.primary_key if mapper.get_property_by_column(c).key not in keys]]
+    column_list = ', '.join(bind.dialect.identifier_preparer.quote(c.name) for c in columns)
+    statement = insert(schema).from_select(
+        columns, text('SELECT %s FROM _genroutes_bulk' % column_list).columns(*columns)).returning(schema)
+    results = db.scalars(statement).all()
+
+    pk_keys = [mapper.get_property_by_column(c).key for c in mapper.primary_key]
+    pk_list = ', '.join(bind.dialect.identifier_preparer.quote(c.name) for c in mapper.primary_key)
+    ordinals = {tuple(row[:-1]): row[-1]
+                for row in db.execute(text('SELECT %s, _genroutes_ordinal FROM _genroutes_bulk' % pk_list))}
+    return sorted(results, key=lambda obj: ordinals[tuple(getattr(obj, key) for key in pk_keys)])
+
+
+def bulk_create(db: Session, schema: Type[declarative_base()], data: list, exclude=None,
+                copy_threshold=BULK_COPY_THRESHOLD) -> list[dict]:
+    """Insert all rows of data in one transaction and return them in input order.
+
+    Rows are sent in multi-row ``INSERT .. RETURNING`` batches (insertmanyvalues). On postgresql with psycopg2,
+    batches of at least ``copy_threshold`` rows setting the same fields are loaded with ``COPY`` instead, when
+    :func:`copy_supported`. Either way
+    only the fields set are inserted, see :func:`insert_values`.
+    """
+    rows = [insert_values(schema, d) for d in data]
+    if len(rows) == 0:
         return []
 
+    bind = db.get_bind()
+    use_copy = copy_threshold is not None and len(rows) >= copy_threshold \
+        and bind.dialect.name == 'postgresql' and bind.dialect.driver == 'psycopg2' \
+        and all(row.keys() == rows[0].keys() for row in rows) and copy_supported(schema, rows[0])
+
+    try:
+        if use_copy:
+            results = _copy_create(db, schema, rows)
+        else:
+            results = db.scalars(insert(schema).returning(schema, sort_by_parameter_order=True), rows).all()
+        # serialized before commit expires the rows
+        result_list = serialize_all(results, exclude=exclude)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+
+    return result_list
+
+# endregion bulk
+
+
+def _update_rows(db: Session, schema, filters, data, exclude) -> list[dict]:
+    """Update rows matching filters with ``UPDATE .. RETURNING`` and serialize the returned rows"""
     if not isinstance(data, dict):
         data = data.model_dump(exclude_unset=True)
 
     obj = from_json(data)
-    rows.update(obj, synchronize_session="fetch")
-
+    if len(obj) == 0:
+        return serialize_all(db.query(schema).filter(*filters).all(), deep=True, exclude=exclude)
+
+    statement = sql_update(schema).where(*filters).values(**obj)
+    # a request session holds no other copy of the rows, no need to synchronize it
+    execution_options = {'synchronize_session': False}
+    if db.get_bind().dialect.update_returning:
+        rows = db.scalars(statement.returning(schema),
+                          execution_options={**execution_options, 'populate_existing': True}).all()
+    else:
+        db.execute(statement, execution_options=execution_options)
+        rows = db.query(schema).filter(*filters).all()
+
+    result_list = serialize_all(rows, deep=True, exclude=exclude)
     db.commit()
-    result_list = []
-    # db_row_objects = db.query(schema).filter_by(**filter).all()
-    db_row_objects = db.query(schema).filter(*filter_model(schema, all_filter_attributes)).all()
+    return result_list
 
-    for r in db_row_objects:
-        result_list.append(to_json(r))
 
-    return result_list
+def update(db: Session, schema: Type[declarative_base()], data: BaseModel, row_id, exclude=None) -> dict:
+    rows = _update_rows(db, schema, [schema.id == row_id], data, exclude)
+    return rows[0] if rows else None
 
 
-def get_by_attribute(db: Session, schema: Type[declarative_base()], attribute, value, deep=False, **kwargs) -> list[dict]:
+def update_by_attribute(db: Session, schema: Type[declarative_base()], data: BaseModel,
+                        attribute, value, exclude=None, plan=None, **kwargs) -> list[dict]:
     additional_attribute: dict = kwargs.get('additional_attributes', None)
     if additional_attribute is not None:
         if not isinstance(additional_attribute, dict):
-            raise Exception("get_by_attribute: Arguments must be of type dict")
+            raise Exception("update_by_attribute: Arguments must be of type dict")
 
     additional_attribute = {} if additional_attribute is None else additional_attribute
-    all_filter_attributes = {attribute: value, **additional_attribute}
+    all_filter_attributes = _filter_attributes(attribute, value, additional_attribute)
 
-    results = db.query(schema).filter(*filter_model(schema, all_filter_attributes)).all()
-    result_list = []
+    return _update_rows(db, schema, filter_model(schema, all_filter_attributes, plan), data, exclude)
 
-    # for r in results:
-    #     result_list.append(to_json(r))
 
-    for r in results:
-        obj = to_json(r) if deep else to_json_non_recursive(r)
-        res = {k: v if not is_compound_object(v) else v.to_json() for k, v in obj.items()}
-        result_list.append(res)
+def get_by_attribute(db: Session, schema: Type[declarative_base()], attribute, value, deep=False, load_strategy=None,
+                     load_depth=None, exclude=None, order_by=None, raw_rows=False, plan=None,
+                     **kwargs) -> list[dict]:
+    additional_attribute: dict = kwargs.get('additional_attributes', None)
+    if additional_attribute is not None:
+        if not isinstance(additional_attribute, dict):
+            raise Exception("get_by_attribute: Arguments must be of type dict")
+
+    additional_attribute = {} if additional_attribute is None else additional_attribute
+    all_filter_attributes = _filter_attributes(attribute, value, additional_attribute)
+
+    query = read_query(db, schema, deep, load_strategy, load_depth, exclude, raw_rows=raw_rows) \
+        .filter(*filter_model(schema, all_filter_attributes, plan))
+    results = (query.order_by(*order_by) if order_by else query).all()
+    result_list = _serialize_results(schema, results, deep, load_strategy, load_depth, exclude, raw_rows)
 
     return result_list
 
 
 def get_by_attribute_paginated(db: Session, schema: Type[declarative_base()], attribute, value, page, limit, deep=False,
-                               **kwargs) -> dict[str, Union[list, int]]:
+                               load_strategy=None, load_depth=None, order_by=None, count_mode='exact', exclude=None,
+                               raw_rows=False, plan=None, **kwargs) -> dict[str, Union[list, int]]:
     additional_attribute: dict = kwargs.get('additional_attributes', None)
     if additional_attribute is not None:
         if not isinstance(additional_attribute, dict):
             raise Exception("get_by_attribute: Arguments must be of type dict")
 
     additional_attribute = {} if additional_attribute is None else additional_attribute
-    all_filter_attributes = {attribute: value, **additional_attribute}
+    all_filter_attributes = _filter_attributes(attribute, value, additional_attribute)
 
-    attr_names = [attr for attr in list(schema.__dict__.keys()) if
-                  not callable(getattr(schema, attr)) and not attr.startswith("__")]
+    order_by = default_order_by(schema) if order_by is None else order_by
 
-    # Access attribute by index
-    index = 0
-    attr_name = attr_names[index]
-    attr_value = getattr(schema, attr_name)
+    query = read_query(db, schema, deep, load_strategy, load_depth, exclude, raw_rows=raw_rows).order_by(*order_by) \
+        .filter(*filter_model(schema, all_filter_attributes, plan))
+    count_query = db.query(schema).filter(*filter_model(schema, all_filter_attributes, plan))
+    results, count = _page_with_count(db, query, count_query, page, limit, count_mode, raw_rows and not deep)
 
-    results = db.query(schema).order_by(attr_value) \
-        .filter(*filter_model(schema, all_filter_attributes)) \
-        .offset(page * limit) \
-        .limit(limit) \
-        .all()
+    # results = db.query(schema).filter(*filter_model(schema, all_filter_attributes)).all()
+    result_list = _serialize_results(schema, results, deep, load_strategy, load_depth, exclude, raw_rows)
 
-    count = db.query(schema).filter(*filter_model(schema, all_filter_attributes)).count()
+    return {'rows': result_list, 'count': count}
 
-    # results = db.query(schema).filter(*filter_model(schema, all_filter_attributes)).all()
-    result_list = []
 
-    # for r in results:
-    #     result_list.append(to_json(r))
+# region keyset
+
+def _from_cursor_value(column, value):
+    if value is None:
+        return value
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+
+    if issubclass(python_type, datetime.datetime):
+        return datetime.datetime.fromisoformat(value)
+    if issubclass(python_type, datetime.date):
+        return datetime.date.fromisoformat(value)
+    if issubclass(python_type, (uuid.UUID, decimal.Decimal, int)):
+        return python_type(value)
+    return value
+
+
+def encode_cursor(columns, obj) -> str:
+    """Opaque cursor pointing after ``obj`` in the keyset ordered by ``columns``"""
+    converters = dict(compile_serializer(type(obj)).columns)
+    values = []
+    for c in columns:
+        value, convert = getattr(obj, c.key), converters[c.key]
+        values.append(value if convert is None or value is None else convert(value))
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(columns, cursor) -> Union[list, None]:
+    """Key values of an opaque cursor, ``None`` for an empty cursor (first page)"""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError
+        return [_from_cursor_value(c, v) for c, v in zip(columns, values)]
+    except (ValueError, TypeError):
+        raise Exception("decode_cursor: Invalid cursor")
+
+
+def _keyset_page(query, columns, cursor, limit, deep, depth, exclude) -> dict[str, Union[list, str, None]]:
+    if limit < 1:
+        raise Exception("get_keyset: limit must be greater than 0")
+
+    values = decode_cursor(columns, cursor)
+    if values is not None:
+        if len(columns) == 1:
+            query = query.filter(columns[0] > values[0])
+        else:
+            query = query.filter(tuple_(*columns) > tuple_(*values))
 
-    for r in results:
-        obj = to_json(r) if deep else to_json_non_recursive(r)
-        res = {k: v if not is_compound_object(v) else v.to_json() for k, v in obj.items()}
-        result_list.append(res)
+    # one extra row tells whether a next page exists
+    results = query.order_by(*columns).limit(limit + 1).all()
+    next_cursor = encode_cursor(columns, results[limit - 1]) if len(results) > limit else None
 
-    return {'rows': result_list, 'count': count}
+    return {'rows': serialize_all(results[:limit], deep=deep, depth=depth, exclude=exclude), 'next_cursor': next_cursor}
+
+
+def get_all_keyset(db: Session, schema, cursor, limit, id_field=None, deep=False, load_strategy=None,
+                   load_depth=None, exclude=None) -> dict[str, Union[list, str, None]]:
+    """Page of rows following ``cursor`` ordered by ``id_field`` and the primary key, each page being an index range
+    scan"""
+    columns = key_columns(schema, id_field)
+    query = read_query(db, schema, deep, load_strategy, load_depth, exclude, keep=[c.key for c in columns])
+    return _keyset_page(query, columns, cursor, limit, deep,
+                        _serialize_depth(load_strategy, load_depth), exclude)
+
+
+def get_by_attribute_keyset(db: Session, schema: Type[declarative_base()], attribute, value, cursor, limit,
+                            id_field=None, deep=False, load_strategy=None, load_depth=None, exclude=None,
+                            plan=None, **kwargs) -> dict[str, Union[list, str, None]]:
+    additional_attribute: dict = kwargs.get('additional_attributes', None)
+    if additional_attribute is not None:
+        if not isinstance(additional_attribute, dict):
+            raise Exception("get_by_attribute_keyset: Arguments must be of type dict")
+
+    additional_attribute = {} if additional_attribute is None else additional_attribute
+    all_filter_attributes = _filter_attributes(attribute, value, additional_attribute)
+
+    columns = key_columns(schema, id_field)
+    query = read_query(db, schema, deep, load_strategy, load_depth, exclude, keep=[c.key for c in columns]) \
+        .filter(*filter_model(schema, all_filter_attributes, plan))
+    return _keyset_page(query, columns, cursor, limit, deep,
+                        _serialize_depth(load_strategy, load_depth), exclude)
+
+# endregion keyset
 
 
 def delete(db: Session, schema: Type[declarative_base()], row_id) -> str:
-    db.query(schema).filter_by(id=row_id).delete(synchronize_session="fetch")
+    db.execute(sql_delete(schema).where(schema.id == row_id), execution_options={'synchronize_session': False})
 
     db.commit()
     return "Success"
 
 
-def delete_by_attribute(db: Session, schema: Type[declarative_base()], attribute, value, **kwargs) -> str:
+def delete_by_attribute(db: Session, schema: Type[declarative_base()], attribute, value, plan=None, **kwargs) -> str:
     # filter = {attribute: value}
     additional_attribute: dict = kwargs.get('additional_attributes', None)
     if additional_attribute is not None:
@@ -238,52 +958,369 @@ def delete_by_attribute(db: Session, schema: Type[declarative_base()], attribute
             raise Exception("delete_by_attribute: Arguments must be of type dict")
 
     additional_attribute = {} if additional_attribute is None else additional_attribute
-    all_filter_attributes = {attribute: value, **additional_attribute}
+    all_filter_attributes = _filter_attributes(attribute, value, additional_attribute)
 
-    db.query(schema).filter(*filter_model(schema, all_filter_attributes)).delete(synchronize_session="fetch")
+    db.execute(sql_delete(schema).where(*filter_model(schema, all_filter_attributes, plan)),
+               execution_options={'synchronize_session': False})
 
     db.commit()
     return "Success"
 
 
-def filter_model(schema, filter_attributes):
-    filters = []
-    for k, v in filter_attributes.items():
-        try:
-            # filters = [*filters, to_json(schema)[k] == v]
+# region bulk write
 
-            # make case-insensitive for string
-            # print(to_json(schema)[k].type)
-            if isinstance(to_json_non_recursive(schema)[k].type, (VARCHAR, CHAR, NVARCHAR, TEXT)):
-                filters = [*filters, func.lower(to_json_non_recursive(schema)[k]) == func.lower(v)]
-            else:
-                filters = [*filters, to_json_non_recursive(schema)[k] == v]
+def _any_of(db: Session, column, values: list):
+    """``column = ANY(:values)`` binding a single array on postgresql, ``column IN (...)`` elsewhere"""
+    if db.get_bind().dialect.name == 'postgresql':
+        return column == any_(bindparam(None, values, type_=postgresql.ARRAY(column.type)))
+    return column.in_(values)
+
+
+def _bulk_filters(schema, filter_attributes: dict, function: str, plan=None) -> list:
+    if not filter_attributes:
+        # an empty filter would match the whole table
+        raise Exception("%s: Filters must not be empty" % function)
+    return filter_model(schema, filter_attributes, plan)
 
-        except KeyError:
-            pass
 
+def _update_group(db: Session, schema, id_field, keys: tuple, rows: list[dict]) -> int:
+    """Update rows setting the same ``keys``, one ``UPDATE .. FROM (VALUES ..)`` statement on postgresql, one
+    executemany of ``UPDATE .. WHERE id_field = ?`` elsewhere"""
+    mapper = inspect(schema)
+    table = mapper.local_table
+    columns = {key: mapper.column_attrs[key].columns[0] for key in keys}
+    id_column = columns[id_field]
+
+    if db.get_bind().dialect.name == 'postgresql':
+        rows_values = sql_values(*[sql_column(key, c.type) for key, c in columns.items()], name='bulk_values') \
+            .data([tuple(row[key] for key in keys) for row in rows])
+        statement = sql_update(table).where(id_column == cast(rows_values.c[id_field], id_column.type)) \
+            .values({c.name: cast(rows_values.c[key], c.type) for key, c in columns.items() if key != id_field})
+        return db.execute(statement).rowcount
+
+    statement = sql_update(table).where(id_column == bindparam('_genroutes_id')) \
+        .values({c.name: bindparam('_genroutes_' + key) for key, c in columns.items() if key != id_field})
+    result = db.execute(statement, [{('_genroutes_id' if key == id_field else '_genroutes_' + key): value
+                                     for key, value in row.items()} for row in rows])
+    return result.rowcount
+
+
+def bulk_update(db: Session, schema: Type[declarative_base()], rows: list[dict] = None, id_field='id',
+                filter_attributes: dict = None, data: Union[BaseModel, dict] = None, plan=None) -> int:
+    """Update many rows in one transaction, returning the number of updated rows.
+
+    Either ``rows``, each holding its ``id_field`` value and its own new values, set-based per group of rows
+    updating the same columns (see :func:`_update_group`), or ``data`` set on every row matching
+    ``filter_attributes`` (``attribute__operator`` keys, see :func:`filter_model`) with a single ``UPDATE``.
+    """
+    if (rows is None) == (filter_attributes is None):
+        raise Exception("bulk_update: Pass either rows or filters")
+
+    if rows is None and not data:
+        raise Exception("bulk_update: Pass the data set on filtered rows")
+
+    plan = compile_filters(schema) if plan is None else plan
+    try:
+        if rows is None:
+            if not isinstance(data, dict):
+                data = data.model_dump(exclude_unset=True)
+            statement = sql_update(schema).where(*_bulk_filters(schema, filter_attributes, 'bulk_update', plan)) \
+                .values(**from_json(data))
+            count = db.execute(statement, execution_options={'synchronize_session': False}).rowcount
+        else:
+            groups: dict[tuple, list] = {}
+            for row in rows:
+                if id_field not in row:
+                    raise Exception("bulk_update: Rows must hold their '%s'" % id_field)
+                unknown = [key for key in row if key not in plan]
+                if unknown:
+                    raise Exception("bulk_update: Unsupported fields: %s" % ', '.join(unknown))
+                keys = (id_field, *sorted(key for key in row if key != id_field))
+                groups.setdefault(keys, []).append({key: plan[key].parse(row[key]) for key in keys})
+            count = sum(_update_group(db, schema, id_field, keys, group)
+                        for keys, group in groups.items() if len(keys) > 1)
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return count
+
+
+def bulk_delete(db: Session, schema: Type[declarative_base()], ids: list = None, id_field='id',
+                filter_attributes: dict = None, plan=None) -> int:
+    """Delete the rows whose ``id_field`` is one of ``ids`` (``= ANY(..)`` on postgresql), or the rows matching
+    ``filter_attributes``, with a single ``DELETE``. Returns the number of deleted rows."""
+    if (ids is None) == (filter_attributes is None):
+        raise Exception("bulk_delete: Pass either ids or filters")
+
+    if ids is not None:
+        filter_column = (compile_filters(schema) if plan is None else plan).get(id_field, None)
+        if filter_column is None:
+            raise Exception("bulk_delete: Unsupported id field '%s'" % id_field)
+        filters = [_any_of(db, filter_column.column, [filter_column.parse(v) for v in ids])]
+    else:
+        filters = _bulk_filters(schema, filter_attributes, 'bulk_delete', plan)
+
+    try:
+        count = db.execute(sql_delete(schema).where(*filters),
+                           execution_options={'synchronize_session': False}).rowcount
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    return count
+
+# endregion bulk write
+
+
+# region matching
+
+MATCH_MODES = ('exact', 'lower', 'ilike', 'citext', 'prefix')
+
+_STRING_TYPES = (VARCHAR, CHAR, NVARCHAR, TEXT)
+
+_DDL_DIALECTS = {
+    'postgresql': postgresql.dialect,
+    'sqlite': sqlite.dialect,
+}
+
+
+def check_match_modes(schema, match_modes: dict):
+    """Raise for match modes, by attribute of schema, ``filter_model`` does not support.
+
+    * ``exact`` -- ``column = value``
+    * ``lower`` -- ``lower(column) = lower(value)``, default of VARCHAR, CHAR, NVARCHAR and TEXT columns
+    * ``ilike`` -- ``column ILIKE value``, case-insensitive without a functional index
+    * ``citext`` -- ``column = value`` on a postgresql ``citext`` column, case-insensitive by type
+    * ``prefix`` -- ``column LIKE 'value%'``
+    """
+    mapper = inspect(schema)
+    for attribute, mode in match_modes.items():
+        if mode not in MATCH_MODES:
+            raise Exception("check_match_modes: Unsupported match mode '%s', use one of: %s"
+                            % (mode, ', '.join(MATCH_MODES)))
+        if attribute not in mapper.column_attrs:
+            raise Exception("check_match_modes: Unknown attribute '%s'" % attribute)
+
+
+def match_mode(schema, attribute, match_modes: dict = None) -> str:
+    """Match mode of attribute, set in ``match_modes`` (see :func:`check_match_modes`) or its default"""
+    mode = (match_modes or {}).get(attribute, None)
+    if mode is not None:
+        return mode
+    column_attrs = inspect(schema).column_attrs
+    if attribute in column_attrs and isinstance(column_attrs[attribute].columns[0].type, _STRING_TYPES):
+        return 'lower'
+    return 'exact'
+
+
+def _escape_like(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _match(column, mode, value):
+    if mode == 'lower':
+        return func.lower(column) == func.lower(value)
+    if mode == 'ilike':
+        return column.ilike(_escape_like(value), escape='\\')
+    if mode == 'prefix':
+        return column.startswith(value, autoescape=True)
+    return column == value
+
+
+def index_ddl(schema, dialect_name='postgresql', match_modes: dict = None) -> list[str]:
+    """``CREATE INDEX`` statements keeping the filters of ``filter_model`` on an index, for the attributes set in
+    ``match_modes`` and the string columns matched ``lower`` by default.
+
+    Columns matched ``exact`` or ``citext`` get a plain index unless one already leads with them, ``lower`` a
+    functional ``lower(column)`` index. On postgresql ``prefix`` gets a ``text_pattern_ops`` index and ``ilike`` a
+    ``pg_trgm`` GIN index, ``citext`` columns are expected to be declared with the ``citext`` type.
+    """
+    mapper = inspect(schema)
+    indexed = {c.key for c in sortable_columns(schema).values()}
+    quote = _DDL_DIALECTS.get(dialect_name, DefaultDialect)().identifier_preparer.quote
+    modes = {prop.key: match_mode(schema, prop.key, match_modes) for prop in mapper.column_attrs
+             if prop.key in (match_modes or {}) or match_mode(schema, prop.key) == 'lower'}
+
+    statements = []
+    for attribute, mode in modes.items():
+        if mode in ('ilike', 'prefix') and dialect_name != 'postgresql':
+            continue
+        column = mapper.column_attrs[attribute].columns[0]
+        table = column.table
+        name = quote('ix_%s_%s_%s' % (table.name, column.name, mode))
+        target = quote(table.name) if not table.schema else quote(table.schema) + '.' + quote(table.name)
+        column_name = quote(column.name)
+        if mode == 'lower':
+            statements.append('CREATE INDEX IF NOT EXISTS %s ON %s (lower(%s))' % (name, target, column_name))
+        elif mode == 'prefix':
+            statements.append('CREATE INDEX IF NOT EXISTS %s ON %s (%s text_pattern_ops)'
+                              % (name, target, column_name))
+        elif mode == 'ilike':
+            statements.append('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            statements.append('CREATE INDEX IF NOT EXISTS %s ON %s USING gin (%s gin_trgm_ops)'
+                              % (name, target, column_name))
+        elif attribute not in indexed:
+            statements.append('CREATE INDEX IF NOT EXISTS %s ON %s (%s)' % (name, target, column_name))
+
+    return list(dict.fromkeys(statements))
+
+
+def create_match_indexes(engine, schema, match_modes: dict = None) -> list[str]:
+    """Emit :func:`index_ddl` of schema on engine, return the statements executed"""
+    statements = index_ddl(schema, engine.dialect.name, match_modes)
+    with engine.begin() as connection:
+        for statement in statements:
+            connection.exec_driver_sql(statement)
+    return statements
+
+# endregion matching
+
+
+FILTER_OPERATORS = ('eq', 'ne', 'gt', 'gte', 'lt', 'lte', 'in', 'isnull')
+
+
+def parse_filter_key(key: str) -> tuple[str, str]:
+    """Split a filter key like ``price__gte`` into attribute and operator, ``eq`` when there is none"""
+    attribute, _, operator = key.rpartition('__')
+    if attribute and operator in FILTER_OPERATORS:
+        return attribute, operator
+    return key, 'eq'
+
+
+def _filter_attributes(attribute, value, additional_attribute: dict) -> dict:
+    # routes without a path attribute filter by query parameters only
+    if attribute is None:
+        return {**additional_attribute}
+    return {attribute: value, **additional_attribute}
+
+
+class FilterColumn:
+    """Column of an attribute filter with its type class and match mode, see :func:`compile_filters`"""
+    __slots__ = ('column', 'type_class', 'mode')
+
+    def __init__(self, column, type_class, mode):
+        self.column = column
+        self.type_class = type_class
+        self.mode = mode
+
+    def parse(self, value):
+        """Value of a query parameter converted to the python type of the column"""
+        if not isinstance(value, str):
+            return value
+        try:
+            python_type = self.column.type.python_type
+        except NotImplementedError:
+            return value
+
+        if issubclass(python_type, bool):
+            return value.lower() in ('true', '1', 'yes')
+        if issubclass(python_type, float):
+            return float(value)
+        return _from_cursor_value(self.column, value)
+
+    def match(self, value, operator='eq'):
+        column = self.column
+        if operator == 'isnull':
+            return column.is_(None) if self.parse_bool(value) else column.is_not(None)
+        if operator == 'in':
+            values = value.split(',') if isinstance(value, str) else value
+            return column.in_([self.parse(v) for v in values])
+
+        value = self.parse(value)
+        if operator == 'eq':
+            return _match(column, self.mode, value)
+        if operator == 'ne':
+            return column != value
+        if operator == 'gt':
+            return column > value
+        if operator == 'gte':
+            return column >= value
+        if operator == 'lt':
+            return column < value
+        return column <= value
+
+    @staticmethod
+    def parse_bool(value) -> bool:
+        return value.lower() in ('true', '1', 'yes') if isinstance(value, str) else bool(value)
+
+
+# filter plans of schemas with their default match modes, plans of other modes are kept by their services
+_FILTER_PLANS: dict = {}
+
+
+def compile_filters(schema, match_modes: dict = None) -> dict[str, FilterColumn]:
+    """Filterable attributes of schema by name, matched as set in ``match_modes`` (see :func:`check_match_modes`),
+    computed once per schema for the default match modes"""
+    if match_modes:
+        check_match_modes(schema, match_modes)
+        return {prop.key: FilterColumn(getattr(schema, prop.key), type(prop.columns[0].type),
+                                       match_mode(schema, prop.key, match_modes))
+                for prop in inspect(schema).column_attrs}
+
+    plan = _FILTER_PLANS.get(schema)
+    if plan is None:
+        plan = _FILTER_PLANS.setdefault(schema, {
+            prop.key: FilterColumn(getattr(schema, prop.key), type(prop.columns[0].type), match_mode(schema, prop.key))
+            for prop in inspect(schema).column_attrs})
+    return plan
+
+
+def check_filters(schema, keys, plan=None):
+    """Raise for filter keys (``attribute`` or ``attribute__operator``) schema can not be filtered by"""
+    plan = compile_filters(schema) if plan is None else plan
+    unknown = [k for k in keys if parse_filter_key(k)[0] not in plan]
+    if unknown:
+        raise Exception("filter_model: Unsupported filter attributes: %s" % ', '.join(unknown))
+
+
+def filter_model(schema, filter_attributes, plan=None):
+    """WHERE clauses of filter keys (``attribute`` or ``attribute__operator``, see ``FILTER_OPERATORS``)
+    and their values, matched as in ``plan`` (default :func:`compile_filters` of schema)"""
+    plan = compile_filters(schema) if plan is None else plan
+    check_filters(schema, filter_attributes, plan)
+    filters = []
+    for key, value in filter_attributes.items():
+        attribute, operator = parse_filter_key(key)
+        filters.append(plan[attribute].match(value, operator))
     return filters
 
-def recursive_load(model, depth=1, use_subqueryload=False, parent=''):
-    """Recursively applies subqueryload or joinedload to all relationships in a model."""
+LOAD_STRATEGIES = {
+    'selectin': selectinload,
+    'joined': joinedload,
+    'subquery': subqueryload,
+}
+
+DEFAULT_LOAD_DEPTH = 2
+
+
+def recursive_load(model, depth=1, use_subqueryload=False, parent='', strategy=None):
+    """Recursively applies an eager loading strategy to all relationships in a model.
+
+    ``strategy`` is one of ``LOAD_STRATEGIES`` (``selectin``, ``joined``, ``subquery``),
+    when omitted ``use_subqueryload`` picks between subqueryload and joinedload.
+    """
     load_options = []
     if depth == 0:
         return load_options
 
+    if strategy is None:
+        strategy = 'subquery' if use_subqueryload else 'joined'
+    if strategy not in LOAD_STRATEGIES:
+        raise Exception("recursive_load: Unsupported load strategy '%s'" % strategy)
+    loader = LOAD_STRATEGIES[strategy]
+
     mapper = inspect(model)
     # Iterate through all relationships of the model
     for rel in mapper.relationships:
         # Access the class-bound attribute dynamically
         relationship_attr = getattr(model, rel.key)
-        # Use either subqueryload or joinedload based on the flag
-        if use_subqueryload:
-            opt = subqueryload(relationship_attr)
-        else:
-            opt = joinedload(relationship_attr)
+        opt = loader(relationship_attr)
 
         # Recurse to nested relationships
         if rel.mapper and hasattr(rel.mapper.class_, '__mapper__'):
-            nested_opts = recursive_load(rel.mapper.class_, depth - 1, use_subqueryload, parent=relationship_attr)
+            nested_opts = recursive_load(rel.mapper.class_, depth - 1, use_subqueryload, parent=relationship_attr,
+                                         strategy=strategy)
             load_options = [*load_options, opt]
             for nested in nested_opts:
                 load_options = [*load_options, opt.options(nested)]
@@ -292,8 +1329,8 @@ def recursive_load(model, depth=1, use_subqueryload=False, parent=''):
 
     return load_options
 
-def query_with_all_relationships(session, model, depth=2, use_subqueryload=False):
-    options = recursive_load(model, depth, use_subqueryload)
+def query_with_all_relationships(session, model, depth=DEFAULT_LOAD_DEPTH, use_subqueryload=False, strategy=None):
+    options = recursive_load(model, depth, use_subqueryload, strategy=strategy)
     query = session.query(model)
 
     query = query.options(*options)
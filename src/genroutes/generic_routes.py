@@ -1,18 +1,43 @@
+import datetime
+import email.utils
+import functools
+import hashlib
+import inspect as pyinspect
+import itertools
+import json
 import string
+import threading
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
 from enum import Enum
-from typing import Annotated, Union, Type
-from typing import Iterator
+from typing import Annotated, Any, Union, Type
+from typing import AsyncIterator, Callable, Iterator
 
 from fastapi import APIRouter, HTTPException, Depends, Response, status, Body, Header, Request
 from fastapi.encoders import jsonable_encoder
 from fastapi.security import OAuth2PasswordBearer
 from pydantic import BaseModel
+from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.inspection import inspect
 from sqlalchemy.orm import Session
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
-from starlette.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import StreamingResponse
 
 from . import crud
+from . import metrics
+from .cache import CacheBackend, cache_backend
+from .metrics import Metrics, metrics_registry
+from .profiling import Profiler, ProfilingMiddleware, profiler_registry
+from .replicas import replica_set
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
 
 
 class HttpMethods(Enum):
@@ -31,29 +56,74 @@ class HttpMethods(Enum):
     READ_ONLY = [GET, GET_BY_ATTRIBUTE]
 
 
-def create(db: Session, schema, key_attribute, data: BaseModel, *args):
+def _error_detail(ex: BaseException) -> str:
+    """Message of the DBAPI error behind an exception, or of the exception itself"""
+    return str(getattr(ex, 'orig', None) or ex)
+
+
+def _is_unique_violation(ex: BaseException) -> bool:
+    """Whether ex is the ``IntegrityError`` of a unique index or constraint, rather than e.g. of a NOT NULL column"""
+    if not isinstance(ex, IntegrityError):
+        return False
+    orig = getattr(ex, 'orig', None)
+    code = getattr(orig, 'pgcode', None) or getattr(orig, 'sqlstate', None)
+    if code is not None:
+        return code == '23505'
+    message = str(orig).lower()
+    return 'unique' in message or 'duplicate' in message
+
+
+def create(db: Session, schema, key_attribute, data: BaseModel, *args, exclude=None, on_conflict=None, plan=None):
     """Create records of model on datasource using data object.
 
     ``key_attribute`` is used to check for duplicates before creation
     ``*args`` additional key fields to be used in duplication check
+    ``on_conflict`` ``nothing`` (409 on duplicates) or ``update`` (upsert) detects duplicates within the insert
+    statement itself where the database supports ``ON CONFLICT``. Elsewhere duplicates are looked up before the
+    insert or update, which is not atomic: a duplicate inserted concurrently is reported by the unique index of
+    the key fields (409) when there is one
 
     """
-    additional_attribute = {}
-    for arg in args:
-        additional_attribute = {**additional_attribute, str(arg): data.dict(exclude_unset=True)[str(arg)]}
+    values = data if isinstance(data, dict) else data.model_dump(exclude_unset=True)
+    key_attributes = [key_attribute, *[str(arg) for arg in args]]
+
+    if on_conflict is not None and crud.supports_on_conflict(db):
+        try:
+            new_object = crud.create_on_conflict(db, schema, values, key_attributes, on_conflict, exclude=exclude)
+        except BaseException as ex:
+            raise HTTPException(status_code=400, detail=_error_detail(ex))
+        if new_object is None:
+            raise HTTPException(status_code=409, detail="data already exists")
+        return new_object
 
-    # obj = crud.get_by_attribute(db, schema, key_attribute, data[key_attribute])
+    try:
+        if any(k not in values for k in key_attributes):
+            # generated keys can not clash
+            return crud.create(db, schema, data, exclude=exclude)
 
-    obj = crud.get_by_attribute(db, schema, key_attribute, data.dict(exclude_unset=True)[key_attribute],
-                                **{'additional_attributes': additional_attribute})
+        additional_attribute = {str(arg): values[str(arg)] for arg in args}
 
-    if len(obj) > 0:
-        raise HTTPException(status_code=409, detail="data already exists")
+        # obj = crud.get_by_attribute(db, schema, key_attribute, data[key_attribute])
 
-    new_object = crud.create(db, schema, data)
+        obj = crud.get_by_attribute(db, schema, key_attribute, values[key_attribute], plan=plan,
+                                    **{'additional_attributes': additional_attribute})
+        if len(obj) == 0:
+            return crud.create(db, schema, data, exclude=exclude)
+    except BaseException as ex:
+        db.rollback()
+        if _is_unique_violation(ex):
+            # a duplicate inserted between the lookup and the insert
+            raise HTTPException(status_code=409, detail="data already exists")
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
 
-    db.close()
-    return new_object
+    if on_conflict != 'update':
+        raise HTTPException(status_code=409, detail="data already exists")
+    try:
+        return crud.update_by_attribute(db, schema, data, key_attribute, values[key_attribute], exclude=exclude,
+                                        plan=plan, additional_attributes=additional_attribute)[0]
+    except BaseException as ex:
+        db.rollback()
+        raise HTTPException(status_code=409 if _is_unique_violation(ex) else 400, detail=_error_detail(ex))
 
 
 # def update(db: Session, model, data, id):
@@ -72,20 +142,11 @@ def update(db: Session, schema, data, attribute, value, **kwargs):
         if not isinstance(additional_attribute, dict):
             raise Exception("Arguments must be of type dict")
 
-    try:
-        obj = crud.get_by_attribute(db, schema, attribute, value, **kwargs)
-    except BaseException as ex:
-        raise HTTPException(status_code=400, detail=str(ex.orig))
-
-    if obj is None:
-        raise HTTPException(status_code=404, detail="data not found")
-
     try:
         updated = crud.update_by_attribute(db, schema, data, attribute, value, **kwargs)
     except BaseException as ex:
-        raise HTTPException(status_code=400, detail=str(ex.orig))
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
 
-    db.close()
     return updated
 
 
@@ -96,20 +157,11 @@ def patch(db: Session, schema, data, attribute, value, **kwargs):
         if not isinstance(additional_attribute, dict):
             raise Exception("Arguments must be of type dict")
 
-    try:
-        obj = crud.get_by_attribute(db, schema, attribute, value, **kwargs)
-    except BaseException as ex:
-        raise HTTPException(status_code=400, detail=str(ex.orig))
-
-    if obj is None:
-        raise HTTPException(status_code=404, detail="data not found")
-
     try:
         updated = crud.update_by_attribute(db, schema, data, attribute, value, **kwargs)
     except BaseException as ex:
-        raise HTTPException(status_code=400, detail=str(ex.orig))
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
 
-    db.close()
     return updated
 
 
@@ -129,42 +181,36 @@ def delete(db: Session, schema, attribute, value, **kwargs):
     if additional_attribute is not None:
         if not isinstance(additional_attribute, dict):
             raise Exception("Arguments must be of type dict")
-    try:
-        obj = crud.get_by_attribute(db, schema, attribute, value, **kwargs)
-    except BaseException as ex:
-        raise HTTPException(status_code=400, detail=str(ex.orig))
-
-    if obj is None:
-        raise HTTPException(status_code=404, detail="data not found")
-
     try:
         msg = crud.delete_by_attribute(db, schema, attribute, value, **kwargs)
     except BaseException as ex:
-        raise HTTPException(status_code=400, detail=str(ex.orig))
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
 
-    db.close()
     return {"message": msg}
 
 
-def read(db: Session, schema, deep=False):
+def read(db: Session, schema, deep=False, load_strategy=None, load_depth=None, exclude=None, order_by=None,
+         raw_rows=False):
     """Read all records of model from datasource"""
     try:
-        obj = crud.get_all(db, schema, deep=deep)
+        obj = crud.get_all(db, schema, deep=deep, load_strategy=load_strategy, load_depth=load_depth,
+                           exclude=exclude, order_by=order_by, raw_rows=raw_rows)
     except BaseException as ex:
-        raise HTTPException(status_code=400, detail=str(ex.orig))
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
     # print(obj)
-    db.close()
     return obj
 
 
-def read_paginated(db: Session, schema, page: int, limit: int, deep=False):
+def read_paginated(db: Session, schema, page: int, limit: int, deep=False, load_strategy=None, load_depth=None,
+                   order_by=None, count_mode='exact', exclude=None, raw_rows=False):
     """Read all records of model from datasource"""
     try:
-        obj = crud.get_all_paginated(db, schema, page, limit, deep=deep)
+        obj = crud.get_all_paginated(db, schema, page, limit, deep=deep, load_strategy=load_strategy,
+                                     load_depth=load_depth, order_by=order_by, count_mode=count_mode,
+                                     exclude=exclude, raw_rows=raw_rows)
     except BaseException as ex:
-        raise HTTPException(status_code=400, detail=str(ex.orig))
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
     # print(obj)
-    db.close()
     return obj
 
 
@@ -178,18 +224,38 @@ def read_by_attribute(db: Session, schema, attribute, value, deep=False,**kwargs
     try:
         obj = crud.get_by_attribute(db, schema, attribute, value, deep=deep,**kwargs)
     except BaseException as ex:
-        raise HTTPException(status_code=400, detail=str(ex.orig))
-    db.close()
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
     return obj
 
 
-def read_by_id(db: Session, schema, id_field, value, deep=True):
+def read_by_id(db: Session, schema, id_field, value, deep=True, load_strategy=None, load_depth=None, exclude=None,
+               plan=None):
     """Read records of model from datasource filtered by 'attribute = value' """
     try:
-        obj = crud.get_by_id(db, schema, id_field, value, deep=deep)
+        obj = crud.get_by_id(db, schema, id_field, value, deep=deep, load_strategy=load_strategy,
+                             load_depth=load_depth, exclude=exclude, plan=plan)
+    except BaseException as ex:
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
+    return obj
+
+
+def read_by_ids(db: Session, schema, id_field, values: list, deep=True, load_strategy=None, load_depth=None,
+                exclude=None, plan=None):
+    """Read records of model from datasource by id, keyed by id"""
+    try:
+        obj = crud.get_by_ids(db, schema, id_field, values, deep=deep, load_strategy=load_strategy,
+                              load_depth=load_depth, exclude=exclude, plan=plan)
+    except BaseException as ex:
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
+    return obj
+
+
+def read_version(db: Session, schema, id_field, value, version_field, plan=None):
+    """Read the version column of a record of model from datasource"""
+    try:
+        obj = crud.get_version(db, schema, id_field, value, version_field, plan=plan)
     except BaseException as ex:
-        raise HTTPException(status_code=400, detail=str(ex.orig))
-    db.close()
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
     return obj
 
 
@@ -203,21 +269,318 @@ def read_by_attribute_paginated(db: Session, schema, attribute, value, page, lim
     try:
         obj = crud.get_by_attribute_paginated(db, schema, attribute, value, page, limit, deep=deep, **kwargs)
     except BaseException as ex:
-        raise HTTPException(status_code=400, detail=str(ex.orig))
-    db.close()
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
     return obj
 
 
-def create_any(db: Session, schema, data):
+def read_keyset(db: Session, schema, cursor, limit: int, id_field=None, deep=False, load_strategy=None,
+                load_depth=None, exclude=None):
+    """Read a page of records of model from datasource following ``cursor``"""
+    try:
+        obj = crud.get_all_keyset(db, schema, cursor, limit, id_field=id_field, deep=deep,
+                                  load_strategy=load_strategy, load_depth=load_depth, exclude=exclude)
+    except BaseException as ex:
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
+    return obj
+
+
+def read_by_attribute_keyset(db: Session, schema, attribute, value, cursor, limit, id_field=None, deep=False,
+                             **kwargs):
+    """Read a page of records of model from datasource filtered by 'attribute = value' following ``cursor``"""
+    additional_attribute: dict = kwargs.get('additional_attributes', None)
+    if additional_attribute is not None:
+        if not isinstance(additional_attribute, dict):
+            raise Exception("Arguments must be of type dict")
+
+    try:
+        obj = crud.get_by_attribute_keyset(db, schema, attribute, value, cursor, limit, id_field=id_field, deep=deep,
+                                           **kwargs)
+    except BaseException as ex:
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
+    return obj
+
+
+def dumps(content) -> bytes:
+    """Encode serialized records to JSON bytes in a single pass, with orjson when installed.
+
+    Rows are already JSON compatible (see :func:`crud.serialize`), ``jsonable_encoder`` is only
+    the fallback for values of other types.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=jsonable_encoder)
+    return json.dumps(content, separators=(',', ':'), ensure_ascii=False, default=jsonable_encoder).encode('utf-8')
+
+
+def json_response(content, status_code: int = status.HTTP_200_OK) -> Response:
+    """JSON response of serialized records, written straight to bytes"""
+    with metrics.timed('encode'):
+        body = dumps(content)
+    metrics.record_payload(content, body)
+    return Response(content=body, status_code=status_code, media_type='application/json')
+
+
+# region conditional
+
+def etag(body: bytes) -> str:
+    """Strong ETag of a response body"""
+    return '"%s"' % hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def _http_date(value: datetime.datetime) -> str:
+    # naive datetimes are taken as UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return email.utils.format_datetime(value.astimezone(datetime.timezone.utc), usegmt=True)
+
+
+def not_modified(request: Request, headers: dict) -> Union[Response, None]:
+    """``304 Not Modified`` response when the validators in headers (``ETag``, ``Last-Modified``) match the
+    request's ``If-None-Match`` or, without it, ``If-Modified-Since`` header"""
+    if_none_match = request.headers.get('if-none-match', None)
+    if if_none_match is not None:
+        tags = [t.strip() for t in if_none_match.split(',')]
+        # weak comparison, W/"x" matches "x"
+        tags = [t[2:] if t.startswith('W/') else t for t in tags]
+        if '*' not in tags and headers.get('ETag', None) not in tags:
+            return None
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if_modified_since = request.headers.get('if-modified-since', None)
+    last_modified = headers.get('Last-Modified', None)
+    if if_modified_since is None or last_modified is None:
+        return None
+    try:
+        if email.utils.parsedate_to_datetime(last_modified) > email.utils.parsedate_to_datetime(if_modified_since):
+            return None
+    except (TypeError, ValueError):
+        return None
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+# endregion conditional
+
+
+def read_stream(db: Session, rows: Iterator[dict]) -> Iterator[dict]:
+    """Yield streamed records of model, closing the session once they are consumed"""
+    try:
+        yield from rows
+    finally:
+        db.close()
+
+
+def open_stream(db: Session, rows_of: Callable[[Session], Iterator[dict]]) -> Iterator[dict]:
+    """Records of ``rows_of(db)`` streamed by :func:`read_stream`, the first one read before the response starts
+    so errors of the query answer 400 like the ``read_*`` helpers, closing the session"""
+    try:
+        rows = rows_of(db)
+        first = next(rows, None)
+    except BaseException as ex:
+        db.close()
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
+    return read_stream(db, rows if first is None else itertools.chain((first,), rows))
+
+
+STREAM_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+STREAM_BATCH_SIZE = 100
+
+# schema translations of a service keeping their engine proxy, the least recently used dropped first
+BIND_CACHE_SIZE = 128
+
+
+def _encode_batch(batch: list[bytes], ndjson: bool, prefix: bytes) -> bytes:
+    if ndjson:
+        return b'\n'.join(batch) + b'\n'
+    return prefix + b','.join(batch)
+
+
+def _encode_stream(rows: Iterator[dict], stream_format) -> Iterator[bytes]:
+    """Encode rows as NDJSON lines or as a chunked JSON array, ``STREAM_BATCH_SIZE`` rows per chunk"""
+    ndjson = stream_format == 'ndjson'
+    if not ndjson:
+        yield b'['
+
+    batch = []
+    prefix = b''
+    for row in rows:
+        batch.append(dumps(row))
+        if len(batch) == STREAM_BATCH_SIZE:
+            yield _encode_batch(batch, ndjson, prefix)
+            batch, prefix = [], b','
+
+    if batch:
+        yield _encode_batch(batch, ndjson, prefix)
+    if not ndjson:
+        yield b']'
+
+
+async def _aencode_stream(rows: AsyncIterator[dict], stream_format) -> AsyncIterator[bytes]:
+    """:func:`_encode_stream` of rows streamed by an async session"""
+    ndjson = stream_format == 'ndjson'
+    if not ndjson:
+        yield b'['
+
+    batch = []
+    prefix = b''
+    async for row in rows:
+        batch.append(dumps(row))
+        if len(batch) == STREAM_BATCH_SIZE:
+            yield _encode_batch(batch, ndjson, prefix)
+            batch, prefix = [], b','
+
+    if batch:
+        yield _encode_batch(batch, ndjson, prefix)
+    if not ndjson:
+        yield b']'
+
+
+def check_stream_format(stream_format: str):
+    if stream_format not in STREAM_FORMATS:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST,
+                            detail="Unsupported stream format '%s', use one of: %s"
+                                   % (stream_format, ', '.join(STREAM_FORMATS)))
+
+
+def streaming_response(stream_format: str, stream_rows) -> StreamingResponse:
+    """Stream records returned by ``stream_rows()`` as NDJSON (``ndjson``) or a JSON array (``json``)"""
+    check_stream_format(stream_format)
+    rows = stream_rows()
+    encode = _aencode_stream if hasattr(rows, '__aiter__') else _encode_stream
+    return StreamingResponse(encode(rows, stream_format), media_type=STREAM_FORMATS[stream_format])
+
+
+LIST_QUERY_PARAMS = ('page', 'limit', 'deep', 'cursor', 'sort', 'order', 'count', 'stream', 'fields', 'ids')
+
+
+def check_list_params(cursor=None, limit=None, sort=None):
+    """Reject list parameters that cannot apply together: ``cursor`` pages in key order, so without ``sort``, and
+    needs ``limit``"""
+    if cursor is not None and limit is None:
+        raise HTTPException(status_code=400, detail="cursor requires limit")
+    if cursor is not None and sort is not None:
+        raise HTTPException(status_code=400, detail="cursor cannot be combined with sort")
+
+
+def read_list(service, id_field, request: Request, attribute=None, value=None, page=None, limit=None, deep=False,
+              cursor=None, sort=None, count=None, stream=None, fields=None, ids=None) -> Response:
+    """Response of a list route: rows by id, keyset page, offset page, stream or all rows, filtered by the path
+    attribute and the query parameters other than ``LIST_QUERY_PARAMS`` (``attribute__operator=value``)"""
+    param: dict = {k: v for k, v in request.query_params.items() if k not in LIST_QUERY_PARAMS}
+    fields = fields.split(',') if fields else None
+    check_list_params(cursor, limit, sort)
+
+    if ids is not None:
+        service.check_ids(attribute, param)
+        return json_response(service.get_many(ids.split(','), id_field, deep=deep, fields=fields))
+
+    if attribute is None and not param:
+        if cursor is not None and limit is not None:
+            return json_response(service.get_all_keyset(cursor, limit, id_field, deep=deep, fields=fields))
+        if page is not None and limit is not None:
+            return json_response(service.get_all_paginated(page, limit, deep=deep, sort=sort, count=count,
+                                                           fields=fields))
+        if stream is not None:
+            return streaming_response(stream, lambda: service.stream_all(deep=deep, sort=sort, fields=fields))
+        return json_response(service.get_all(deep=deep, sort=sort, fields=fields))
+
+    service.check_filters(attribute, param)
+    additional_attributes = {'additional_attributes': param} if param else {}
+    if cursor is not None and limit is not None:
+        return json_response(service.get_by_attribute_keyset(
+            value, attribute, cursor, limit, id_field, deep=deep, fields=fields, **additional_attributes))
+    if page is not None and limit is not None:
+        return json_response(service.get_by_attribute_paginated(
+            value, attribute, page, limit, deep=deep, sort=sort, count=count, fields=fields,
+            **additional_attributes))
+    if stream is not None:
+        return streaming_response(stream, lambda: service.stream_by_attribute(
+            value, attribute, deep=deep, sort=sort, fields=fields, **additional_attributes))
+    return json_response(service.get_by_attribute(value, attribute, deep=deep, sort=sort, fields=fields,
+                                                  **additional_attributes))
+
+
+def create_any(db: Session, schema, data, exclude=None):
     """Create records without validating against unique fields"""
     try:
-        new_object = crud.create(db, schema, data)
+        new_object = crud.create(db, schema, data, exclude=exclude)
     except BaseException as ex:
-        raise HTTPException(status_code=400, detail=str(ex.orig))
-    db.close()
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
     return new_object
 
 
+def bulk_create(db: Session, schema, data: list, exclude=None):
+    """Create records in one transaction without validating against unique fields"""
+    try:
+        rows = crud.bulk_create(db, schema, data, exclude=exclude)
+    except BaseException as ex:
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
+    return rows
+
+
+class BulkUpdate(BaseModel):
+    """Body of ``POST /{path}/bulk-update``: ``rows`` holding their id and new values, or ``data`` set on the rows
+    matching ``filter`` (``attribute__operator`` keys)"""
+    rows: Union[list[dict[str, Any]], None] = None
+    filter: Union[dict[str, Any], None] = None
+    data: Union[dict[str, Any], None] = None
+
+
+class BulkDelete(BaseModel):
+    """Body of ``POST /{path}/bulk-delete``: ``ids`` of the rows to delete, or a ``filter`` matching them"""
+    ids: Union[list[Union[int, str]], None] = None
+    filter: Union[dict[str, Any], None] = None
+
+
+def bulk_update(db: Session, schema, rows: list = None, id_field='id', filter_attributes: dict = None, data=None,
+                plan=None):
+    """Update many records in one transaction, by id or by filter"""
+    try:
+        count = crud.bulk_update(db, schema, rows, id_field=id_field, filter_attributes=filter_attributes, data=data,
+                                 plan=plan)
+    except BaseException as ex:
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
+    return {"updated": count}
+
+
+def bulk_delete(db: Session, schema, ids: list = None, id_field='id', filter_attributes: dict = None, plan=None):
+    """Delete many records with one statement, by id or by filter"""
+    try:
+        count = crud.bulk_delete(db, schema, ids, id_field=id_field, filter_attributes=filter_attributes, plan=plan)
+    except BaseException as ex:
+        raise HTTPException(status_code=400, detail=_error_detail(ex))
+    return {"deleted": count}
+
+
+def _check_model_fields(model, data: dict):
+    invalid = [x for x in data if x not in model.model_fields]
+    if invalid:
+        raise HTTPException(status.HTTP_400_BAD_REQUEST, detail='Unsupported fields found: ' + (' ,'.join(invalid)))
+
+
+def _client_key(request: Request) -> Union[str, None]:
+    """Client of a request pinned to the primary after its writes, by a digest of its credentials or else its
+    address"""
+    authorization = request.headers.get('authorization', None)
+    if authorization:
+        return hashlib.blake2b(authorization.encode(), digest_size=16).hexdigest()
+    return request.client.host if request.client else None
+
+
+def _pool_options(pool_size=None, max_overflow=None, pool_pre_ping=None, pool_recycle=None,
+                  pool_timeout=None) -> dict:
+    """``create_engine`` pool arguments that are set"""
+    options = {'pool_size': pool_size, 'max_overflow': max_overflow, 'pool_pre_ping': pool_pre_ping,
+               'pool_recycle': pool_recycle, 'pool_timeout': pool_timeout}
+    return {key: value for key, value in options.items() if value is not None}
+
+
+def _with_headers(response: Response, headers: dict) -> Response:
+    response.headers.update(headers)
+    return response
+
+
 def _method_name(name):
     """Rename methods with decorator"""
 
@@ -228,6 +591,33 @@ def _method_name(name):
     return decorator
 
 
+def _invalidates_cache(method):
+    """Clear the service's response cache once a write method returns or fails, and pin the client's reads to
+    the primary"""
+    if pyinspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(self, *args, **kwargs):
+            try:
+                return await method(self, *args, **kwargs)
+            finally:
+                if self.cache is not None:
+                    self.cache.clear()
+                self._pin_primary()
+
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            if self.cache is not None:
+                self.cache.clear()
+            self._pin_primary()
+
+    return wrapper
+
+
 class Routes:
     """Crud routes generator for FastAPI projects using SQLAlchemy
     Generate crud routes using pydantic schemas and their corresponding SQLAlchemy models
@@ -283,8 +673,27 @@ class Routes:
 
     """
 
-    def __init__(self, session: sessionmaker, auth_route: str = None):
+    def __init__(self, session: sessionmaker, auth_route: str = None, read_session=None,
+                 read_strategy: str = 'round_robin', pin_primary: float = 0, metrics: Union[bool, Metrics] = None,
+                 profile: Union[bool, Profiler] = None):
+        """
+            :param session: session factory of the primary database, serving writes.
+            :param auth_route: authentication endpoint, routes require a bearer token when set.
+            :param read_session: session factory of a read replica, a list of them or a
+                :class:`replicas.ReplicaSet`, serving ``GET`` routes (default the primary).
+            :param read_strategy: replica serving each read, ``round_robin`` or ``least_connections``.
+            :param pin_primary: seconds a client's reads stay on the primary after it writes, so it reads its
+                own writes despite replication lag (per process, shared by the routers of these replicas).
+            :param metrics: measure requests of the generated routes in a new (``True``) or the given
+                :class:`metrics.Metrics`, exported by :meth:`add_metrics` (default no metrics).
+            :param profile: record the SQL statements of each request in a new (``True``) or the given
+                :class:`profiling.Profiler`, flagging likely N+1 patterns, see :meth:`add_profiling`.
+        """
         self.session = session
+        self.replicas = replica_set(read_session, read_strategy)
+        self.pin_primary = pin_primary
+        self.metrics = metrics_registry(metrics)
+        self.profiler = profiler_registry(profile)
         self.oauth2_scheme = None
 
         if auth_route is not None:
@@ -292,6 +701,41 @@ class Routes:
                 # print(auth_route)
                 self.oauth2_scheme = OAuth2PasswordBearer(tokenUrl=auth_route)
 
+    @classmethod
+    def from_url(cls, url: str, auth_route: str = None, pool_size: int = None, max_overflow: int = None,
+                 pool_pre_ping: bool = None, pool_recycle: int = None, pool_timeout: float = None,
+                 read_urls: list[str] = None, read_strategy: str = 'round_robin', pin_primary: float = 0,
+                 metrics: Union[bool, Metrics] = None, profile: Union[bool, Profiler] = None, **engine_options):
+        """Routes over a new engine of ``url`` with the given connection pool settings, and of ``read_urls``
+        replicas with the same settings (see :meth:`__init__`).
+
+            :param pool_size: connections kept open in the pool (SQLAlchemy default 5).
+            :param max_overflow: connections opened beyond ``pool_size`` under load, closed once returned
+                (SQLAlchemy default 10).
+            :param pool_pre_ping: test connections on checkout, replacing those dropped by the server.
+            :param pool_recycle: seconds after which connections are replaced, below the server's idle timeout.
+            :param pool_timeout: seconds a request waits for a connection when the pool is exhausted.
+            :param engine_options: other ``create_engine`` arguments.
+
+            Unset settings keep the SQLAlchemy defaults, pools without them (e.g. sqlite ``StaticPool``) reject them.
+        """
+        options = {**_pool_options(pool_size, max_overflow, pool_pre_ping, pool_recycle, pool_timeout),
+                   **engine_options}
+        sessions = [sessionmaker(autocommit=False, autoflush=False, bind=create_engine(u, **options))
+                    for u in [url, *(read_urls or [])]]
+        return cls(sessions[0], auth_route, read_session=sessions[1:] or None, read_strategy=read_strategy,
+                   pin_primary=pin_primary, metrics=metrics, profile=profile)
+
+    def pool_status(self) -> dict[str, int]:
+        """Connection counts of the session factory's engine pool: ``size``, ``checked_in``, ``checked_out`` and
+        ``overflow``, those the pool class keeps"""
+        engine = self.session.kw.get('bind', None)
+        if engine is None:
+            raise Exception("pool_status: session factory is not bound to an engine")
+        pool = getattr(engine, 'sync_engine', engine).pool
+        counts = {'size': 'size', 'checked_in': 'checkedin', 'checked_out': 'checkedout', 'overflow': 'overflow'}
+        return {key: getattr(pool, attr)() for key, attr in counts.items() if hasattr(pool, attr)}
+
     def get_router(self, path: str, schema,
                    model: Union[BaseModel, Type[BaseModel]], model_create: Union[BaseModel, Type[BaseModel]], **kwargs):
         """ Generate and return router.
@@ -306,38 +750,58 @@ class Routes:
 
              * *response_exclude* (``list``) -- list of schema fields to be excluded from response.
              * *access_mode* (``dict``) -- dict of HTTPMethods to be generated (e.g. GET, POST).
+             * *id_field* (``str``) -- primary key field of schema (default ``id``).
+             * *load_strategy* (``str``) -- eager loading of relationships for ``deep`` reads,
+               one of ``selectin``, ``joined`` or ``subquery`` (default lazy loading).
+             * *load_depth* (``int``) -- relationship levels loaded and serialized by ``deep`` reads.
+             * *count_mode* (``str``) -- total count of paginated reads, one of ``exact`` (default), ``none``,
+               ``estimate`` or ``window``, overridden per request by the ``count`` query parameter.
+             * *on_conflict* (``str``) -- duplicate handling of ``POST``, ``nothing`` (409 when a row with the same
+               ``key_fields`` exists) or ``update`` (upsert), checked by the insert statement itself on databases
+               supporting ``ON CONFLICT`` (default no duplicate check).
+             * *key_fields* (``list``) -- fields identifying duplicates for ``on_conflict``, covered by a unique
+               index or constraint (default the first unique constraint other than the primary key).
+             * *match_modes* (``dict``) -- how attribute filters match values, by attribute: ``exact``, ``lower``,
+               ``ilike``, ``citext`` or ``prefix`` (see :func:`crud.check_match_modes`).
+             * *filter_fields* (``list``) -- attributes list routes can be filtered by with
+               ``attribute__operator=value`` query parameters (default all columns but ``response_exclude``).
+             * *sort_fields* (``list``) -- attributes list routes can be ordered by with ``order`` / ``sort``
+               (default columns leading an index, but ``response_exclude``).
+             * *bulk_create* (``bool``) -- also generate ``POST /{path}/bulk`` creating a list of records in one
+               transaction (default ``False``).
+             * *bulk_update* (``bool``) -- also generate ``POST /{path}/bulk-update`` updating records by id or by
+               filter in one transaction, with ``PATCH`` access (default ``False``).
+             * *bulk_delete* (``bool``) -- also generate ``POST /{path}/bulk-delete`` deleting records by id or by
+               filter with one statement, with ``DELETE`` access (default ``False``).
+             * *raw_rows* (``bool``) -- serve shallow list reads from column tuples instead of ORM instances, rows
+               then hold columns only (default ``False``).
+             * *cache* (``bool`` or ``CacheBackend``) -- cache ``GET`` responses by path, query and ``user_schema``
+               in a :class:`cache.MemoryCache` (``True``) or the given backend, cleared by every write of the
+               router's service (default no cache).
+             * *etag_field* (``str``) -- version or ``updated_at`` column validating ``GET /{path}/{id}`` responses
+               (``ETag``, ``Last-Modified``) without reading the row, default an ETag of the response body.
 
             :return: router (``APIRouter``)
 
         """
-        response_model_exclude: set = kwargs.get('response_exclude', None)
-        access_mode: list = kwargs.get('access_mode', HttpMethods.ALL_METHODS)
-        id_field: str = kwargs.get('id_field', 'id')
-
-        tag: str = string.capwords(path.replace('_', ' '))  # string.capwords(schema.__name__)
-        methodtag: str = path.lower()  # schema.__name__.lower()
-
-        '''Process access methods in to list of HTTPMethods'''
-        if isinstance(access_mode, HttpMethods):
-            if not isinstance(access_mode.value, list):
-                access_mode = [access_mode.value]
-            else:
-                access_mode = access_mode.value
-
-        router = APIRouter(prefix="/" + path)
-
-        def get_db() -> Iterator[Session]:
-            db = self.session()
-            try:
-                yield db
-            finally:
-                db.close()
-
-        def get_model():
-            return schema
+        options = self._router_options(path, kwargs)
+        response_model_exclude: set = options['response_exclude']
+        id_field: str = options['id_field']
+        methodtag: str = options['methodtag']
+        on_conflict: str = options['on_conflict']
+        key_fields: list = self._conflict_keys(schema, options)
 
         # region crud_methods
-        service = Service(self.session, schema)
+        service = Service(self.session, schema, load_strategy=options['load_strategy'],
+                          load_depth=options['load_depth'], count_mode=options['count_mode'],
+                          exclude=response_model_exclude, match_modes=options['match_modes'],
+                          filter_fields=options['filter_fields'], sort_fields=options['sort_fields'],
+                          raw_rows=options['raw_rows'], cache=options['cache'], etag_field=options['etag_field'],
+                          read_session=self.replicas, pin_primary=self.pin_primary, metrics=self.metrics,
+                          profiler=self.profiler)
+
+        # sessions of a request are released once it is handled, whatever the outcome
+        router = APIRouter(prefix="/" + path, dependencies=[Depends(service.request_scope)])
 
         @_method_name('create_' + methodtag)
         def create(data: model_create,
@@ -350,7 +814,10 @@ class Routes:
                 service.set_dbschema({None: user_schema})
             else:
                 service.set_dbschema(None)
-            return JSONResponse(jsonable_encoder(service.create_any(data), exclude=response_model_exclude))
+            if on_conflict is not None:
+                return json_response(service.create(data, *key_fields, on_conflict=on_conflict),
+                                     status_code=status.HTTP_201_CREATED)
+            return json_response(service.create_any(data), status_code=status.HTTP_201_CREATED)
 
         @_method_name('create_' + methodtag)
         def create_na(data: model_create, user_schema: Union[str, None] = Header(default=None)):
@@ -363,15 +830,44 @@ class Routes:
                 service.set_dbschema({None: user_schema})
             else:
                 service.set_dbschema(None)
-            return JSONResponse(jsonable_encoder(service.create_any(data), exclude=response_model_exclude))
+            if on_conflict is not None:
+                return json_response(service.create(data, *key_fields, on_conflict=on_conflict),
+                                     status_code=status.HTTP_201_CREATED)
+            return json_response(service.create_any(data), status_code=status.HTTP_201_CREATED)
+
+        @_method_name('create_' + methodtag + '_bulk')
+        def create_bulk(data: list[model_create],
+                        token=Depends(self.oauth2_scheme), user_schema: Union[str, None] = Header(default=None)):
+            if user_schema:
+                service.set_dbschema({None: user_schema})
+            else:
+                service.set_dbschema(None)
+            return json_response(service.bulk_create(data), status_code=status.HTTP_201_CREATED)
+
+        @_method_name('create_' + methodtag + '_bulk')
+        def create_bulk_na(data: list[model_create], user_schema: Union[str, None] = Header(default=None)):
+            """No authentication """
+            if user_schema:
+                service.set_dbschema({None: user_schema})
+            else:
+                service.set_dbschema(None)
+            return json_response(service.bulk_create(data), status_code=status.HTTP_201_CREATED)
 
         # @self.router.get("", response_model=list[schema]response_model_exclude=response_model_exclude,)
 
         @_method_name('get_' + methodtag)
-        def get_paginated(page: Union[int, None] = None, limit: Union[int, None] = None,
+        def get_paginated(request: Request,
+                          page: Union[int, None] = None, limit: Union[int, None] = None,
                           token=Depends(self.oauth2_scheme),
                           user_schema: Union[str, None] = Header(default=None),
-                          deep: Union[bool, None] = False):
+                          deep: Union[bool, None] = False,
+                          cursor: Union[str, None] = None,
+                          sort: Union[str, None] = None,
+                          order: Union[str, None] = None,
+                          count: Union[str, None] = None,
+                          stream: Union[str, None] = None,
+                          fields: Union[str, None] = None,
+                          ids: Union[str, None] = None):
             # db: Session = Depends(get_db)
             # db = next(get_db())
             # return read(db, schema)
@@ -380,17 +876,22 @@ class Routes:
             else:
                 service.set_dbschema(None)
 
-            if page is not None and limit is not None:
-                # return service.get_all_paginated(page, limit)
-                return JSONResponse(jsonable_encoder(service.get_all_paginated(page, limit, deep=deep),
-                                                     exclude=response_model_exclude))
-            # return service.get_all()
-            return JSONResponse(jsonable_encoder(service.get_all(deep=deep), exclude=response_model_exclude))
+            return service.get_response(request, lambda: read_list(
+                service, id_field, request, page=page, limit=limit, deep=deep, cursor=cursor, sort=order or sort,
+                count=count, stream=stream, fields=fields, ids=ids))
 
         @_method_name('get_' + methodtag)
-        def get_paginated_na(page: Union[int, None] = None, limit: Union[int, None] = None,
+        def get_paginated_na(request: Request,
+                             page: Union[int, None] = None, limit: Union[int, None] = None,
                              user_schema: Union[str, None] = Header(default=None),
-                             deep: Union[bool, None] = False):
+                             deep: Union[bool, None] = False,
+                             cursor: Union[str, None] = None,
+                             sort: Union[str, None] = None,
+                             order: Union[str, None] = None,
+                             count: Union[str, None] = None,
+                             stream: Union[str, None] = None,
+                             fields: Union[str, None] = None,
+                             ids: Union[str, None] = None):
             """No authentication """
             # db: Session = Depends(get_db)
             # db = next(get_db())
@@ -402,12 +903,9 @@ class Routes:
             else:
                 service.set_dbschema(None)
 
-            if page is not None and limit is not None:
-                # return service.get_all_paginated(page, limit)
-                return JSONResponse(jsonable_encoder(service.get_all_paginated(page, limit, deep=deep),
-                                                     exclude=response_model_exclude))
-            # return service.get_all()
-            return JSONResponse(jsonable_encoder(service.get_all(deep=deep), exclude=response_model_exclude))
+            return service.get_response(request, lambda: read_list(
+                service, id_field, request, page=page, limit=limit, deep=deep, cursor=cursor, sort=order or sort,
+                count=count, stream=stream, fields=fields, ids=ids))
 
         # @self.router.get("/{attribute}/{value}", response_model=list[schema]
         #                   response_model_exclude=response_model_exclude,)
@@ -417,57 +915,58 @@ class Routes:
                                        user_schema: Union[str, None] = Header(default=None),
                                        page: Union[int, None] = None,
                                        limit: Union[int, None] = None,
-                                       deep: Union[bool, None] = False):
+                                       deep: Union[bool, None] = False,
+                                       cursor: Union[str, None] = None,
+                                       sort: Union[str, None] = None,
+                                       order: Union[str, None] = None,
+                                       count: Union[str, None] = None,
+                                       stream: Union[str, None] = None,
+                                       fields: Union[str, None] = None):
             # db: Session = Depends(get_db)
             # db = next(get_db())
             # return read_by_attribute(db, schema, attribute, value)
 
-            param: dict = {k: v for k, v in request.query_params.items() if k not in ['page','limit','deep']}
-            additional_attributes = {'additional_attributes': param} if param else {}
             # Control db schema using header value
             if user_schema:
                 service.set_dbschema({None: user_schema})
             else:
                 service.set_dbschema(None)
 
-            if not page is None and not limit is None:
-                # return service.get_by_attribute_paginated(value, attribute, page, limit, **additional_attributes)
-                return JSONResponse(jsonable_encoder(service.get_by_attribute_paginated(
-                    value, attribute, page, limit, deep=deep,**additional_attributes), exclude=response_model_exclude))
-            # return service.get_by_attribute(value, attribute, **additional_attributes)
-            return JSONResponse(jsonable_encoder(service.get_by_attribute(value, attribute,deep=deep **additional_attributes),
-                                                 exclude=response_model_exclude))
+            return service.get_response(request, lambda: read_list(
+                service, id_field, request, attribute, value, page=page, limit=limit, deep=deep, cursor=cursor,
+                sort=order or sort, count=count, stream=stream, fields=fields))
 
         @_method_name('get_' + methodtag + "_by_attribute")
         def get_by_attribute_paginated_na(attribute, value
                                           , request: Request
                                           , user_schema: Union[str, None] = Header(default=None)
                                           , page: Union[int, None] = None, limit: Union[int, None] = None
-                                          , deep: Union[bool, None] = False):
+                                          , deep: Union[bool, None] = False
+                                          , cursor: Union[str, None] = None
+                                          , sort: Union[str, None] = None
+                                          , order: Union[str, None] = None
+                                          , count: Union[str, None] = None
+                                          , stream: Union[str, None] = None
+                                          , fields: Union[str, None] = None):
             """No authentication """
             # db: Session = Depends(get_db)
             # db = next(get_db())
             # return read_by_attribute(db, schema, attribute, value)
 
-            param: dict = {k: v for k, v in request.query_params.items() if k not in ['page','limit','deep']}
-            additional_attributes = {'additional_attributes': param} if param else {}
             # Control db schema using header value
             if user_schema:
                 service.set_dbschema({None: user_schema})
             else:
                 service.set_dbschema(None)
 
-            if not page is None and not limit is None:
-                # return service.get_by_attribute_paginated(value, attribute, page, limit, **additional_attributes)
-                return JSONResponse(jsonable_encoder(service.get_by_attribute_paginated(
-                    value, attribute, page, limit, deep=deep, **additional_attributes), exclude=response_model_exclude))
-            # return service.get_by_attribute(value, attribute, **additional_attributes)
-            return JSONResponse(jsonable_encoder(service.get_by_attribute(value, attribute, deep=deep, **additional_attributes),
-                                                 exclude=response_model_exclude))
+            return service.get_response(request, lambda: read_list(
+                service, id_field, request, attribute, value, page=page, limit=limit, deep=deep, cursor=cursor,
+                sort=order or sort, count=count, stream=stream, fields=fields))
 
         @_method_name('get_' + methodtag + "_by_id")
-        def get_by_id(id, token=Depends(self.oauth2_scheme), user_schema: Union[str, None] = Header(default=None),
-                      deep: Union[bool, None] = True):
+        def get_by_id(id, request: Request, token=Depends(self.oauth2_scheme),
+                      user_schema: Union[str, None] = Header(default=None),
+                      deep: Union[bool, None] = True, fields: Union[str, None] = None):
             # db: Session = Depends(get_db)
             # db = next(get_db())
             # return read_by_attribute(db, schema, id_field, value)
@@ -478,11 +977,14 @@ class Routes:
             else:
                 service.set_dbschema(None)
             # return service.get_one(id, id_field)
-            return JSONResponse(jsonable_encoder(service.get_one(id, id_field, deep=deep), exclude=response_model_exclude))
+            selected = fields.split(',') if fields else None
+            return service.get_response(request, lambda: json_response(service.get_one(
+                id, id_field, deep=deep, fields=selected)),
+                version=(lambda: service.get_version(id, id_field)) if service.versioned(deep, selected) else None)
 
         @_method_name('get_' + methodtag + "_by_id")
-        def get_by_id_na(id, user_schema: Union[str, None] = Header(default=None),
-                         deep: Union[bool, None] = True):
+        def get_by_id_na(id, request: Request, user_schema: Union[str, None] = Header(default=None),
+                         deep: Union[bool, None] = True, fields: Union[str, None] = None):
             """No authentication """
             # db: Session = Depends(get_db)
             # db = next(get_db())
@@ -494,7 +996,10 @@ class Routes:
             else:
                 service.set_dbschema(None)
             # return service.get_one(id, id_field)
-            return JSONResponse(jsonable_encoder(service.get_one(id, id_field, deep=deep), exclude=response_model_exclude))
+            selected = fields.split(',') if fields else None
+            return service.get_response(request, lambda: json_response(service.get_one(
+                id, id_field, deep=deep, fields=selected)),
+                version=(lambda: service.get_version(id, id_field)) if service.versioned(deep, selected) else None)
 
         # @self.router.put("/{id}", response_model=schemaresponse_model_exclude=response_model_exclude,)
         @_method_name('update_' + methodtag)
@@ -510,7 +1015,7 @@ class Routes:
             else:
                 service.set_dbschema(None)
             # return service.update(data, id, id_field)
-            return JSONResponse(jsonable_encoder(service.update(data, id, id_field), exclude=response_model_exclude))
+            return json_response(service.update(data, id, id_field))
 
         @_method_name('update_' + methodtag)
         def update_data_na(id, data: model, user_schema: Union[str, None] = Header(default=None)):
@@ -525,7 +1030,7 @@ class Routes:
             else:
                 service.set_dbschema(None)
             # return service.update(data, id, id_field)
-            return JSONResponse(jsonable_encoder(service.update(data, id, id_field), exclude=response_model_exclude))
+            return json_response(service.update(data, id, id_field))
 
         @_method_name('patch_' + methodtag)
         def patch_data(id, data: Union[model, Annotated[dict, Body]],
@@ -550,7 +1055,7 @@ class Routes:
             else:
                 service.set_dbschema(None)
             # return service.patch(data, id, id_field)
-            return JSONResponse(jsonable_encoder(service.patch(data, id, id_field), exclude=response_model_exclude))
+            return json_response(service.patch(data, id, id_field))
 
         @_method_name('patch_' + methodtag)
         def patch_data_na(id, data: Union[model, Annotated[dict, Body]],
@@ -576,7 +1081,7 @@ class Routes:
             else:
                 service.set_dbschema(None)
             # return service.patch(data, id, id_field)
-            return JSONResponse(jsonable_encoder(service.patch(data, id, id_field), exclude=response_model_exclude))
+            return json_response(service.patch(data, id, id_field))
 
         # @self.router.delete("/{id}")
         @_method_name('delete_' + methodtag)
@@ -592,7 +1097,7 @@ class Routes:
             else:
                 service.set_dbschema(None)
             # return service.delete(id, id_field)
-            return JSONResponse(jsonable_encoder(service.delete(id, id_field), exclude=response_model_exclude))
+            return json_response(service.delete(id, id_field))
 
         @_method_name('delete_' + methodtag)
         def delete_data_na(id, user_schema: Union[str, None] = Header(default=None)):
@@ -607,55 +1112,186 @@ class Routes:
             else:
                 service.set_dbschema(None)
             # return service.delete(id, id_field)
-            return JSONResponse(jsonable_encoder(service.delete(id, id_field), exclude=response_model_exclude))
+            return json_response(service.delete(id, id_field))
+
+        @_method_name('update_' + methodtag + '_bulk')
+        def update_bulk(data: BulkUpdate,
+                        token=Depends(self.oauth2_scheme), user_schema: Union[str, None] = Header(default=None)):
+            service.set_dbschema({None: user_schema} if user_schema else None)
+            for row in [*(data.rows or []), data.data or {}]:
+                _check_model_fields(model, row)
+            return json_response(service.bulk_update(data.rows, id_field, filters=data.filter, data=data.data))
+
+        @_method_name('update_' + methodtag + '_bulk')
+        def update_bulk_na(data: BulkUpdate, user_schema: Union[str, None] = Header(default=None)):
+            """No authentication """
+            service.set_dbschema({None: user_schema} if user_schema else None)
+            for row in [*(data.rows or []), data.data or {}]:
+                _check_model_fields(model, row)
+            return json_response(service.bulk_update(data.rows, id_field, filters=data.filter, data=data.data))
+
+        @_method_name('delete_' + methodtag + '_bulk')
+        def delete_bulk(data: BulkDelete,
+                        token=Depends(self.oauth2_scheme), user_schema: Union[str, None] = Header(default=None)):
+            service.set_dbschema({None: user_schema} if user_schema else None)
+            return json_response(service.bulk_delete(data.ids, id_field, filters=data.filter))
+
+        @_method_name('delete_' + methodtag + '_bulk')
+        def delete_bulk_na(data: BulkDelete, user_schema: Union[str, None] = Header(default=None)):
+            """No authentication """
+            service.set_dbschema({None: user_schema} if user_schema else None)
+            return json_response(service.bulk_delete(data.ids, id_field, filters=data.filter))
 
         # endregion crud_methods
 
+        auth = self.oauth2_scheme is not None
+        self._add_routes(router, model, options, {
+            'create': create if auth else create_na,
+            'bulk_create': create_bulk if auth else create_bulk_na,
+            'get': get_paginated if auth else get_paginated_na,
+            'get_by_id': get_by_id if auth else get_by_id_na,
+            'get_by_attribute': get_by_attribute_paginated if auth else get_by_attribute_paginated_na,
+            'update': update_data if auth else update_data_na,
+            'patch': patch_data if auth else patch_data_na,
+            'delete': delete_data if auth else delete_data_na,
+            'bulk_update': update_bulk if auth else update_bulk_na,
+            'bulk_delete': delete_bulk if auth else delete_bulk_na,
+        })
+
+        return router
+
+    def _router_options(self, path: str, kwargs: dict) -> dict:
+        """Validated ``get_router`` keyword arguments, with defaults"""
+        options = {
+            'response_exclude': kwargs.get('response_exclude', None),
+            'access_mode': kwargs.get('access_mode', HttpMethods.ALL_METHODS),
+            'id_field': kwargs.get('id_field', 'id'),
+            'load_strategy': kwargs.get('load_strategy', None),
+            'load_depth': kwargs.get('load_depth', None),
+            'count_mode': kwargs.get('count_mode', 'exact'),
+            'bulk_create': kwargs.get('bulk_create', False),
+            'bulk_update': kwargs.get('bulk_update', False),
+            'bulk_delete': kwargs.get('bulk_delete', False),
+            'on_conflict': kwargs.get('on_conflict', None),
+            'key_fields': kwargs.get('key_fields', None),
+            'match_modes': kwargs.get('match_modes', None),
+            'filter_fields': kwargs.get('filter_fields', None),
+            'sort_fields': kwargs.get('sort_fields', None),
+            'raw_rows': kwargs.get('raw_rows', False),
+            'cache': cache_backend(kwargs.get('cache', None)),
+            'etag_field': kwargs.get('etag_field', None),
+            'tag': string.capwords(path.replace('_', ' ')),  # string.capwords(schema.__name__)
+            'methodtag': path.lower(),  # schema.__name__.lower()
+        }
+
+        load_strategy = options['load_strategy']
+        if load_strategy is not None and load_strategy not in crud.LOAD_STRATEGIES:
+            raise Exception("Unsupported load_strategy '%s', use one of: %s"
+                            % (load_strategy, ', '.join(crud.LOAD_STRATEGIES)))
+        count_mode = options['count_mode']
+        if count_mode not in crud.COUNT_MODES:
+            raise Exception("Unsupported count_mode '%s', use one of: %s" % (count_mode, ', '.join(crud.COUNT_MODES)))
+        on_conflict = options['on_conflict']
+        if on_conflict is not None and on_conflict not in crud.CONFLICT_ACTIONS:
+            raise Exception("Unsupported on_conflict '%s', use one of: %s"
+                            % (on_conflict, ', '.join(crud.CONFLICT_ACTIONS)))
+
+        '''Process access methods in to list of HTTPMethods'''
+        access_mode = options['access_mode']
+        if isinstance(access_mode, HttpMethods):
+            if not isinstance(access_mode.value, list):
+                options['access_mode'] = [access_mode.value]
+            else:
+                options['access_mode'] = access_mode.value
+
+        return options
+
+    @staticmethod
+    def _conflict_keys(schema, options: dict) -> list:
+        """``key_fields`` of ``on_conflict``, by default of a unique constraint: requests mostly leave the
+        generated primary key out, it would never conflict"""
+        if options['key_fields'] or options['on_conflict'] is None:
+            return options['key_fields']
+        key_fields = [c.key for c in crud.unique_columns(schema)]
+        if not key_fields:
+            raise Exception("on_conflict: %s has no unique constraint besides its primary key, set key_fields"
+                            % schema.__name__)
+        return key_fields
+
+    @staticmethod
+    def _add_routes(router: APIRouter, model, options: dict, handlers: dict, dependencies: list = None):
+        """Register ``handlers`` (keyed by operation) on router according to the access mode"""
+        access_mode = options['access_mode']
+        response_model_exclude = options['response_exclude']
+        tag = options['tag']
+
         if HttpMethods.POST.value in access_mode:
-            router.add_api_route("", create if self.oauth2_scheme else create_na, methods=["POST"],
+            router.add_api_route("", handlers['create'], methods=["POST"],
                                  response_model=Union[model, dict, list[Union[model, dict]]],
                                  response_model_exclude=response_model_exclude,
                                  status_code=status.HTTP_201_CREATED,
+                                 dependencies=dependencies,
                                  tags=[tag])
+            if options['bulk_create']:
+                router.add_api_route("/bulk", handlers['bulk_create'], methods=["POST"],
+                                     response_model=list[Union[model, dict]],
+                                     response_model_exclude=response_model_exclude,
+                                     status_code=status.HTTP_201_CREATED,
+                                     dependencies=dependencies,
+                                     tags=[tag])
         if HttpMethods.GET.value in access_mode:
-            router.add_api_route("", get_paginated if self.oauth2_scheme else get_paginated_na, methods=["GET"],
-                                 response_model=Union[list[Union[model, dict]], dict[str, Union[list, int]]],
+            router.add_api_route("", handlers['get'], methods=["GET"],
+                                 response_model=Union[list[Union[model, dict]], dict[str, Union[list, int, str, None]]],
                                  response_model_exclude=response_model_exclude,
                                  status_code=status.HTTP_200_OK,
+                                 dependencies=dependencies,
                                  tags=[tag])
 
             router.add_api_route("/{id}",
-                                 get_by_id if self.oauth2_scheme else get_by_id_na,
+                                 handlers['get_by_id'],
                                  methods=["GET"],
                                  response_model=Union[model, dict],
                                  response_model_exclude=response_model_exclude,
                                  status_code=status.HTTP_200_OK,
+                                 dependencies=dependencies,
                                  tags=[tag])
         if HttpMethods.GET_BY_ATTRIBUTE.value in access_mode:
             router.add_api_route("/{attribute}/{value}",
-                                 get_by_attribute_paginated if self.oauth2_scheme else get_by_attribute_paginated_na,
+                                 handlers['get_by_attribute'],
                                  methods=["GET"],
-                                 response_model=Union[list[Union[model, dict]], dict[str, Union[list, int]]],
+                                 response_model=Union[list[Union[model, dict]], dict[str, Union[list, int, str, None]]],
                                  response_model_exclude=response_model_exclude,
                                  status_code=status.HTTP_200_OK,
+                                 dependencies=dependencies,
                                  tags=[tag])
         if HttpMethods.PUT.value in access_mode:
-            router.add_api_route("/{id}", update_data if self.oauth2_scheme else update_data_na, methods=["PUT"],
+            router.add_api_route("/{id}", handlers['update'], methods=["PUT"],
                                  response_model=list[Union[model, dict]],
                                  response_model_exclude=response_model_exclude,
                                  status_code=status.HTTP_200_OK,
+                                 dependencies=dependencies,
                                  tags=[tag])
         if HttpMethods.PATCH.value in access_mode:
-            router.add_api_route("/{id}", patch_data if self.oauth2_scheme else patch_data_na, methods=["PATCH"],
+            router.add_api_route("/{id}", handlers['patch'], methods=["PATCH"],
                                  response_model=list[Union[model, dict]],
                                  response_model_exclude=response_model_exclude,
                                  status_code=status.HTTP_200_OK,
+                                 dependencies=dependencies,
                                  tags=[tag])
+            if options['bulk_update']:
+                router.add_api_route("/bulk-update", handlers['bulk_update'], methods=["POST"],
+                                     status_code=status.HTTP_200_OK,
+                                     dependencies=dependencies,
+                                     tags=[tag])
         if HttpMethods.DELETE.value in access_mode:
-            router.add_api_route("/{id}", delete_data if self.oauth2_scheme else delete_data_na, methods=["DELETE"],
+            router.add_api_route("/{id}", handlers['delete'], methods=["DELETE"],
+                                 dependencies=dependencies,
                                  tags=[tag])
-
-        return router
+            if options['bulk_delete']:
+                router.add_api_route("/bulk-delete", handlers['bulk_delete'], methods=["POST"],
+                                     status_code=status.HTTP_200_OK,
+                                     dependencies=dependencies,
+                                     tags=[tag])
 
     def add_router(self, app, path: str, model,
                    schema: BaseModel, schema_create: BaseModel, **kwargs):
@@ -678,6 +1314,46 @@ class Routes:
         router = self.get_router(path, model, schema, schema_create, **kwargs)
         app.include_router(router=router)
 
+    def add_metrics(self, app, path: str = '/metrics', dependencies: list = None):
+        """Add a ``GET`` route exporting the routes' metrics in the Prometheus text format, requiring the bearer
+        token of the generated routes and ``dependencies`` (e.g. ``[Depends(check_scraper)]``)"""
+        if self.metrics is None:
+            raise Exception("add_metrics: Routes created without metrics")
+        registry = self.metrics
+
+        def get_metrics():
+            return Response(content=registry.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+        app.add_api_route(path, get_metrics, methods=["GET"], include_in_schema=False,
+                          dependencies=self._auth_dependencies(dependencies))
+
+    def add_profiling(self, app, path: str = '/debug/queries', dependencies: list = None):
+        """Report the statement count and database time of each request in a ``Server-Timing`` header, and add a
+        ``GET`` route listing the SQL profiles of the last requests of the generated routes.
+
+        The route requires the bearer token of the generated routes and ``dependencies`` (e.g.
+        ``[Depends(require_admin)]``). Profiles reveal the SQL of every route, without ``auth_route``
+        ``dependencies`` must be given, ``[]`` exposing the route to all clients.
+        """
+        if self.profiler is None:
+            raise Exception("add_profiling: Routes created without profile")
+        if self.oauth2_scheme is None and dependencies is None:
+            raise Exception("add_profiling: Pass the dependencies guarding the route of routes without auth_route")
+        profiler = self.profiler
+
+        def get_profiles():
+            return json_response(profiler.recent())
+
+        app.add_middleware(ProfilingMiddleware, n_plus_one_threshold=profiler.n_plus_one_threshold)
+        app.add_api_route(path, get_profiles, methods=["GET"], include_in_schema=False,
+                          dependencies=self._auth_dependencies(dependencies))
+
+    def _auth_dependencies(self, dependencies: list = None) -> list:
+        """Dependencies of an added route: the bearer token of the generated routes, when required, and
+        ``dependencies``"""
+        auth = [Depends(self.oauth2_scheme)] if self.oauth2_scheme is not None else []
+        return [*auth, *(dependencies or [])]
+
     def add_options(self, app):
 
         def get_options_na(endpoint, response: Response):
@@ -707,133 +1383,459 @@ class Routes:
 class Service:
     DataTable = declarative_base()
 
-    def __init__(self, session, schema: DataTable):
+    def __init__(self, session, schema: DataTable, load_strategy: str = None, load_depth: int = None,
+                 count_mode: str = 'exact', exclude=None, match_modes: dict = None, filter_fields: list = None,
+                 sort_fields: list = None, raw_rows: bool = False, cache: CacheBackend = None,
+                 etag_field: str = None, read_session=None, read_strategy: str = 'round_robin',
+                 pin_primary: float = 0, metrics: Metrics = None, profiler: Profiler = None):
         self.session = session
+        # replicas serving reads, see Routes.__init__
+        self.replicas = replica_set(read_session, read_strategy)
+        self.pin_primary = pin_primary
         self.schema = schema
-        self.db_schema = None
+        self.load_strategy = load_strategy
+        self.load_depth = load_depth
+        self.count_mode = count_mode
+        self.exclude = exclude
+        # shallow list reads skip ORM instance construction, see crud.raw_query
+        self.raw_rows = raw_rows
+        # GET responses, cleared by every write
+        self.cache = cache
+        self.etag_field = etag_field
+        self.order_by = crud.default_order_by(schema)
+        # filters of this service's match modes, passed to every filtered crud call
+        self.match_modes = match_modes
+        self.filters = crud.compile_filters(schema, match_modes)
+        mapper = inspect(schema)
+        self.relationships = [rel.key for rel in mapper.relationships]
+        self.fields = [prop.key for prop in mapper.column_attrs] + self.relationships
+
+        # whitelists of the query grammar, indexed columns are sortable and all columns filterable by default
+        for field in [*(filter_fields or []), *(sort_fields or [])]:
+            if field not in self.filters:
+                raise Exception("Unknown filter or sort field '%s'" % field)
+        if etag_field is not None and etag_field not in self.filters:
+            raise Exception("Unknown etag field '%s'" % etag_field)
+        # fields hidden from responses are not filterable or sortable by default, filters would reveal their values
+        hidden = set(exclude or ())
+        self.filterable = set(self.filters) - hidden if filter_fields is None else set(filter_fields)
+        self.sortable_columns = {k: c for k, c in crud.sortable_columns(schema).items() if k not in hidden} \
+            if sort_fields is None else {field: self.filters[field].column for field in sort_fields}
+        self.engine = self._get_engine()
+        # schema translation of the current request, each thread / task sees its own value
+        self._db_schema = ContextVar('db_schema', default=None)
+        # engine proxies bound to a schema translation, shared by all requests, see _get_bind
+        self._binds: OrderedDict = OrderedDict()
+        self._binds_lock = threading.Lock()
+        # sessions of the current request by bind, see request_scope
+        self._request_sessions = ContextVar('request_sessions', default=None)
+        # client of the current request, and the replica serving its reads, chosen once per request scope
+        self._client = ContextVar('client', default=None)
+        self._replica = ContextVar('replica', default=None)
+        # request metrics and SQL profiling, statements of the primary and replicas seen through engine events
+        self.metrics = metrics
+        self.profiler = profiler
+        for engine in [self.engine, *(self.replicas.engines if self.replicas is not None else [])]:
+            for instruments in (metrics, profiler):
+                if instruments is not None:
+                    instruments.instrument(engine)
+
+    def _get_engine(self):
         with self.session() as s:
-            self.engine = s.get_bind()
-            self.base_execution_options = {**self.engine.get_execution_options()}
+            return s.get_bind()
 
-    def set_dbschema(self, dbschema: Union[dict[Union[str, None], str],None]):
-        self.db_schema = dbschema
-
-    # def get_engine(self):
-    #     s = self.session()
-    #     try:
-    #         yield s.get_bind()
-    #     finally:
-    #         s.close()
-
-    def _get_db(self) -> Iterator[Session]:
-        # if self.db_schema:
-        #     engine = next(self.get_engine())
-        #     engine = engine.execution_options(schema_translate_map=self.db_schema)
-        #     self.session.configure(bind=engine)
-        # else:
-        #     engine = next(self.get_engine())
-        #     engine = engine.execution_options(schema_translate_map={None: "public"})
-        #     self.session.configure(bind=engine)
-
-        if self.db_schema:
-            # engine = next(self.get_engine())
-            e = self.engine.execution_options(schema_translate_map=self.db_schema)
-            self.session.configure(bind=e)
-        else:
-            # engine = next(self.get_engine())
-            e = self.engine.execution_options(**self.base_execution_options)
-            self.session.configure(bind=e)
-
-        db = self.session()
+    def _resolve_order_by(self, sort: Union[str, None]) -> tuple:
         try:
+            return crud.resolve_order_by(self.sortable_columns, sort, self.order_by)
+        except Exception as ex:
+            raise HTTPException(status_code=400, detail=str(ex))
+
+    @property
+    def db_schema(self) -> Union[dict[Union[str, None], str], None]:
+        return self._db_schema.get()
+
+    def check_filters(self, attribute, additional_attributes: dict = None):
+        """Reject filters on attributes that are not filterable before querying"""
+        keys = [*([attribute] if attribute is not None else []), *(additional_attributes or {})]
+        unknown = [k for k in keys if crud.parse_filter_key(k)[0] not in self.filterable]
+        if unknown:
+            raise HTTPException(status_code=400, detail="Unsupported filter attributes: %s" % ', '.join(unknown))
+
+    def check_ids(self, attribute, additional_attributes: dict = None):
+        """Reject filters next to ``ids``, which reads rows by id only"""
+        self.check_filters(attribute, additional_attributes)
+        if attribute is not None or additional_attributes:
+            raise HTTPException(status_code=400, detail="ids cannot be combined with filters")
+
+    def _exclude(self, fields: Union[list, None]):
+        """Fields left out of rows, the router's ``response_exclude`` and the fields not selected by ``fields``"""
+        if not fields:
+            return self.exclude
+
+        unknown = [f for f in fields if f not in self.fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail="Unsupported fields: %s" % ', '.join(unknown))
+        return {*(self.exclude or ()), *[f for f in self.fields if f not in fields]}
+
+    def _cache_key(self, request: Request) -> str:
+        db_schema = self.db_schema
+        return '%d:%s' % (self.cache.generation(), json.dumps(
+            [request.url.path, sorted(request.query_params.multi_items()),
+             sorted(db_schema.items(), key=str) if db_schema else None]))
+
+    def _cache_lookup(self, request: Request) -> tuple[Union[str, None], Union[Response, None]]:
+        if self.cache is None:
+            return None, None
+        key = self._cache_key(request)
+        body = self.cache.get(key)
+        if body is None:
+            return key, None
+        metrics.record_bytes(body)
+        return key, Response(content=body, media_type='application/json')
+
+    def _version_headers(self, request: Request, version) -> Union[dict, None]:
+        """Validators of a row from its ``etag_field`` value, the ETag also covering the query and db schema
+        since they change the representation"""
+        if version is None:
+            return None
+        db_schema = self.db_schema
+        tag = etag(json.dumps([str(version), sorted(request.query_params.multi_items()),
+                               sorted(db_schema.items(), key=str) if db_schema else None]).encode('utf-8'))
+        if isinstance(version, datetime.datetime):
+            return {'ETag': tag, 'Last-Modified': _http_date(version)}
+        return {'ETag': tag}
+
+    def _conditional(self, request: Request, response: Response, key: Union[str, None],
+                     headers: Union[dict, None]) -> Response:
+        body = getattr(response, 'body', None)
+        if response.status_code != status.HTTP_200_OK or not isinstance(body, bytes):
+            # streams are neither cached nor validated
+            return response
+
+        if key is not None:
+            self.cache.set(key, body)
+        headers = headers or {'ETag': etag(body)}
+        return not_modified(request, headers) or _with_headers(response, headers)
+
+    def get_response(self, request: Request, build: Callable[[], Response],
+                     version: Callable[[], object] = None) -> Response:
+        """Response of a GET route made by ``build``, served from ``cache`` when enabled.
+
+        Responses carry a strong ETag, of the ``etag_field`` value returned by ``version`` when given (read
+        before anything else), otherwise of the body. Matching ``If-None-Match`` requests get a 304 without body.
+        """
+        headers = self._version_headers(request, version()) if version is not None else None
+        if headers is not None:
+            response = not_modified(request, headers)
+            if response is not None:
+                return response
+
+        key, response = self._cache_lookup(request)
+        if response is not None:
+            return self._conditional(request, response, None, headers)
+        return self._conditional(request, build(), key, headers)
+
+    def versioned(self, deep=True, fields: list = None) -> bool:
+        """Whether the ``etag_field`` value validates a row read with ``deep`` and ``fields``: only when no related
+        row is serialized, since it does not change with them"""
+        if self.etag_field is None:
+            return False
+        if not deep:
+            return True
+        exclude = self._exclude(fields) or ()
+        return all(key in exclude for key in self.relationships)
+
+    def get_version(self, id_value, id_field='id'):
+        """``etag_field`` value of a row, ``None`` without ``etag_field``"""
+        if self.etag_field is None:
+            return None
+        with self._session(read=True) as db:
+            return read_version(db, self.schema, id_field, id_value, self.etag_field, plan=self.filters)
+
+    def set_dbschema(self, dbschema: Union[dict[Union[str, None], str],None]):
+        """Translate schemas of the current request (thread or task) only"""
+        self._db_schema.set(dbschema)
+
+    def _get_bind(self, engine=None):
+        """Engine (default the primary) of the current schema translation, kept for the last ``BIND_CACHE_SIZE``
+        distinct ``schema_translate_map``: they come from the ``user_schema`` header of clients"""
+        engine = self.engine if engine is None else engine
+        db_schema = self.db_schema
+        if not db_schema:
+            return engine
+
+        key = (engine, frozenset(db_schema.items()))
+        with self._binds_lock:
+            bind = self._binds.get(key, None)
+            if bind is None:
+                bind = self._binds[key] = engine.execution_options(schema_translate_map=dict(db_schema))
+                while len(self._binds) > BIND_CACHE_SIZE:
+                    self._binds.popitem(last=False)
+            else:
+                self._binds.move_to_end(key)
+        return bind
+
+    def _pin_primary(self):
+        """Serve the current client's reads from the primary for ``pin_primary`` seconds"""
+        if self.replicas is not None and self.pin_primary and self._client.get() is not None:
+            self.replicas.pin(self._client.get(), self.pin_primary)
+
+    def _route(self, read: bool) -> tuple:
+        """Session factory and engine of a read or write, reads go to a replica unless the client is pinned: the
+        same replica for all the reads of a request scope"""
+        if read and self.replicas is not None and not self.replicas.pinned(self._client.get()):
+            replica = self._replica.get()
+            if replica is None:
+                replica = self.replicas.choose()
+                if self._request_sessions.get() is not None:
+                    self._replica.set(replica)
+            return replica
+        return self.session, self.engine
+
+    def _get_db(self, read=False) -> Session:
+        """New session bound to the current schema translation, of a replica for reads"""
+        session, engine = self._route(read)
+        return session(bind=self._get_bind(engine))
+
+    @contextmanager
+    def _session(self, read=False) -> Iterator[Session]:
+        """Session of the current request scope (see :meth:`request_scope`), created on first use, or a session
+        of the call alone, closed on exit"""
+        with metrics.database_work():
+            sessions = self._request_sessions.get()
+            if sessions is None:
+                db = self._acquire(self._get_db(read))
+                try:
+                    yield db
+                finally:
+                    db.close()
+                return
+
+            session, engine = self._route(read)
+            bind = self._get_bind(engine)
+            db = sessions.get(bind, None)
+            if db is None:
+                db = sessions.setdefault(bind, self._acquire(session(bind=bind)))
             yield db
+
+    def _acquire(self, db: Session) -> Session:
+        """Check the connection of a new session out of the pool now when measuring requests, timing the
+        ``acquire`` phase apart from the first query"""
+        if self.metrics is not None:
+            with metrics.timed('acquire'):
+                db.connection()
+        return db
+
+    async def _close(self, db: Session):
+        # closing rolls back the connection, keep the round trip off the event loop
+        await run_in_threadpool(db.close)
+
+    async def request_scope(self, request: Request) -> AsyncIterator[None]:
+        """FastAPI dependency scoping sessions to a request: the service calls of a request share one session
+        per database and schema translation, returned to the pool once the request is handled, errors included"""
+        sessions = {}
+        self._request_sessions.set(sessions)
+        self._client.set(_client_key(request))
+        try:
+            with ExitStack() as measures:
+                if self.metrics is not None or self.profiler is not None:
+                    route = getattr(request.scope.get('route', None), 'path', request.url.path)
+                    for instruments in (self.metrics, self.profiler):
+                        if instruments is not None:
+                            measures.enter_context(instruments.request(route, request.method))
+                yield
         finally:
-            db.close()
+            self._request_sessions.set(None)
+            self._client.set(None)
+            self._replica.set(None)
+            for db in sessions.values():
+                await self._close(db)
 
+    @_invalidates_cache
     def create_any(self, obj: Union[BaseModel, dict]) -> dict:
-        db = next(self._get_db())
-        return create_any(db, schema=self.schema, data=obj)
-
-    def create(self, obj: Union[BaseModel, dict], key_attribute, *args) -> dict:
-        db = next(self._get_db())
-        return create(db, schema=self.schema, key_attribute=key_attribute, data=obj, *args)
-
-    def get_all(self, deep=False) -> list:
-        db = next(self._get_db())
-        return read(db, deep=deep, schema=self.schema)
+        with self._session() as db:
+            return create_any(db, schema=self.schema, data=obj, exclude=self.exclude)
+
+    @_invalidates_cache
+    def bulk_create(self, objs: list[Union[BaseModel, dict]]) -> list:
+        with self._session() as db:
+            return bulk_create(db, schema=self.schema, data=objs, exclude=self.exclude)
+
+    @_invalidates_cache
+    def create(self, obj: Union[BaseModel, dict], key_attribute, *args, on_conflict=None) -> dict:
+        with self._session() as db:
+            return create(db, self.schema, key_attribute, obj, *args, exclude=self.exclude, on_conflict=on_conflict,
+                          plan=self.filters)
+
+    def get_all(self, deep=False, sort=None, fields=None) -> list:
+        order_by = self._resolve_order_by(sort) if sort else None
+        with self._session(read=True) as db:
+            return read(db, deep=deep, schema=self.schema, load_strategy=self.load_strategy,
+                        load_depth=self.load_depth, exclude=self._exclude(fields), order_by=order_by,
+                        raw_rows=self.raw_rows)
+
+    def stream_all(self, deep=False, sort=None, fields=None) -> Iterator[dict]:
+        order_by = self._resolve_order_by(sort) if sort else None
+        exclude = self._exclude(fields)
+        # streams outlive the request scope, read_stream closes their own session
+        return open_stream(self._get_db(read=True), lambda db: crud.iter_all(
+            db, self.schema, deep=deep, load_strategy=self.load_strategy, load_depth=self.load_depth,
+            exclude=exclude, order_by=order_by, raw_rows=self.raw_rows))
+
+    def get_all_paginated(self, page, limit, deep=False, sort=None, count=None,
+                          fields=None) -> dict[str, Union[list, int]]:
+        order_by = self._resolve_order_by(sort)
+        with self._session(read=True) as db:
+            return read_paginated(db, page=page, limit=limit, deep=deep, schema=self.schema,
+                                  load_strategy=self.load_strategy, load_depth=self.load_depth, order_by=order_by,
+                                  count_mode=count or self.count_mode, exclude=self._exclude(fields),
+                                  raw_rows=self.raw_rows)
+
+    def get_all_keyset(self, cursor, limit, id_field=None, deep=False,
+                       fields=None) -> dict[str, Union[list, str, None]]:
+        with self._session(read=True) as db:
+            return read_keyset(db, cursor=cursor, limit=limit, id_field=id_field, deep=deep, schema=self.schema,
+                               load_strategy=self.load_strategy, load_depth=self.load_depth,
+                               exclude=self._exclude(fields))
+
+    def get_one(self, id_value, id_field='id', deep=True, fields=None) -> Union[dict, None]:
+
+        with self._session(read=True) as db:
+            return read_by_id(db, schema=self.schema, id_field=id_field, value=id_value, deep=deep,
+                              load_strategy=self.load_strategy, load_depth=self.load_depth,
+                              exclude=self._exclude(fields), plan=self.filters)
+
+    def get_many(self, id_values: list, id_field='id', deep=True, fields=None) -> dict[str, Union[dict, None]]:
+        """Rows by id, read with one query"""
+        with self._session(read=True) as db:
+            return read_by_ids(db, schema=self.schema, id_field=id_field, values=id_values, deep=deep,
+                               load_strategy=self.load_strategy, load_depth=self.load_depth,
+                               exclude=self._exclude(fields), plan=self.filters)
+
+    def get_by_attribute(self, value, attribute, deep=False, sort=None, fields=None, **kwargs) -> list:
+        additional_attribute: dict = kwargs.get('additional_attributes', None)
+        if additional_attribute is not None:
+            if not isinstance(additional_attribute, dict):
+                raise Exception("Arguments must be of type dict")
 
-    def get_all_paginated(self, page, limit, deep=False) -> dict[str, Union[list, int]]:
-        db = next(self._get_db())
-        return read_paginated(db, page=page, limit=limit, deep=deep, schema=self.schema)
+        order_by = self._resolve_order_by(sort) if sort else None
+        with self._session(read=True) as db:
+            return read_by_attribute(db, schema=self.schema, attribute=attribute, value=value,deep=deep,
+                                     load_strategy=self.load_strategy, load_depth=self.load_depth,
+                                     exclude=self._exclude(fields), order_by=order_by, raw_rows=self.raw_rows,
+                                     plan=self.filters, **kwargs)
 
-    def get_one(self, id_value, id_field='id', deep=True) -> Union[dict, None]:
+    def stream_by_attribute(self, value, attribute, deep=False, sort=None, fields=None, **kwargs) -> Iterator[dict]:
+        additional_attribute: dict = kwargs.get('additional_attributes', None)
+        if additional_attribute is not None:
+            if not isinstance(additional_attribute, dict):
+                raise Exception("Arguments must be of type dict")
 
-        db = next(self._get_db())
-        return read_by_id(db, schema=self.schema, id_field=id_field, value=id_value, deep=deep)
+        order_by = self._resolve_order_by(sort) if sort else None
+        exclude = self._exclude(fields)
+        return open_stream(self._get_db(read=True), lambda db: crud.iter_by_attribute(
+            db, self.schema, attribute, value, deep=deep, load_strategy=self.load_strategy,
+            load_depth=self.load_depth, exclude=exclude, order_by=order_by, raw_rows=self.raw_rows,
+            plan=self.filters, **kwargs))
 
-    def get_by_attribute(self, value, attribute, deep=False, **kwargs) -> list:
+    def get_by_attribute_paginated(self, value, attribute, page: int, limit: int, deep = False, sort=None, count=None,
+                                   fields=None, **kwargs) -> dict[str, Union[list, int]]:
         additional_attribute: dict = kwargs.get('additional_attributes', None)
         if additional_attribute is not None:
             if not isinstance(additional_attribute, dict):
                 raise Exception("Arguments must be of type dict")
 
-        db = next(self._get_db())
-        return read_by_attribute(db, schema=self.schema, attribute=attribute, value=value,deep=deep,
-                                 **kwargs)
-
-    def get_by_attribute_paginated(self, value, attribute, page: int, limit: int, deep = False, **kwargs) -> dict[
-        str, Union[list, int]]:
+        order_by = self._resolve_order_by(sort)
+        with self._session(read=True) as db:
+            return read_by_attribute_paginated(db, schema=self.schema, attribute=attribute, value=value, page=page
+                                               , limit=limit, deep=deep
+                                               , load_strategy=self.load_strategy, load_depth=self.load_depth
+                                               , order_by=order_by, count_mode=count or self.count_mode
+                                               , exclude=self._exclude(fields), raw_rows=self.raw_rows
+                                               , plan=self.filters, **kwargs)
+
+    def get_by_attribute_keyset(self, value, attribute, cursor, limit: int, id_field=None, deep=False, fields=None,
+                                **kwargs) -> dict[str, Union[list, str, None]]:
         additional_attribute: dict = kwargs.get('additional_attributes', None)
         if additional_attribute is not None:
             if not isinstance(additional_attribute, dict):
                 raise Exception("Arguments must be of type dict")
 
-        db = next(self._get_db())
-        return read_by_attribute_paginated(db, schema=self.schema, attribute=attribute, value=value, page=page
-                                           , limit=limit, deep=deep
-                                           , **kwargs)
+        with self._session(read=True) as db:
+            return read_by_attribute_keyset(db, schema=self.schema, attribute=attribute, value=value, cursor=cursor,
+                                            limit=limit, id_field=id_field, deep=deep,
+                                            load_strategy=self.load_strategy, load_depth=self.load_depth,
+                                            exclude=self._exclude(fields), plan=self.filters, **kwargs)
 
+    @_invalidates_cache
     def update(self, obj: Union[BaseModel, dict], id_value, *args) -> list:
         id_field = args[0] if args else 'id'
 
-        db = next(self._get_db())
-        return update(db, schema=self.schema, data=obj, attribute=id_field, value=id_value)
+        with self._session() as db:
+            return update(db, schema=self.schema, data=obj, attribute=id_field, value=id_value, exclude=self.exclude,
+                          plan=self.filters)
 
+    @_invalidates_cache
     def update_by_attribute(self, obj: Union[BaseModel, dict], value, attribute='id', **kwargs) -> list:
         additional_attribute: dict = kwargs.get('additional_attributes', None)
         if additional_attribute is not None:
             if not isinstance(additional_attribute, dict):
                 raise Exception("Arguments must be of type dict")
 
-        db = next(self._get_db())
-        return update(db, schema=self.schema, data=obj, attribute=attribute, value=value, **kwargs)
-
+        with self._session() as db:
+            return update(db, schema=self.schema, data=obj, attribute=attribute, value=value, exclude=self.exclude,
+                          plan=self.filters, **kwargs)
+
+    @_invalidates_cache
+    def bulk_update(self, rows: list[dict] = None, id_field='id', filters: dict = None,
+                    data: Union[BaseModel, dict] = None) -> dict[str, int]:
+        """Update ``rows`` (each holding its ``id_field``) or set ``data`` on the rows matching ``filters``"""
+        if filters is not None:
+            self.check_filters(None, filters)
+        with self._session() as db:
+            return bulk_update(db, self.schema, rows, id_field=id_field, filter_attributes=filters, data=data,
+                               plan=self.filters)
+
+    @_invalidates_cache
+    def bulk_delete(self, ids: list = None, id_field='id', filters: dict = None) -> dict[str, int]:
+        """Delete the rows identified by ``ids`` or matching ``filters``"""
+        if filters is not None:
+            self.check_filters(None, filters)
+        with self._session() as db:
+            return bulk_delete(db, self.schema, ids, id_field=id_field, filter_attributes=filters, plan=self.filters)
+
+    @_invalidates_cache
     def delete(self, id_value, *args) -> dict[str, str]:
         id_field = args[0] if args else 'id'
 
-        db = next(self._get_db())
-        return delete(db, schema=self.schema, attribute=id_field, value=id_value)
+        with self._session() as db:
+            return delete(db, schema=self.schema, attribute=id_field, value=id_value, plan=self.filters)
 
+    @_invalidates_cache
     def delete_by_attribute(self, value, attribute='id', **kwargs) -> dict[str, str]:
         additional_attribute: dict = kwargs.get('additional_attributes', None)
         if additional_attribute is not None:
             if not isinstance(additional_attribute, dict):
                 raise Exception("Arguments must be of type dict")
 
-        db = next(self._get_db())
-        return delete(db, schema=self.schema, attribute=attribute, value=value, **kwargs)
+        with self._session() as db:
+            return delete(db, schema=self.schema, attribute=attribute, value=value, plan=self.filters, **kwargs)
 
+    @_invalidates_cache
     def patch(self, obj: Union[BaseModel, dict], id_value, *args) -> list:
         id_field = args[0] if args else 'id'
 
-        db = next(self._get_db())
-        return patch(db, schema=self.schema, data=obj, attribute=id_field, value=id_value)
+        with self._session() as db:
+            return patch(db, schema=self.schema, data=obj, attribute=id_field, value=id_value, exclude=self.exclude,
+                         plan=self.filters)
 
+    @_invalidates_cache
     def patch_by_attribute(self, obj: Union[BaseModel, dict], value, attribute='id', **kwargs) -> list:
         additional_attribute: dict = kwargs.get('additional_attributes', None)
         if additional_attribute is not None:
             if not isinstance(additional_attribute, dict):
                 raise Exception("Arguments must be of type dict")
 
-        db = next(self._get_db())
-        return patch(db, schema=self.schema, data=obj, attribute=attribute, value=value, **kwargs)
+        with self._session() as db:
+            return patch(db, schema=self.schema, data=obj, attribute=attribute, value=value, exclude=self.exclude,
+                         plan=self.filters, **kwargs)
@@ -0,0 +1,221 @@
+"""Request metrics of generated routes, exported in the Prometheus text format.
+
+Each request handled by a generated route is timed as a whole and by phase:
+
+* ``acquire`` -- checking database connections out of the pool.
+* ``query`` -- executing SQL statements, from cursor execute to its return.
+* ``serialize`` -- the rest of the database work: loading ORM instances, flushing them and serializing rows to
+  dicts.
+* ``encode`` -- encoding serialized rows to the JSON response body.
+
+Phases are accumulated in a per-request :class:`Timings` found through a context variable, so SQL events and
+serialization code record into the request that runs them, in threads and async tasks alike.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Union
+
+from sqlalchemy import event
+
+PHASES = ('acquire', 'query', 'serialize', 'encode')
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_timings: ContextVar = ContextVar('timings', default=None)
+
+
+class Timings:
+    """Phase durations, rows and bytes of the current request"""
+    __slots__ = ('phases', 'rows', 'bytes')
+
+    def __init__(self):
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self.rows = 0
+        self.bytes = 0
+
+
+def add(phase: str, seconds: float):
+    """Add seconds to a phase of the current request, if it is measured"""
+    timings = _timings.get()
+    if timings is not None:
+        timings.phases[phase] += seconds
+
+
+def record_payload(content, body: bytes):
+    """Count the rows of a response's serialized ``content`` and the bytes of its ``body``"""
+    timings = _timings.get()
+    if timings is None:
+        return
+    if isinstance(content, list):
+        timings.rows += len(content)
+    elif isinstance(content, dict) and isinstance(content.get('rows', None), list):
+        timings.rows += len(content['rows'])
+    elif content is not None:
+        timings.rows += 1
+    timings.bytes += len(body)
+
+
+def record_bytes(body: bytes):
+    timings = _timings.get()
+    if timings is not None:
+        timings.bytes += len(body)
+
+
+@contextmanager
+def timed(phase: str):
+    """Time the block into ``phase`` of the current request"""
+    if _timings.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add(phase, time.perf_counter() - start)
+
+
+@contextmanager
+def database_work():
+    """Time the block into ``serialize``, less the ``acquire`` and ``query`` time spent within it"""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    before = timings.phases['acquire'] + timings.phases['query']
+    try:
+        yield
+    finally:
+        spent = timings.phases['acquire'] + timings.phases['query'] - before
+        timings.phases['serialize'] += max(time.perf_counter() - start - spent, 0.0)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _timings.get() is not None:
+        conn.info.setdefault('genroutes_query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('genroutes_query_start', None)
+    if starts and _timings.get() is not None:
+        add('query', time.perf_counter() - starts.pop())
+
+
+class Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(**labels) -> str:
+    return ','.join('%s="%s"' % (k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                    for k, v in labels.items())
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metrics:
+    """Request counts, latency histograms (total and by phase), rows and response bytes of generated routes, by
+    route and method"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._errors = {}
+        self._rows = {}
+        self._bytes = {}
+        self._durations = {}
+        self._engines = set()
+
+    def instrument(self, engine):
+        """Time the SQL statements of engine (sync or async) into the ``query`` phase"""
+        engine = getattr(engine, 'sync_engine', engine)
+        with self._lock:
+            if engine in self._engines:
+                return
+            self._engines.add(engine)
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @contextmanager
+    def request(self, route: str, method: str):
+        """Measure the request handled within the block"""
+        timings = Timings()
+        token = _timings.set(timings)
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield timings
+        except BaseException:
+            failed = True
+            raise
+        finally:
+            _timings.reset(token)
+            self.observe(route, method, time.perf_counter() - start, timings, failed)
+
+    def observe(self, route: str, method: str, seconds: float, timings: Timings, failed=False):
+        key = (route, method)
+        with self._lock:
+            self._requests[key] = self._requests.get(key, 0) + 1
+            if failed:
+                self._errors[key] = self._errors.get(key, 0) + 1
+            self._rows[key] = self._rows.get(key, 0) + timings.rows
+            self._bytes[key] = self._bytes.get(key, 0) + timings.bytes
+            for phase, value in [('total', seconds), *timings.phases.items()]:
+                histogram = self._durations.get((route, method, phase), None)
+                if histogram is None:
+                    histogram = self._durations[(route, method, phase)] = Histogram()
+                histogram.observe(value)
+
+    def render(self) -> str:
+        """Metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, kind, help_text, values in [
+                ('genroutes_requests_total', 'counter', 'Requests handled by generated routes.', self._requests),
+                ('genroutes_request_errors_total', 'counter', 'Requests of generated routes that raised.',
+                 self._errors),
+                ('genroutes_rows_total', 'counter', 'Rows returned by generated routes.', self._rows),
+                ('genroutes_response_bytes_total', 'counter', 'Response body bytes of generated routes.',
+                 self._bytes),
+            ]:
+                lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s %s' % (name, kind)]
+                lines += ['%s{%s} %s' % (name, _labels(route=route, method=method), _number(value))
+                          for (route, method), value in sorted(values.items())]
+
+            name = 'genroutes_request_duration_seconds'
+            lines += ['# HELP %s Latency of generated routes, in total and by phase.' % name,
+                      '# TYPE %s histogram' % name]
+            for (route, method, phase), histogram in sorted(self._durations.items()):
+                labels = _labels(route=route, method=method, phase=phase)
+                lines += ['%s_bucket{%s,le="%s"} %d' % (name, labels, bound, count)
+                          for bound, count in zip(BUCKETS, histogram.counts)]
+                lines += ['%s_bucket{%s,le="+Inf"} %d' % (name, labels, histogram.count),
+                          '%s_sum{%s} %s' % (name, labels, _number(histogram.sum)),
+                          '%s_count{%s} %d' % (name, labels, histogram.count)]
+        return '\n'.join(lines) + '\n'
+
+
+def metrics_registry(metrics) -> Union[Metrics, None]:
+    """Registry of the ``metrics`` option: a :class:`Metrics`, ``True`` for a new one or ``None``"""
+    if metrics is None or metrics is False:
+        return None
+    if metrics is True:
+        return Metrics()
+    if not isinstance(metrics, Metrics):
+        raise Exception("Unsupported metrics '%s', use True or a Metrics" % (metrics,))
+    return metrics
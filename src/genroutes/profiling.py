@@ -0,0 +1,187 @@
+"""SQL profiling of generated routes.
+
+A :class:`Profile` records the statements executed while it is current (see :func:`profile`), through the cursor
+events of engines instrumented by a :class:`Profiler`. Statements are grouped by shape, their SQL with whitespace
+and bound parameter lists collapsed, and a ``SELECT`` shape repeated ``n_plus_one_threshold`` times or more within
+a request is flagged as a likely N+1 pattern, typically a relationship lazy loaded once per row.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Union
+
+from sqlalchemy import event
+
+N_PLUS_ONE_THRESHOLD = 3
+
+logger = logging.getLogger(__name__)
+
+_profile: ContextVar = ContextVar('profile', default=None)
+
+_PARAMETER = r'(?:\?|%s|%\(\w+\)s|:\w+|\$\d+|__\[POSTCOMPILE_\w+\])'
+_PARAMETER_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)' % (_PARAMETER, _PARAMETER))
+_WHITESPACE = re.compile(r'\s+')
+
+
+def statement_shape(statement: str) -> str:
+    """Statement with whitespace and parameter lists (e.g. of ``IN``) collapsed"""
+    return _PARAMETER_LIST.sub('(?)', _WHITESPACE.sub(' ', statement).strip())
+
+
+class Profile:
+    """Statements executed while profiling, with their duration in seconds"""
+
+    def __init__(self, n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.statements: list[tuple[str, float]] = []
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, seconds: float):
+        with self._lock:
+            self.statements.append((statement_shape(statement), seconds))
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def seconds(self) -> float:
+        return sum(seconds for _, seconds in self.statements)
+
+    def repeated(self) -> dict[str, int]:
+        """Shapes executed more than once, by number of executions"""
+        return {shape: n for shape, n in Counter(shape for shape, _ in self.statements).most_common() if n > 1}
+
+    def n_plus_one(self) -> dict[str, int]:
+        """Repeated ``SELECT`` shapes reaching ``n_plus_one_threshold`` executions"""
+        return {shape: n for shape, n in self.repeated().items()
+                if n >= self.n_plus_one_threshold and shape[:6].upper() == 'SELECT'}
+
+    def summary(self) -> dict:
+        return {'count': self.count, 'seconds': self.seconds, 'repeated': self.repeated(),
+                'n_plus_one': self.n_plus_one()}
+
+    def server_timing(self) -> str:
+        """``Server-Timing`` header value: statement count and database time, and likely N+1 patterns"""
+        value = 'db;dur=%.3f;desc="%d queries"' % (self.seconds * 1000, self.count)
+        n_plus_one = self.n_plus_one()
+        if n_plus_one:
+            value += ', n-plus-one;desc="%d repeated SELECT shapes"' % len(n_plus_one)
+        return value
+
+
+def current() -> Union[Profile, None]:
+    """Profile of the current request, ``None`` when not profiling"""
+    return _profile.get()
+
+
+@contextmanager
+def profile(n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+    """Record statements of instrumented engines executed within the block, in this thread or task and those it
+    starts"""
+    recorded = Profile(n_plus_one_threshold)
+    token = _profile.set(recorded)
+    try:
+        yield recorded
+    finally:
+        _profile.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _profile.get() is not None:
+        conn.info.setdefault('genroutes_profile_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get('genroutes_profile_start', None)
+    recorded = _profile.get()
+    if starts and recorded is not None:
+        recorded.record(statement, time.perf_counter() - starts.pop())
+
+
+class Profiler:
+    """Profiling of the requests of generated routes: summaries of the last ``history`` requests, and a warning
+    logged for each request with likely N+1 patterns"""
+
+    def __init__(self, history: int = 100, n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self._recent = deque(maxlen=history)
+        self._engines = set()
+        self._lock = threading.Lock()
+
+    def instrument(self, engine):
+        """Record the statements of engine (sync or async) into the current profile"""
+        engine = getattr(engine, 'sync_engine', engine)
+        with self._lock:
+            if engine in self._engines:
+                return
+            self._engines.add(engine)
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @contextmanager
+    def request(self, route: str, method: str):
+        """Profile the request handled within the block, in the profile of :class:`ProfilingMiddleware` when it
+        runs"""
+        recorded = _profile.get()
+        token = None
+        if recorded is None:
+            recorded = Profile(self.n_plus_one_threshold)
+            token = _profile.set(recorded)
+        try:
+            yield recorded
+        finally:
+            if token is not None:
+                _profile.reset(token)
+            self.record(route, method, recorded)
+
+    def record(self, route: str, method: str, recorded: Profile):
+        summary = {'route': route, 'method': method, **recorded.summary()}
+        with self._lock:
+            self._recent.append(summary)
+        for shape, n in summary['n_plus_one'].items():
+            logger.warning("Likely N+1 query in %s %s: %d executions of %s", method, route, n, shape)
+
+    def recent(self) -> list[dict]:
+        """Summaries of the last requests, most recent first"""
+        with self._lock:
+            return list(reversed(self._recent))
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling each HTTP request and reporting it in a ``Server-Timing`` response header"""
+
+    def __init__(self, app, n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        with profile(self.n_plus_one_threshold) as recorded:
+            async def send_with_timing(message):
+                # streamed rows are read after the headers are sent, they are not counted
+                if message['type'] == 'http.response.start':
+                    headers = list(message.get('headers', []))
+                    headers.append((b'server-timing', recorded.server_timing().encode('latin-1')))
+                    message = {**message, 'headers': headers}
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
+
+
+def profiler_registry(profile) -> Union[Profiler, None]:
+    """Profiler of the ``profile`` option: a :class:`Profiler`, ``True`` for a new one or ``None``"""
+    if profile is None or profile is False:
+        return None
+    if profile is True:
+        return Profiler()
+    if not isinstance(profile, Profiler):
+        raise Exception("Unsupported profile '%s', use True or a Profiler" % (profile,))
+    return profile
@@ -0,0 +1,81 @@
+"""Read replicas of generated GET routes.
+
+A :class:`ReplicaSet` holds the session factories of read-only standbys. Services open their read sessions on the
+replica it chooses, writes stay on the primary session factory. It also keeps the clients pinned to the primary
+after their writes, shared by all the services reading from it.
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from typing import Union
+
+STRATEGIES = ('round_robin', 'least_connections')
+
+
+def checked_out(engine) -> int:
+    """Connections of engine's pool in use, 0 for pools not counting them (e.g. ``NullPool``)"""
+    pool = getattr(engine, 'sync_engine', engine).pool
+    return pool.checkedout() if hasattr(pool, 'checkedout') else 0
+
+
+class ReplicaSet:
+    """Session factories of read replicas, each bound to its engine, chosen ``round_robin`` or by
+    ``least_connections`` checked out of their pools, pinning at most ``max_pins`` clients to the primary"""
+
+    def __init__(self, sessions: list, strategy: str = 'round_robin', max_pins: int = 1024):
+        if not sessions:
+            raise Exception("ReplicaSet: at least one session factory is required")
+        if strategy not in STRATEGIES:
+            raise Exception("Unsupported read strategy '%s', use one of: %s" % (strategy, ', '.join(STRATEGIES)))
+        self.sessions = list(sessions)
+        self.strategy = strategy
+        self.engines = []
+        for session in self.sessions:
+            engine = session.kw.get('bind', None)
+            if engine is None:
+                raise Exception("ReplicaSet: session factories must be bound to an engine")
+            self.engines.append(engine)
+        self._turns = itertools.count()
+        self._lock = threading.Lock()
+        self.max_pins = max_pins
+        # until when clients read from the primary, oldest pins first
+        self._pins = OrderedDict()
+
+    def choose(self) -> tuple:
+        """Session factory and engine serving the next read"""
+        if self.strategy == 'least_connections':
+            index = min(range(len(self.engines)), key=lambda i: checked_out(self.engines[i]))
+        else:
+            with self._lock:
+                index = next(self._turns) % len(self.sessions)
+        return self.sessions[index], self.engines[index]
+
+    def pin(self, client, seconds: float):
+        """Serve client's reads from the primary for ``seconds``, evicting expired pins and then the oldest ones
+        beyond ``max_pins``"""
+        if client is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._pins.pop(client, None)
+            while self._pins and (len(self._pins) >= self.max_pins or next(iter(self._pins.values())) <= now):
+                self._pins.popitem(last=False)
+            self._pins[client] = now + seconds
+
+    def pinned(self, client) -> bool:
+        """Whether client reads from the primary"""
+        if client is None:
+            return False
+        until = self._pins.get(client, None)
+        return until is not None and until > time.monotonic()
+
+
+def replica_set(read_session, strategy: str = 'round_robin') -> Union[ReplicaSet, None]:
+    """Replicas of the ``read_session`` option: a :class:`ReplicaSet`, a session factory, a list of them or
+    ``None``"""
+    if read_session is None or isinstance(read_session, ReplicaSet):
+        return read_session
+    if isinstance(read_session, (list, tuple)):
+        return ReplicaSet(read_session, strategy)
+    return ReplicaSet([read_session], strategy)
@@ -0,0 +1,46 @@
+"""Test helpers of applications using generated routes."""
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import event
+
+from .profiling import N_PLUS_ONE_THRESHOLD, Profile
+
+
+@contextmanager
+def query_budget(engine, max_queries: int, allow_n_plus_one: bool = False,
+                 n_plus_one_threshold: int = N_PLUS_ONE_THRESHOLD):
+    """Fail with ``AssertionError`` when the block runs more than ``max_queries`` statements on engine (sync or
+    async), or a likely N+1 pattern unless ``allow_n_plus_one``. Statements of any thread count, e.g. of routes
+    called through a ``TestClient``.
+
+    e.g.::
+
+        with query_budget(engine, 2):
+            client.get("/user?deep=true")
+    """
+    engine = getattr(engine, 'sync_engine', engine)
+    recorded = Profile(n_plus_one_threshold)
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('genroutes_budget_start', []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('genroutes_budget_start', None)
+        recorded.record(statement, time.perf_counter() - starts.pop() if starts else 0.0)
+
+    event.listen(engine, 'before_cursor_execute', before)
+    event.listen(engine, 'after_cursor_execute', after)
+    try:
+        yield recorded
+    finally:
+        event.remove(engine, 'before_cursor_execute', before)
+        event.remove(engine, 'after_cursor_execute', after)
+
+    if recorded.count > max_queries:
+        raise AssertionError("%d queries over a budget of %d:\n%s"
+                             % (recorded.count, max_queries, '\n'.join(s for s, _ in recorded.statements)))
+    n_plus_one = recorded.n_plus_one()
+    if n_plus_one and not allow_n_plus_one:
+        raise AssertionError("Likely N+1 queries:\n%s"
+                             % '\n'.join('%d x %s' % (n, shape) for shape, n in n_plus_one.items()))
@@ -0,0 +1,229 @@
+import asyncio
+import json
+from typing import Union
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import declarative_base
+from sqlalchemy.pool import NullPool
+
+from src.genroutes import AsyncRoutes, MemoryCache
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    secret = Column(String)
+
+
+class ItemEntity(BaseModel):
+    id: Union[int, None] = None
+    name: str
+    secret: Union[str, None] = None
+
+
+class Tag(Base):
+    __tablename__ = "tags"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+    color = Column(String)
+
+
+class TagEntity(BaseModel):
+    id: Union[int, None] = None
+    name: str
+    color: Union[str, None] = None
+
+
+def make_app(tmp_path, model=Item, **routers) -> FastAPI:
+    engine = create_async_engine("sqlite+aiosqlite:///%s" % (tmp_path / "test.db"), poolclass=NullPool)
+
+    async def create_tables():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_tables())
+
+    app = FastAPI()
+    routes = AsyncRoutes(async_sessionmaker(engine, expire_on_commit=False))
+    for path, options in routers.items():
+        entity = TagEntity if model is Tag else ItemEntity
+        app.include_router(routes.get_router(path, model, entity, entity, **options))
+    return app
+
+
+@pytest.fixture()
+def client(tmp_path):
+    app = make_app(tmp_path, item={"response_exclude": ["secret"], "bulk_create": True})
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_async_crud_round_trip(client):
+    for i in range(1, 4):
+        response = client.post("/item", json={"name": "item%d" % i, "secret": "s"})
+        assert response.status_code == 201
+        assert response.json() == {"id": i, "name": "item%d" % i}
+
+    assert client.get("/item/2").json()["name"] == "item2"
+    assert client.patch("/item/2", json={"name": "renamed"}).status_code == 200
+    assert client.get("/item/name/renamed").json() == [{"id": 2, "name": "renamed"}]
+
+    page = client.get("/item", params={"page": 0, "limit": 2}).json()
+    assert page == {"rows": [{"id": 1, "name": "item1"}, {"id": 2, "name": "renamed"}], "count": 3}
+
+    response = client.get("/item", params={"stream": "ndjson"})
+    assert [json.loads(line)["id"] for line in response.text.splitlines()] == [1, 2, 3]
+
+    rows = client.get("/item", params={"id__gte": 2, "name__in": "item1,item3,renamed", "order": "-id",
+                                       "fields": "id"}).json()
+    assert rows == [{"id": 3}, {"id": 2}]
+    # excluded fields are not filterable, filters would reveal their values
+    assert client.get("/item", params={"secret": "s"}).status_code == 400
+    assert client.get("/item", params={"secret__gte": "m"}).status_code == 400
+    assert client.get("/item", params={"id__between": 1}).status_code == 400
+
+    assert client.delete("/item/1").status_code == 200
+    assert [r["id"] for r in client.get("/item").json()] == [2, 3]
+
+
+def test_async_match_modes_are_per_router(tmp_path):
+    app = make_app(tmp_path, item={"match_modes": {"name": "prefix"}}, plain={})
+    with TestClient(app) as client:
+        for name in ("apple", "apricot", "banana"):
+            assert client.post("/item", json={"name": name}).status_code == 201
+        assert [r["name"] for r in client.get("/item/name/ap").json()] == ["apple", "apricot"]
+        # another router on the same model keeps its own match modes
+        assert client.get("/plain/name/ap").json() == []
+        assert [r["name"] for r in client.get("/plain/name/apple").json()] == ["apple"]
+
+
+def test_async_bulk_create(client):
+    response = client.post("/item/bulk", json=[{"name": "b"}, {"name": "a"}])
+    assert response.status_code == 201
+    assert response.json() == [{"id": 1, "name": "b"}, {"id": 2, "name": "a"}]
+
+
+def test_async_create_on_conflict(tmp_path):
+    # default key_fields: the unique name, the client leaves the generated id out
+    app = make_app(tmp_path, model=Tag, tag={"on_conflict": "nothing"}, upsert={"on_conflict": "update"})
+    with TestClient(app) as client:
+        assert client.post("/tag", json={"name": "a", "color": "red"}).json() == {"id": 1, "name": "a", "color": "red"}
+        assert client.post("/tag", json={"name": "a", "color": "blue"}).status_code == 409
+        response = client.post("/upsert", json={"name": "a", "color": "blue"})
+        assert response.json() == {"id": 1, "name": "a", "color": "blue"}
+        assert client.post("/upsert", json={"name": "b"}).json()["id"] == 2
+        assert [(r["id"], r["color"]) for r in client.get("/tag").json()] == [(1, "blue"), (2, None)]
+
+    with pytest.raises(Exception):
+        make_app(tmp_path, item={"on_conflict": "nothing"})
+
+
+def test_async_raw_rows(tmp_path):
+    app = make_app(tmp_path, item={"response_exclude": ["secret"], "raw_rows": True})
+    with TestClient(app) as client:
+        for i in range(1, 4):
+            client.post("/item", json={"name": "item%d" % i, "secret": "s"})
+
+        assert client.get("/item", params={"order": "-id"}).json()[0] == {"id": 3, "name": "item3"}
+        response = client.get("/item", params={"stream": "ndjson", "fields": "name"})
+        assert [json.loads(line) for line in response.text.splitlines()][-1] == {"name": "item3"}
+
+
+def test_async_cache_is_invalidated_by_writes(tmp_path):
+    # writes through the uncached router leave the cache of the other one as it was
+    app = make_app(tmp_path, item={"cache": MemoryCache()}, plain={})
+    with TestClient(app) as client:
+        client.post("/item", json={"name": "item1"})
+        assert client.get("/item").json() == [{"id": 1, "name": "item1", "secret": None}]
+        assert client.get("/item/1").json()["name"] == "item1"
+
+        client.patch("/plain/1", json={"name": "behind"})
+        assert client.get("/item").json()[0]["name"] == "item1"
+        assert client.get("/item/1").json()["name"] == "item1"
+        # a schema of its own is a cache entry of its own
+        assert client.get("/item", headers={"user-schema": "main"}).json()[0]["name"] == "behind"
+
+        client.patch("/item/1", json={"name": "renamed"})
+        assert client.get("/item").json()[0]["name"] == "renamed"
+        assert client.get("/item/1").json()["name"] == "renamed"
+
+
+def test_async_conditional_get(tmp_path):
+    app = make_app(tmp_path, item={"cache": True}, versioned_item={"etag_field": "name"})
+    with TestClient(app) as client:
+        client.post("/item", json={"name": "item1"})
+        response = client.get("/item")
+        tag = response.headers["etag"]
+        assert tag.startswith('"') and client.get("/item").headers["etag"] == tag
+
+        response = client.get("/item", headers={"If-None-Match": 'W/"other", ' + tag})
+        assert response.status_code == 304 and response.content == b""
+        client.patch("/item/1", json={"name": "renamed"})
+        assert client.get("/item", headers={"If-None-Match": tag}).status_code == 200
+
+        tag = client.get("/versioned_item/1").headers["etag"]
+        assert client.get("/versioned_item/1", headers={"If-None-Match": tag}).status_code == 304
+        response = client.get("/versioned_item/1", params={"fields": "id"}, headers={"If-None-Match": tag})
+        assert response.status_code == 200
+
+
+def test_async_get_many(client):
+    for i in range(1, 4):
+        client.post("/item", json={"name": "item%d" % i, "secret": "s"})
+
+    assert client.get("/item", params={"ids": "3,1,7"}).json() == {
+        "3": {"id": 3, "name": "item3"}, "1": {"id": 1, "name": "item1"}, "7": None}
+    assert client.get("/item", params={"ids": "x"}).status_code == 400
+    # repeated ids are read once, different spellings of one id are rejected
+    assert client.get("/item", params={"ids": "1,1"}).json() == {"1": {"id": 1, "name": "item1"}}
+    assert client.get("/item", params={"ids": "1,01"}).status_code == 400
+    # filters are not applied to ids, unknown parameters are still rejected
+    assert client.get("/item", params={"ids": "1,2", "name": "item1"}).status_code == 400
+    assert client.get("/item", params={"ids": "1", "bogus": "1"}).status_code == 400
+
+
+def test_async_bulk_update_and_delete(tmp_path):
+    app = make_app(tmp_path, item={"bulk_create": True, "bulk_update": True, "bulk_delete": True})
+    with TestClient(app) as client:
+        client.post("/item/bulk", json=[{"name": "item%d" % i} for i in range(1, 6)])
+
+        response = client.post("/item/bulk-update", json={"rows": [{"id": 1, "name": "a"}, {"id": 2, "secret": "s"}]})
+        assert response.json() == {"updated": 2}
+        response = client.post("/item/bulk-update", json={"filter": {"id__gte": 4}, "data": {"name": "late"}})
+        assert response.json() == {"updated": 2}
+        assert client.post("/item/bulk-update", json={"rows": [{"id": 1, "color": "red"}]}).status_code == 400
+
+        assert client.post("/item/bulk-delete", json={"ids": [1, 2]}).json() == {"deleted": 2}
+        assert client.post("/item/bulk-delete", json={"filter": {"name": "late"}}).json() == {"deleted": 2}
+        assert client.get("/item").json() == [{"id": 3, "name": "item3", "secret": None}]
+
+
+def test_async_sessions_are_released_after_each_request(tmp_path):
+    routes = AsyncRoutes.from_url("sqlite+aiosqlite:///%s" % (tmp_path / "pool.db"), pool_size=1, max_overflow=0,
+                                  pool_timeout=1)
+
+    async def create_tables():
+        async with routes.session.kw["bind"].begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    asyncio.run(create_tables())
+    app = FastAPI()
+    app.include_router(routes.get_router("item", Item, ItemEntity, ItemEntity, etag_field="id"))
+    with TestClient(app) as client:
+        # a single pooled connection serves every request, failed ones included
+        for i in range(1, 4):
+            assert client.post("/item", json={"name": "item%d" % i}).status_code == 201
+            assert client.get("/item/%d" % i, params={"fields": "nope"}).status_code == 400
+            assert client.get("/item/id/abc", params={"stream": "ndjson"}).status_code == 400
+            assert client.get("/item/%d" % i).json()["name"] == "item%d" % i
+        assert routes.pool_status() == {"size": 1, "checked_in": 1, "checked_out": 0, "overflow": 0}
@@ -0,0 +1,50 @@
+import pytest
+
+from src.genroutes.cache import MemoryCache, RedisCache, cache_backend
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None):
+        self.data[key] = value
+
+    def incr(self, key):
+        self.data[key] = int(self.data.get(key, 0)) + 1
+        return self.data[key]
+
+
+def test_memory_cache_evicts_least_recently_used_and_expired():
+    cache = MemoryCache(maxsize=2, ttl=60)
+    cache.set("a", b"1")
+    cache.set("b", b"2")
+    assert cache.get("a") == b"1"
+    cache.set("c", b"3")
+    assert cache.get("b") is None and cache.get("a") == b"1"
+
+    cache.ttl = -1
+    cache.set("d", b"4")
+    assert cache.get("d") is None
+
+    generation = cache.generation()
+    cache.clear()
+    assert cache.generation() == generation + 1 and cache.get("a") is None
+
+
+def test_redis_cache_clear_starts_a_generation():
+    cache = RedisCache(FakeRedis(), prefix="items:")
+    cache.set("0:key", b"1")
+    assert cache.generation() == 0 and cache.get("0:key") == b"1"
+    cache.clear()
+    assert cache.generation() == 1
+
+
+def test_cache_backend_option():
+    assert cache_backend(None) is None
+    assert isinstance(cache_backend(True), MemoryCache)
+    with pytest.raises(Exception):
+        cache_backend("redis")
@@ -0,0 +1,320 @@
+import datetime
+import decimal
+import uuid
+
+import pytest
+from sqlalchemy import event, create_engine, Column, Integer, String, LargeBinary, Numeric, DateTime, Uuid, ForeignKey
+from sqlalchemy import VARCHAR
+from sqlalchemy.orm import sessionmaker, declarative_base, relationship
+from sqlalchemy.pool import StaticPool
+
+from src.genroutes import crud
+
+Base = declarative_base()
+
+
+class Team(Base):
+    __tablename__ = "teams"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    members = relationship("Member", back_populates="team")
+
+
+class Member(Base):
+    __tablename__ = "members"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    avatar = Column(LargeBinary)
+    salary = Column(Numeric(10, 2))
+    joined = Column(DateTime)
+    token = Column(Uuid)
+    team_id = Column(Integer, ForeignKey("teams.id"))
+    team = relationship("Team", back_populates="members")
+
+
+@pytest.fixture()
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    session = SessionLocal()
+    team = Team(id=1, name="core")
+    session.add(team)
+    session.add_all([Member(id=i, name="member%d" % i, team=team) for i in range(1, 6)])
+    session.commit()
+    yield session
+    session.close()
+
+
+def test_serializer_plan_is_cached():
+    plan = crud.compile_serializer(Member)
+    assert crud.compile_serializer(Member) is plan
+    assert [key for key, _ in plan.relationships] == ["team"]
+
+
+def test_serialize_converts_column_types():
+    token = uuid.uuid4()
+    member = Member(id=1, name="a", avatar=b"\x00\x01", salary=decimal.Decimal("10.50"),
+                    joined=datetime.datetime(2024, 1, 2, 3, 4, 5), token=token)
+    row = crud.serialize(member)
+    assert row["avatar"] == "AAE="
+    assert row["salary"] == 10.5
+    assert row["joined"] == "2024-01-02T03:04:05"
+    assert row["token"] == str(token)
+
+
+def test_serialize_deep_breaks_cycles(db):
+    row = crud.get_by_id(db, Member, "id", 1, deep=True)
+    assert row["team"]["name"] == "core"
+    assert row["team"]["members"][0] == {k: v for k, v in row.items() if k != "team"}
+
+
+def test_deep_read_with_load_strategy_uses_fixed_queries(db):
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    db.expire_all()
+
+    rows = crud.get_all(db, Member, deep=True, load_strategy="selectin", load_depth=2)
+    assert len(rows) == 5
+    assert all(r["team"]["name"] == "core" for r in rows)
+    # members, their team, the team's members
+    assert len(statements) == 3
+
+
+def test_keyset_pages_follow_cursor(db):
+    page = crud.get_all_keyset(db, Member, "", 2)
+    seen = [r["id"] for r in page["rows"]]
+    while page["next_cursor"]:
+        page = crud.get_all_keyset(db, Member, page["next_cursor"], 2)
+        seen += [r["id"] for r in page["rows"]]
+    assert seen == [1, 2, 3, 4, 5]
+
+    with pytest.raises(Exception):
+        crud.get_all_keyset(db, Member, "not-a-cursor", 2)
+
+
+def test_keyset_pages_break_id_field_ties_by_primary_key(db):
+    # all members share team_id, the primary key orders them and keeps pages apart
+    assert crud.key_columns(Member, "team_id") == (Member.team_id, Member.id)
+    page = crud.get_all_keyset(db, Member, "", 2, id_field="team_id")
+    seen = [r["id"] for r in page["rows"]]
+    while page["next_cursor"]:
+        page = crud.get_by_attribute_keyset(db, Member, "team_id", 1, page["next_cursor"], 2, id_field="team_id")
+        seen += [r["id"] for r in page["rows"]]
+    assert seen == [1, 2, 3, 4, 5]
+
+
+def test_order_by_comes_from_indexed_columns(db):
+    assert crud.default_order_by(Member) == (Member.id,)
+    assert set(crud.sortable_columns(Member)) == {"id"}
+
+    order_by = crud.resolve_order_by({"id": Member.id, "name": Member.name}, "-name", (Member.id,))
+    page = crud.get_all_paginated(db, Member, 0, 2, order_by=order_by)
+    assert [r["name"] for r in page["rows"]] == ["member5", "member4"]
+
+    with pytest.raises(Exception):
+        crud.resolve_order_by(crud.sortable_columns(Member), "name", (Member.id,))
+
+
+@pytest.mark.parametrize("count_mode, count", [("exact", 5), ("none", None), ("estimate", 5), ("window", 5)])
+def test_paginated_count_modes(db, count_mode, count):
+    page = crud.get_all_paginated(db, Member, 1, 2, count_mode=count_mode)
+    assert [r["id"] for r in page["rows"]] == [3, 4]
+    assert page["count"] == count
+
+
+def test_iter_all_streams_serialized_rows(db):
+    rows = crud.iter_all(db, Member, chunk_size=2)
+    assert next(rows)["name"] == "member1"
+    assert [r["id"] for r in rows] == [2, 3, 4, 5]
+
+
+def test_bulk_create_returns_rows_in_input_order(db):
+    rows = crud.bulk_create(db, Member, [{"name": "b", "team_id": 1}, {"id": 20, "name": "a"}, {"name": "c"}],
+                            exclude=["avatar"])
+    assert [(r["id"], r["name"]) for r in rows] == [(6, "b"), (20, "a"), (21, "c")]
+    assert "avatar" not in rows[0]
+    assert db.query(Member).count() == 8
+
+
+def test_copy_value_escapes_text_format():
+    assert crud._copy_value(None) == "\\N"
+    assert crud._copy_value("a\tb\\c\n") == "a\\tb\\\\c\\n"
+    assert crud._copy_value(b"\x01") == "\\\\x01"
+    assert crud._copy_value([1, 2]) == "[1, 2]"
+    assert crud._copy_value([1, None, "a\"b"], array=True) == '{"1",NULL,"a\\\\"b"}'
+    assert crud._copy_value([[1], [2]], array=True) == '{{"1"},{"2"}}'
+
+
+def test_create_on_conflict(db):
+    assert crud.supports_on_conflict(db)
+    assert crud.create_on_conflict(db, Member, {"id": 1, "name": "dup"}, ["id"]) is None
+    row = crud.create_on_conflict(db, Member, {"id": 1, "name": "renamed"}, ["id"], on_conflict="update")
+    assert row["name"] == "renamed"
+    assert crud.create_on_conflict(db, Member, {"id": 9, "name": "new"}, ["id"])["id"] == 9
+
+
+def test_update_and_delete_are_single_statements(db):
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    rows = crud.update_by_attribute(db, Member, {"name": "renamed"}, "id", 2)
+    assert [r["name"] for r in rows] == ["renamed"]
+    assert crud.update(db, Member, {"name": "again"}, 3)["name"] == "again"
+    assert crud.delete_by_attribute(db, Member, "id", 4) == "Success"
+    # no SELECT of the written rows themselves, only lazy loads of deep serialization
+    assert [s.split()[0] for s in statements if not s.startswith("SELECT")] == ["UPDATE", "UPDATE", "DELETE"]
+    assert not any(s.startswith("SELECT") and "WHERE members.id" in s for s in statements)
+
+
+@pytest.fixture(autouse=True)
+def filter_plans():
+    yield
+    crud._FILTER_PLANS.clear()
+
+
+def test_match_modes(db):
+    assert crud.match_mode(Member, "name") == "exact"
+    prefix = crud.compile_filters(Member, {"name": "prefix"})
+    assert [r["id"] for r in crud.get_by_attribute(db, Member, "name", "member", plan=prefix)] == [1, 2, 3, 4, 5]
+    ilike = crud.compile_filters(Member, {"name": "ilike"})
+    assert [r["id"] for r in crud.get_by_attribute(db, Member, "name", "MEMBER_", plan=ilike)] == []
+    assert [r["id"] for r in crud.get_by_attribute(db, Member, "name", "MEMBER2", plan=ilike)] == [2]
+    # plans of match modes are not shared, the default plan of the model is unchanged
+    assert crud.compile_filters(Member)["name"].mode == "exact"
+    assert crud.get_by_attribute(db, Member, "name", "member") == []
+
+    assert crud.index_ddl(Member, match_modes={"name": "ilike"}) == [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        "CREATE INDEX IF NOT EXISTS ix_members_name_ilike ON members USING gin (name gin_trgm_ops)"]
+    assert crud.create_match_indexes(db.get_bind(), Member, {"name": "lower"}) == [
+        "CREATE INDEX IF NOT EXISTS ix_members_name_lower ON members (lower(name))"]
+    with pytest.raises(Exception):
+        crud.compile_filters(Member, {"name": "soundex"})
+
+
+def test_index_ddl_covers_default_lower_matching():
+    class Account(declarative_base()):
+        __tablename__ = "accounts"
+
+        id = Column(Integer, primary_key=True)
+        email = Column(VARCHAR(100))
+        nickname = Column(String)
+
+    assert crud.index_ddl(Account) == ["CREATE INDEX IF NOT EXISTS ix_accounts_email_lower ON accounts (lower(email))"]
+    assert crud.index_ddl(Account, match_modes={"email": "exact"}) == [
+        "CREATE INDEX IF NOT EXISTS ix_accounts_email_exact ON accounts (email)"]
+
+
+def test_filters_are_compiled_once_and_reject_unknown_attributes(db):
+    plan = crud.compile_filters(Member)
+    assert crud.compile_filters(Member) is plan
+    assert plan["name"].type_class is String and plan["name"].mode == "exact"
+    assert "team" not in plan
+
+    with pytest.raises(Exception):
+        crud.get_by_attribute(db, Member, "nickname", "x")
+
+
+def test_filter_grammar(db):
+    rows = crud.get_by_attribute(db, Member, None, None,
+                                 additional_attributes={"id__gte": "2", "name__in": "member2,member3,member5",
+                                                        "id__ne": "5", "joined__isnull": "true"})
+    assert [r["id"] for r in rows] == [2, 3]
+    assert crud.parse_filter_key("id__lt") == ("id", "lt")
+    assert crud.parse_filter_key("team_id") == ("team_id", "eq")
+
+    order_by = crud.resolve_order_by({"id": Member.id, "name": Member.name}, "name,-id", (Member.id,))
+    assert len(order_by) == 2
+
+
+def test_excluded_columns_are_not_selected(db):
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    db.expire_all()
+
+    rows = crud.get_all(db, Member, exclude={"avatar", "salary"})
+    assert set(rows[0]) == {"id", "name", "joined", "token", "team_id", "team"}
+    page = crud.get_all_keyset(db, Member, "", 2, exclude={"avatar", "id"})
+    assert page["next_cursor"] and "id" not in page["rows"][0]
+    assert statements and not any("avatar" in s for s in statements)
+    assert crud.projection(Member, {"avatar"}) is crud.projection(Member, {"avatar"})
+
+
+def test_raw_rows_skip_orm_instances(db):
+    db.expunge_all()
+    rows = crud.get_all(db, Member, exclude={"avatar"}, raw_rows=True)
+    assert rows[0] == {"id": 1, "name": "member1", "salary": None, "joined": None, "token": None, "team_id": 1}
+    page = crud.get_all_paginated(db, Member, 1, 2, count_mode="window", raw_rows=True, exclude={"avatar"})
+    assert [r["id"] for r in page["rows"]] == [3, 4] and page["count"] == 5
+    assert [r["id"] for r in crud.iter_all(db, Member, chunk_size=2, raw_rows=True)] == [1, 2, 3, 4, 5]
+    assert len(db.identity_map) == 0
+    # deep reads need relationships, they keep loading ORM instances
+    assert crud.get_all(db, Member, raw_rows=True, deep=True)[0]["team"]["name"] == "core"
+
+
+def test_get_by_ids_is_one_query(db):
+    statements = []
+    event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+    db.expire_all()
+
+    rows = crud.get_by_ids(db, Member, "id", ["3", "1", "9"], deep=False, exclude={"team", "avatar"})
+    assert list(rows) == ["3", "1", "9"]
+    assert rows["1"]["name"] == "member1" and "avatar" not in rows["1"] and rows["9"] is None
+    assert len(statements) == 1 and " IN " in statements[0]
+
+
+def test_bulk_update_and_delete(db):
+    assert crud.bulk_update(db, Member, [{"id": 1, "name": "a"}, {"id": "2", "name": "b", "salary": "3.5"},
+                                         {"id": 9, "name": "missing"}]) == 2
+    assert crud.bulk_update(db, Member, filter_attributes={"id__gte": 4}, data={"name": "late"}) == 2
+    assert [m.name for m in db.query(Member).order_by(Member.id)] == ["a", "b", "member3", "late", "late"]
+
+    assert crud.bulk_delete(db, Member, ids=["1", 3]) == 2
+    assert crud.bulk_delete(db, Member, filter_attributes={"name": "late"}) == 2
+    assert [m.id for m in db.query(Member)] == [2]
+    with pytest.raises(Exception):
+        crud.bulk_delete(db, Member, filter_attributes={})
+
+
+def test_estimate_count_explains_the_postgresql_statement(db):
+    from sqlalchemy.dialects import postgresql
+
+    query = crud.read_query(db, Member, False, None, None).filter(*crud.filter_model(
+        Member, {"id__in": "1,2", "name": "a"}))
+    sql = str(crud.Explain(query.statement).compile(dialect=postgresql.dialect(),
+                                                    compile_kwargs={"render_postcompile": True}))
+    assert sql.startswith("EXPLAIN (FORMAT JSON) SELECT members.id")
+    assert "members.id IN (%(id_1_1)s, %(id_1_2)s)" in sql and "POSTCOMPILE" not in sql
+
+
+def test_copy_stages_only_the_set_columns():
+    from pydantic import BaseModel
+    from sqlalchemy.dialects import postgresql
+
+    class MemberModel(BaseModel):
+        id: int = None
+        name: str
+        salary: float = None
+
+    rows = [crud.insert_values(Member, MemberModel(name="a")), crud.insert_values(Member, {"id": None, "name": "b"})]
+    assert rows == [{"name": "a"}, {"name": "b"}]
+    assert crud.copy_supported(Member, rows[0])
+    create_table, add_defaults, copy = crud.copy_sql(postgresql.dialect(), Member, list(rows[0]), {None: "tenant"})
+    # the primary key is staged with its next sequence value, matching inserted rows back to their ordinal
+    assert create_table.endswith("SELECT name, id FROM tenant.members WITH NO DATA")
+    assert add_defaults == ("ALTER TABLE _genroutes_bulk ADD COLUMN _genroutes_ordinal BIGSERIAL, ALTER COLUMN id "
+                            "SET DEFAULT nextval(pg_get_serial_sequence('tenant.members', 'id'))")
+    assert copy == "COPY _genroutes_bulk (name) FROM STDIN"
+
+    class Code(declarative_base()):
+        __tablename__ = "codes"
+        code = Column(String, primary_key=True)
+        label = Column(String)
+
+    # without a set or sequence primary key the rows could not be put back in order
+    assert not crud.copy_supported(Code, {"label": "a"}) and crud.copy_supported(Code, {"code": "a", "label": "a"})
+    assert crud.copy_sql(postgresql.dialect(), Member, ["id", "name"])[0].endswith("SELECT id, name FROM members "
+                                                                                  "WITH NO DATA")
@@ -0,0 +1,88 @@
+from typing import Union
+
+from fastapi import FastAPI, Depends, Header, HTTPException
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy.orm import sessionmaker, declarative_base
+
+from src.genroutes import Routes
+from src.genroutes.metrics import Metrics, Timings
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+
+
+class ItemEntity(BaseModel):
+    id: Union[int, None] = None
+    name: str
+
+
+def require_scraper(x_scraper: Union[str, None] = Header(default=None)):
+    if x_scraper != "on":
+        raise HTTPException(status_code=403)
+
+
+def test_histograms_render_in_prometheus_format():
+    metrics = Metrics()
+    timings = Timings()
+    timings.phases["query"] = 0.003
+    timings.rows, timings.bytes = 2, 40
+    metrics.observe("/item", "GET", 0.02, timings)
+    metrics.observe("/item", "GET", 2.0, Timings(), failed=True)
+
+    text = metrics.render()
+    assert 'genroutes_requests_total{route="/item",method="GET"} 2' in text
+    assert 'genroutes_request_errors_total{route="/item",method="GET"} 1' in text
+    assert 'genroutes_rows_total{route="/item",method="GET"} 2' in text
+    assert 'genroutes_request_duration_seconds_bucket{route="/item",method="GET",phase="total",le="0.025"} 1' in text
+    assert 'genroutes_request_duration_seconds_bucket{route="/item",method="GET",phase="total",le="+Inf"} 2' in text
+    assert 'genroutes_request_duration_seconds_bucket{route="/item",method="GET",phase="query",le="0.005"} 2' in text
+    assert 'genroutes_request_duration_seconds_sum{route="/item",method="GET",phase="total"} 2.02' in text
+
+
+def test_routes_export_metrics(tmp_path):
+    engine = create_engine("sqlite:///%s" % (tmp_path / "items.db"))
+    Base.metadata.create_all(engine)
+    routes = Routes(sessionmaker(bind=engine), metrics=True)
+    app = FastAPI()
+    app.include_router(routes.get_router("item", Item, ItemEntity, ItemEntity))
+    routes.add_metrics(app)
+    client = TestClient(app)
+
+    for i in range(3):
+        client.post("/item", json={"name": "item%d" % i})
+    body = client.get("/item").content
+    assert client.get("/item/1", params={"fields": "nope"}).status_code == 400
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    lines = response.text.splitlines()
+    assert 'genroutes_requests_total{route="/item",method="POST"} 3' in lines
+    assert 'genroutes_rows_total{route="/item",method="GET"} 3' in lines
+    assert 'genroutes_response_bytes_total{route="/item",method="GET"} %d' % len(body) in lines
+    assert 'genroutes_request_errors_total{route="/item/{id}",method="GET"} 1' in lines
+    for phase in ("total", "acquire", "query", "serialize", "encode"):
+        count = 'genroutes_request_duration_seconds_count{route="/item",method="GET",phase="%s"} 1' % phase
+        assert count in lines
+    query = [line for line in lines if line.startswith(
+        'genroutes_request_duration_seconds_sum{route="/item",method="GET",phase="query"}')]
+    assert float(query[0].split()[-1]) > 0
+
+
+def test_metrics_route_requires_the_routes_auth(tmp_path):
+    routes = Routes(sessionmaker(bind=create_engine("sqlite:///%s" % (tmp_path / "items.db"))), auth_route="auth",
+                    metrics=True)
+    app = FastAPI()
+    routes.add_metrics(app, dependencies=[Depends(require_scraper)])
+    client = TestClient(app)
+
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer token"}).status_code == 403
+    assert client.get("/metrics", headers={"Authorization": "Bearer token", "x-scraper": "on"}).status_code == 200
@@ -0,0 +1,115 @@
+from typing import Union
+
+import pytest
+from fastapi import FastAPI, Depends, Header, HTTPException
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey
+from sqlalchemy.orm import sessionmaker, declarative_base, relationship
+
+from src.genroutes import Routes
+from src.genroutes.profiling import Profiler, profile, statement_shape
+from src.genroutes.testing import query_budget
+
+Base = declarative_base()
+
+
+class Team(Base):
+    __tablename__ = "teams"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    members = relationship("Member", back_populates="team")
+
+
+class Member(Base):
+    __tablename__ = "members"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    team_id = Column(Integer, ForeignKey("teams.id"))
+    team = relationship("Team", back_populates="members")
+
+
+class TeamEntity(BaseModel):
+    id: Union[int, None] = None
+    name: str
+
+
+@pytest.fixture()
+def engine(tmp_path):
+    engine = create_engine("sqlite:///%s" % (tmp_path / "teams.db"))
+    Base.metadata.create_all(engine)
+    with sessionmaker(bind=engine)() as db:
+        for i in range(1, 5):
+            db.add(Team(id=i, name="team%d" % i, members=[Member(name="member%d" % i)]))
+        db.commit()
+    return engine
+
+
+def require_debug(x_debug: Union[str, None] = Header(default=None)):
+    if x_debug != "on":
+        raise HTTPException(status_code=403)
+
+
+def test_statement_shape():
+    assert statement_shape("SELECT a\n  FROM t WHERE id IN (?, ?, ?)") == "SELECT a FROM t WHERE id IN (?)"
+    assert statement_shape("SELECT a FROM t WHERE id IN (__[POSTCOMPILE_id_1])") == "SELECT a FROM t WHERE id IN (?)"
+
+
+def test_profiled_routes_flag_n_plus_one(engine):
+    routes = Routes(sessionmaker(bind=engine), profile=True)
+    app = FastAPI()
+    app.include_router(routes.get_router("team", Team, TeamEntity, TeamEntity))
+    app.include_router(routes.get_router("eager_team", Team, TeamEntity, TeamEntity, load_strategy="selectin"))
+    with pytest.raises(Exception):
+        routes.add_profiling(app)
+    routes.add_profiling(app, dependencies=[Depends(require_debug)])
+    client = TestClient(app)
+
+    response = client.get("/team", params={"deep": "true"})
+    assert response.headers["server-timing"].startswith("db;dur=")
+    assert 'desc="5 queries", n-plus-one;desc="1 repeated SELECT shapes"' in response.headers["server-timing"]
+    assert 'desc="3 queries"' in client.get("/eager_team", params={"deep": "true"}).headers["server-timing"]
+
+    assert client.get("/debug/queries").status_code == 403
+    eager, lazy = client.get("/debug/queries", headers={"x-debug": "on"}).json()
+    assert (eager["route"], eager["count"], eager["n_plus_one"]) == ("/eager_team", 3, {})
+    assert lazy["route"] == "/team" and lazy["method"] == "GET" and lazy["count"] == 5
+    assert list(lazy["n_plus_one"].values()) == [4]
+
+
+def test_profiles_require_the_bearer_token(engine):
+    routes = Routes(sessionmaker(bind=engine), auth_route="auth", profile=True)
+    app = FastAPI()
+    routes.add_profiling(app)
+    client = TestClient(app)
+    assert client.get("/debug/queries").status_code == 401
+    assert client.get("/debug/queries", headers={"Authorization": "Bearer token"}).json() == []
+
+
+def test_query_budget(engine):
+    routes = Routes(sessionmaker(bind=engine))
+    app = FastAPI()
+    app.include_router(routes.get_router("team", Team, TeamEntity, TeamEntity, load_strategy="selectin"))
+    client = TestClient(app)
+
+    # teams, their members, the members' team
+    with query_budget(engine, 3) as recorded:
+        client.get("/team", params={"deep": "true"})
+    assert recorded.count == 3
+
+    with pytest.raises(AssertionError):
+        with query_budget(engine, 2):
+            client.get("/team", params={"deep": "true"})
+
+    with pytest.raises(AssertionError, match="N\\+1"):
+        with query_budget(engine, 10):
+            with sessionmaker(bind=engine)() as db:
+                [team.members for team in db.query(Team)]
+
+    Profiler().instrument(engine)
+    with profile() as recorded:
+        with sessionmaker(bind=engine)() as db:
+            db.query(Team).all()
+    assert recorded.count == 1
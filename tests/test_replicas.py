@@ -0,0 +1,116 @@
+import asyncio
+from typing import Union
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from pydantic import BaseModel
+from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy.orm import sessionmaker, declarative_base
+
+from src.genroutes import Routes, Service
+from src.genroutes.replicas import ReplicaSet, replica_set
+
+Base = declarative_base()
+
+
+class Item(Base):
+    __tablename__ = "items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+
+
+class ItemEntity(BaseModel):
+    id: Union[int, None] = None
+    name: str
+
+
+def make_session(path, *names):
+    engine = create_engine("sqlite:///%s" % path)
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)
+    with session() as db:
+        db.add_all([Item(name=name) for name in names])
+        db.commit()
+    return session
+
+
+def test_replica_strategies(tmp_path):
+    first, second = make_session(tmp_path / "a.db"), make_session(tmp_path / "b.db")
+    replicas = ReplicaSet([first, second])
+    assert [replicas.choose()[0] for _ in range(3)] == [first, second, first]
+
+    replicas = replica_set([first, second], "least_connections")
+    connection = first.kw["bind"].connect()
+    try:
+        assert replicas.choose()[0] is second
+    finally:
+        connection.close()
+    assert replica_set(replicas) is replicas and replica_set(None) is None
+
+    with pytest.raises(Exception):
+        ReplicaSet([first], "random")
+
+
+def test_replica_pins(tmp_path):
+    replicas = ReplicaSet([make_session(tmp_path / "a.db")], max_pins=2)
+    replicas.pin(None, 60)
+    assert not replicas.pinned(None) and not replicas._pins
+
+    # the oldest pins are evicted beyond max_pins, expired ones first
+    for client in ("a", "b", "c"):
+        replicas.pin(client, 60)
+    assert list(replicas._pins) == ["b", "c"]
+    replicas.pin("b", 60)
+    replicas.pin("d", 60)
+    assert list(replicas._pins) == ["b", "d"]
+    replicas.pin("e", 0)
+    replicas.pin("f", 60)
+    assert list(replicas._pins) == ["f"]
+    assert not replicas.pinned("e") and replicas.pinned("f")
+
+
+def test_reads_go_to_replicas_until_the_client_writes(tmp_path):
+    routes = Routes(make_session(tmp_path / "primary.db", "primary"),
+                    read_session=make_session(tmp_path / "replica.db", "replica"), pin_primary=60)
+    app = FastAPI()
+    app.include_router(routes.get_router("item", Item, ItemEntity, ItemEntity))
+    client = TestClient(app)
+
+    assert [r["name"] for r in client.get("/item").json()] == ["replica"]
+    assert client.get("/item/1").json()["name"] == "replica"
+    assert client.post("/item", json={"name": "new"}).status_code == 201
+    assert [r["name"] for r in client.get("/item").json()] == ["primary", "new"]
+    # other clients keep reading from the replica
+    assert [r["name"] for r in client.get("/item", headers={"Authorization": "Bearer other"}).json()] == ["replica"]
+    # clients are pinned by a digest of their credentials, not the credentials themselves
+    assert client.post("/item", json={"name": "other"}, headers={"Authorization": "Bearer other"}).status_code == 201
+    assert all("Bearer" not in key for key in routes.replicas._pins)
+    assert [r["name"] for r in client.get("/item", headers={"Authorization": "Bearer other"}).json()][-1] == "other"
+
+
+def test_reads_of_a_request_share_one_replica(tmp_path):
+    first, second = make_session(tmp_path / "a.db", "a"), make_session(tmp_path / "b.db", "b")
+    routes = Routes(make_session(tmp_path / "primary.db", "primary"), read_session=[first, second], pin_primary=60)
+    service = Service(routes.session, Item, read_session=routes.replicas, pin_primary=60)
+    other = Service(routes.session, Item, read_session=routes.replicas, pin_primary=60)
+    request = Request({"type": "http", "method": "GET", "path": "/item", "headers": [], "client": ("10.0.0.1", 1)})
+
+    async def handle(read, handler=service):
+        scope = handler.request_scope(request)
+        await scope.__anext__()
+        try:
+            return read()
+        finally:
+            await scope.aclose()
+
+    def read_twice():
+        return [service.get_all()[0]["name"], service.get_all()[0]["name"]]
+
+    assert asyncio.run(handle(read_twice)) == ["a", "a"]
+    assert asyncio.run(handle(read_twice)) == ["b", "b"]
+
+    # pins are shared by the services reading from the same replicas
+    asyncio.run(handle(lambda: other.create_any({"name": "new"}), other))
+    assert asyncio.run(handle(read_twice)) == ["primary", "primary"]
@@ -1,10 +1,12 @@
 
+import threading
+
 import pytest
 from fastapi import FastAPI
-from sqlalchemy import create_engine, Column, Integer, String
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event, Column, Integer, String, ForeignKey
+from sqlalchemy.orm import sessionmaker, relationship
 from pydantic import BaseModel
-from src.genroutes.generic_routes import Routes, HttpMethods
+from src.genroutes.generic_routes import Routes, HttpMethods, Service, BIND_CACHE_SIZE
 from fastapi.testclient import TestClient
 from sqlalchemy.orm import declarative_base
 from mock_alchemy.mocking import UnifiedAlchemyMagicMock
@@ -140,3 +142,192 @@ def test_options_user(setup_teardown):
     assert resp.status_code == 200
 
 
+
+def test_read_user_paginated_excludes_fields(setup_teardown):
+    test_post_user(setup_teardown)
+
+    resp = client.get("/user?page=0&limit=10")
+    assert resp.status_code == 200
+    assert all('password' not in row for row in resp.json()['rows'])
+
+
+def test_read_user_rejects_unknown_filters(setup_teardown):
+    resp = client.get("/user/username/test?nickname=x")
+    assert resp.status_code == 400
+
+
+def test_read_user_rejects_cursor_without_limit_or_with_sort(setup_teardown):
+    test_post_user(setup_teardown)
+
+    assert client.get("/user?cursor=&limit=10").status_code == 200
+    assert client.get("/user?cursor=").status_code == 400
+    assert client.get("/user?cursor=&limit=10&sort=id").status_code == 400
+    assert client.get("/user/username/test?cursor=&limit=10&order=-id").status_code == 400
+
+
+def test_service_dbschema_is_request_scoped():
+    Base = declarative_base()
+
+    class Tenant(Base):
+        __tablename__ = "tenants"
+        id = Column(Integer, primary_key=True)
+
+    engine = create_engine("sqlite://")
+    session = sessionmaker(bind=engine)
+    service = Service(session, Tenant)
+    service.set_dbschema({None: "tenant_a"})
+
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(service.db_schema))
+    thread.start()
+    thread.join()
+    assert seen == [None]
+
+    db = service._get_db()
+    assert db.get_bind() is service._get_bind()
+    assert db.get_bind().get_execution_options()["schema_translate_map"] == {None: "tenant_a"}
+    assert session.kw["bind"] is engine
+
+    # schemas come from a client header, only the most recently used keep their engine proxy
+    for i in range(BIND_CACHE_SIZE + 10):
+        service.set_dbschema({None: "tenant_%d" % i})
+        service._get_bind()
+    assert len(service._binds) == BIND_CACHE_SIZE
+
+
+def test_not_modified_since():
+    from starlette.requests import Request
+    from src.genroutes.generic_routes import not_modified
+
+    def request(**headers):
+        return Request({"type": "http", "headers": [(k.replace("_", "-").encode(), v.encode())
+                                                    for k, v in headers.items()]})
+
+    validators = {"ETag": '"a"', "Last-Modified": "Wed, 01 May 2024 10:00:00 GMT"}
+    assert not_modified(request(if_modified_since="Wed, 01 May 2024 10:00:00 GMT"), validators).status_code == 304
+    assert not_modified(request(if_modified_since="Tue, 30 Apr 2024 10:00:00 GMT"), validators) is None
+    # If-None-Match takes precedence
+    assert not_modified(request(if_none_match='"b"', if_modified_since="Wed, 01 May 2024 10:00:00 GMT"),
+                        validators) is None
+    assert not_modified(request(if_none_match='"b", W/"a"'), validators).status_code == 304
+
+
+def test_sessions_are_released_after_each_request(tmp_path):
+    Base = declarative_base()
+
+    class Item(Base):
+        __tablename__ = "items"
+        id = Column(Integer, primary_key=True)
+        name = Column(String)
+
+    class ItemEntity(BaseModel):
+        id: Union[int, None] = None
+        name: str
+
+    routes = Routes.from_url("sqlite:///%s" % (tmp_path / "items.db"), pool_size=2, max_overflow=0,
+                             pool_pre_ping=True, pool_timeout=1)
+    engine = routes.session.kw["bind"]
+    assert engine.pool.size() == 2 and engine.pool._pre_ping
+    Base.metadata.create_all(engine)
+
+    sessions = []
+    session = routes.session
+    routes.session = lambda **kw: sessions.append(session(**kw)) or sessions[-1]
+    item_app = FastAPI()
+    item_app.include_router(routes.get_router("item", Item, ItemEntity, ItemEntity))
+    item_client = TestClient(item_app)
+    routes.session = session
+    sessions.clear()
+
+    for i in range(5):
+        assert item_client.post("/item", json={"name": "item%d" % i}).status_code == 201
+        assert item_client.get("/item/%d" % (i + 1), params={"fields": "nope"}).status_code == 400
+    assert item_client.get("/item/1").status_code == 200
+    # streams failing to start answer 400 like other reads
+    assert item_client.get("/item/id/abc", params={"stream": "ndjson"}).status_code == 400
+    # one session per request, closed even when the request fails
+    assert len(sessions) == 12
+    assert routes.pool_status()["checked_out"] == 0
+
+
+def test_etag_field_does_not_validate_related_rows(tmp_path):
+    Base = declarative_base()
+
+    class Team(Base):
+        __tablename__ = "teams"
+        id = Column(Integer, primary_key=True)
+        name = Column(String)
+        members = relationship("Member", back_populates="team")
+
+    class Member(Base):
+        __tablename__ = "members"
+        id = Column(Integer, primary_key=True)
+        name = Column(String)
+        team_id = Column(Integer, ForeignKey("teams.id"))
+        team = relationship("Team", back_populates="members")
+
+    class TeamEntity(BaseModel):
+        id: Union[int, None] = None
+        name: str
+
+    class MemberEntity(BaseModel):
+        id: Union[int, None] = None
+        name: str
+        team_id: int
+
+    engine = create_engine("sqlite:///%s" % (tmp_path / "teams.db"))
+    Base.metadata.create_all(engine)
+    routes = Routes(sessionmaker(bind=engine))
+    team_app = FastAPI()
+    team_app.include_router(routes.get_router("team", Team, TeamEntity, TeamEntity, etag_field="name"))
+    team_app.include_router(routes.get_router("member", Member, MemberEntity, MemberEntity))
+    team_client = TestClient(team_app)
+    team_client.post("/team", json={"name": "core"})
+
+    deep, shallow = team_client.get("/team/1"), team_client.get("/team/1", params={"deep": "false"})
+    assert team_client.post("/member", json={"name": "new", "team_id": 1}).status_code == 201
+
+    # the team's name is unchanged but its members are not, the deep read is validated by its body
+    response = team_client.get("/team/1", headers={"If-None-Match": deep.headers["etag"]})
+    assert response.status_code == 200 and response.json()["members"][0]["name"] == "new"
+    response = team_client.get("/team/1", params={"deep": "false"},
+                               headers={"If-None-Match": shallow.headers["etag"]})
+    assert response.status_code == 304
+
+    # the version and the row are read on one connection, checked out once per request
+    pool = []
+    event.listen(engine, "checkout", lambda *args: pool.append("out"))
+    event.listen(engine, "checkin", lambda *args: pool.append("in"))
+    assert team_client.get("/team/1", params={"deep": "false"}).status_code == 200
+    assert pool == ["out", "in"]
+
+
+def test_create_without_on_conflict_reports_duplicates_and_errors(tmp_path, monkeypatch):
+    from fastapi import HTTPException
+    from src.genroutes import crud
+
+    Base = declarative_base()
+
+    class Tag(Base):
+        __tablename__ = "tags"
+        id = Column(Integer, primary_key=True)
+        name = Column(String, nullable=False, unique=True)
+        color = Column(String, nullable=False)
+
+    engine = create_engine("sqlite:///%s" % (tmp_path / "tags.db"))
+    Base.metadata.create_all(engine)
+    service = Service(sessionmaker(bind=engine), Tag)
+
+    assert service.create({"name": "a", "color": "red"}, "name")["id"] == 1
+    with pytest.raises(HTTPException) as raised:
+        service.create({"name": "a", "color": "blue"}, "name")
+    assert raised.value.status_code == 409
+    with pytest.raises(HTTPException) as raised:
+        service.create({"name": "b"}, "name")
+    assert raised.value.status_code == 400
+
+    # a duplicate inserted after the lookup is still a conflict
+    monkeypatch.setattr(crud, "get_by_attribute", lambda *args, **kwargs: [])
+    with pytest.raises(HTTPException) as raised:
+        service.create({"name": "a", "color": "blue"}, "name")
+    assert raised.value.status_code == 409